@@ -1,53 +1,448 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from app.settings import OPENAI_API_KEY
+from app.helper.chunk_index import (
+    CHUNK_COLLECTION_NAME,
+    aggregate_chunk_hits,
+    merge_scores,
+)
+from app.helper.hnsw_config import hnsw_configuration
+from app.helper.index_registry import IndexRegistry, list_shards, shard_root
+from app.helper.listing_store import LISTINGS_DIRECTORY, ROOM_FIELDS, ListingStore
+from app.services.intent_router import PROVINCES, normalize_prompt, provinces_of
+from app.settings import (
+    CHUNK_INDEX_ENABLED,
+    CHUNKS_PER_LISTING,
+    EMBEDDING_CACHE_SIZE,
+    INDEX_RELOAD_INTERVAL,
+    INDEX_ROOT,
+    OPENAI_API_KEY,
+    VECTOR_INDEX_MODE,
+)
 
-PERSIST_DIRECTORY = "chroma_db"
+COLLECTION_NAME = "room_embeddings"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def get_embedding_function():
+    """Embedding function shared by ingestion and querying"""
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.OpenAIEmbeddingFunction(
+        api_key=OPENAI_API_KEY, model_name=EMBEDDING_MODEL
+    )
+
+
+class EmbeddingCache:
+    """
+    Query embeddings by normalized query text, least recently used evicted
+    first. Queries are normalized the way popular queries are counted
+    (app/helper/popular_queries.py), so the prewarmer
+    (app/services/prewarm_service.py) fills the same entries live searches
+    read, and spelling variants of a query share one embedding call.
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed(self, queries: list[str], embedding_function) -> list:
+        """Embeddings of queries, calling embedding_function for the uncached ones"""
+        # The normalized text is what gets embedded, so an entry doesn't
+        # depend on which variant of the query was searched first
+        keys = [normalize_prompt(query) or query for query in queries]
+        if self.max_entries <= 0:
+            return list(embedding_function(keys))
+        embeddings = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    embeddings[key] = self._entries[key]
+        missing = [key for key in dict.fromkeys(keys) if key not in embeddings]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            computed = dict(zip(missing, embedding_function(missing), strict=True))
+            embeddings.update(computed)
+            with self._lock:
+                self._entries.update(computed)
+                for key in computed:
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return [embeddings[key] for key in keys]
+
+    def snapshot(self) -> dict:
+        return {"cached": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+embedding_cache = EmbeddingCache()
 
 
 class ChromaDBService:
-    def __init__(self):
-        self.chroma_client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="room_embeddings",
-            embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-                api_key=OPENAI_API_KEY, model_name="text-embedding-3-small"
-            ),
+    def __init__(self, registry: IndexRegistry | None = None, embedding_function=None):
+        self.registry = registry or IndexRegistry()
+        self.embedding_function = embedding_function or get_embedding_function()
+        self._reload_lock = threading.Lock()
+        self.index_path = None
+        self._checked_at = 0.0
+        self._open(self.registry.active_path())
+
+    def _open(self, path: str) -> None:
+        # Imported here so workers in sidecar mode never load chromadb at all
+        import chromadb
+
+        chroma_client = chromadb.PersistentClient(path=path)
+        collection = chroma_client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            embedding_function=self.embedding_function,
+            configuration=hnsw_configuration(),
         )
+        # Indexes built before the listing store fall back to Chroma metadata
+        listings = ListingStore.open_if_exists(os.path.join(path, LISTINGS_DIRECTORY))
+        chunks = self._open_chunks(chroma_client) if listings is not None else None
+        # One attribute swap, so concurrent queries never mix two versions
+        self.chroma_client = chroma_client
+        self._active = (collection, listings, chunks)
+        self.index_path = path
+        print(f"📦 Serving vector index from {path}")
+
+    def _open_chunks(self, chroma_client):
+        """Review/description chunk collection, if this version has one"""
+        if not CHUNK_INDEX_ENABLED:
+            return None
+        try:
+            return chroma_client.get_collection(
+                name=CHUNK_COLLECTION_NAME, embedding_function=self.embedding_function
+            )
+        except Exception:
+            return None
 
-    def query_similar_rooms(self, query: str, n_results: int = 5):
+    @property
+    def collection(self):
+        return self._active[0]
+
+    @property
+    def listings(self) -> ListingStore | None:
+        return self._active[1]
+
+    def _maybe_reload(self) -> None:
+        """Hot-swap to a newly activated index version, at most once per interval"""
+        now = time.monotonic()
+        if now - self._checked_at < INDEX_RELOAD_INTERVAL:
+            return
+        with self._reload_lock:
+            if now - self._checked_at < INDEX_RELOAD_INTERVAL:
+                return
+            self._checked_at = now
+            path = self.registry.active_path()
+            if path != self.index_path:
+                try:
+                    self._open(path)
+                except Exception as e:
+                    print(f"Error reloading index from {path}: {e}")
+
+    def _to_room(self, room_id: str, doc: str, metadata: dict, distance: float) -> dict:
+        """Transform a single query hit into the expected format"""
+        return {
+            "id": room_id,
+            "title": metadata.get('title', 'Unknown'),
+            "type": "lodge" if "lodge" in doc.lower() else "villa",
+            "description": doc,
+            "price": metadata.get('min_price', 'Unknown'),
+            "city": metadata.get('city', 'Unknown'),
+            "rating": metadata.get('rating', 'Unknown'),
+            "reviews_count": metadata.get('reviews_count', 'Unknown'),
+            "image_url": metadata.get('image_url', 'Unknown'),
+            "web_url": 'https://jajiga.com' + metadata.get('url', 'Unknown'),
+            "similarity_score": 1 - distance  # Convert distance to similarity score
+        }
+
+    def _hydrate(
+        self,
+        listings: ListingStore,
+        ids: list[str],
+        distances: list[float],
+        fields: tuple[str, ...],
+    ) -> list[dict]:
+        """Build rooms for ids from the listing store, projected to fields"""
+        return [
+            {"id": room_id, **row, "similarity_score": 1 - distance}
+            for room_id, distance, row in zip(
+                ids, distances, listings.get(ids, fields), strict=True
+            )
+            if row is not None
+        ]
+
+    def _merge_chunk_hits(
+        self,
+        chunks,
+        listings: ListingStore,
+        search: dict,
+        results: dict,
+        n_results: int,
+        fields: tuple[str, ...],
+    ) -> list[list[dict]]:
+        """Aggregate chunk hits per listing and merge them with summary hits"""
+        chunk_results = chunks.query(
+            **search,
+            n_results=n_results * CHUNKS_PER_LISTING,
+            include=["distances", "metadatas"],
+        )
+        rooms = []
+        for ids, distances, chunk_metadatas, chunk_distances in zip(
+            results["ids"],
+            results["distances"],
+            chunk_results["metadatas"],
+            chunk_results["distances"],
+            strict=True,
+        ):
+            chunk_scores = aggregate_chunk_hits(
+                [metadata["listing_id"] for metadata in chunk_metadatas],
+                [1 - distance for distance in chunk_distances],
+            )
+            summary_scores = {
+                room_id: 1 - distance
+                for room_id, distance in zip(ids, distances, strict=True)
+            }
+            top = merge_scores(summary_scores, chunk_scores, n_results)
+            rooms.append(
+                self._hydrate(
+                    listings,
+                    [room_id for room_id, _ in top],
+                    [1 - score for _, score in top],
+                    fields,
+                )
+            )
+        return rooms
+
+    def query_many(
+        self,
+        queries: list[str],
+        n_results: int = 5,
+        fields: tuple[str, ...] = ROOM_FIELDS,
+        embeddings: list | None = None,
+    ) -> list[list[dict]]:
         """
-        Tool to search for lodges and villas based on user query using ChromaDB.
+        Run several queries in one embedding call and one index search.
+        Pass precomputed embeddings to skip the embedding call.
         """
+        self._maybe_reload()
+        collection, listings, chunks = self._active
+        search = (
+            {"query_embeddings": embeddings}
+            if embeddings is not None
+            else {"query_texts": queries}
+        )
         try:
-            results = self.collection.query(query_texts=query, n_results=n_results)
-
-            # Transform the results into the expected format
-            rooms = []
-            for doc, metadata, distance in zip(
-                results["documents"][0],
-                results["metadatas"][0],
-                results["distances"][0],
-                strict=True,
-            ):
-                room = {
-                    "title": metadata.get('title', 'Unknown'),
-                    "type": "lodge" if "lodge" in doc.lower() else "villa",
-                    "description": doc,
-                    "price": metadata.get('min_price', 'Unknown'),
-                    "city": metadata.get('city', 'Unknown'),
-                    "rating": metadata.get('rating', 'Unknown'),
-                    "reviews_count": metadata.get('reviews_count', 'Unknown'),
-                    "image_url": metadata.get('image_url', 'Unknown'),
-                    "web_url": 'https://jajiga.com' + metadata.get('url', 'Unknown'),
-                    "similarity_score": 1 - distance  # Convert distance to similarity score
-                }
-                rooms.append(room)
-            return rooms
+            if listings is not None:
+                results = collection.query(
+                    **search,
+                    n_results=n_results,
+                    include=["distances"],
+                )
+                if chunks is not None:
+                    return self._merge_chunk_hits(
+                        chunks, listings, search, results, n_results, fields
+                    )
+                return [
+                    self._hydrate(listings, ids, distances, fields)
+                    for ids, distances in zip(
+                        results["ids"], results["distances"], strict=True
+                    )
+                ]
+
+            results = collection.query(**search, n_results=n_results)
+            return [
+                [
+                    self._to_room(room_id, doc, metadata, distance)
+                    for room_id, doc, metadata, distance in zip(
+                        ids, documents, metadatas, distances, strict=True
+                    )
+                ]
+                for ids, documents, metadatas, distances in zip(
+                    results["ids"],
+                    results["documents"],
+                    results["metadatas"],
+                    results["distances"],
+                    strict=True,
+                )
+            ]
         except Exception as e:
             print(f"Error querying ChromaDB: {e}")
+            return [[] for _ in queries]
+
+    def query_similar_rooms(
+        self, query: str, n_results: int = 5, fields: tuple[str, ...] = ROOM_FIELDS
+    ):
+        """
+        Tool to search for lodges and villas based on user query using ChromaDB.
+        """
+        return self.query_many([query], n_results=n_results, fields=fields)[0]
+
+    def get_rooms(
+        self, ids: list[str], scores: list[float], fields: tuple[str, ...] = ROOM_FIELDS
+    ) -> list[dict]:
+        """
+        Fetch rooms by ID in the given order, without any embedding call.
+        """
+        self._maybe_reload()
+        collection, listings, _ = self._active
+        if listings is not None:
+            return self._hydrate(listings, ids, [1 - score for score in scores], fields)
+        try:
+            results = collection.get(ids=ids, include=["documents", "metadatas"])
+            found = {
+                room_id: (doc, metadata)
+                for room_id, doc, metadata in zip(
+                    results["ids"], results["documents"], results["metadatas"], strict=True
+                )
+            }
+            return [
+                self._to_room(room_id, *found[room_id], 1 - score)
+                for room_id, score in zip(ids, scores, strict=True)
+                if room_id in found
+            ]
+        except Exception as e:
+            print(f"Error fetching rooms from ChromaDB: {e}")
             return []
 
 
-chroma_db_service = ChromaDBService()
+class ShardedChromaDBService:
+    """
+    Province-sharded index. Queries naming a province, or a region like
+    "شمال", go to those provinces' shards only; the rest fan out to every
+    shard in parallel and the top-k are merged. Until every province has a
+    shard, the unsharded index is served next to them as "all", and queries
+    for a province without a shard fan out so they still find its listings.
+    """
+
+    def __init__(
+        self,
+        embedding_function=None,
+        embeddings: EmbeddingCache | None = None,
+        root: str = INDEX_ROOT,
+    ):
+        self.embedding_function = embedding_function or get_embedding_function()
+        self.embeddings = embeddings if embeddings is not None else embedding_cache
+        self.root = root
+        self.shards: dict[str, ChromaDBService] = {}
+        self._executor = ThreadPoolExecutor(thread_name_prefix="shard-query")
+        self._discover_lock = threading.Lock()
+        self._discovered_at = 0.0
+        self._discover()
+
+    def _discover(self) -> None:
+        """Open shards that appeared since the last check, at most once per interval"""
+        now = time.monotonic()
+        if self.shards and now - self._discovered_at < INDEX_RELOAD_INTERVAL:
+            return
+        with self._discover_lock:
+            self._discovered_at = now
+            names = list_shards(self.root)
+            shards = {name: shard for name, shard in self.shards.items() if name in names}
+            for name in names:
+                if name not in shards:
+                    shards[name] = ChromaDBService(
+                        IndexRegistry(shard_root(name, self.root)), self.embedding_function
+                    )
+            # A partial sharded build must not hide the unbuilt provinces
+            if not set(PROVINCES) <= set(names):
+                shards["all"] = self.shards.get("all") or ChromaDBService(
+                    IndexRegistry(self.root), self.embedding_function
+                )
+            self.shards = shards
+
+    def route(self, query: str) -> list[str]:
+        """Shards a query should be sent to"""
+        provinces = provinces_of(query)
+        if provinces and all(province in self.shards for province in provinces):
+            return list(provinces)
+        return list(self.shards)
+
+    def query_many(
+        self,
+        queries: list[str],
+        n_results: int = 5,
+        fields: tuple[str, ...] = ROOM_FIELDS,
+    ) -> list[list[dict]]:
+        """
+        Embed all queries once, search each shard with the queries routed to
+        it, and merge every query's hits by similarity.
+        """
+        self._discover()
+        try:
+            embeddings = self.embeddings.embed(queries, self.embedding_function)
+        except Exception as e:
+            print(f"Error embedding queries: {e}")
+            return [[] for _ in queries]
+
+        by_shard: dict[str, list[int]] = {}
+        for i, query in enumerate(queries):
+            for name in self.route(query):
+                by_shard.setdefault(name, []).append(i)
+
+        futures = {
+            name: self._executor.submit(
+                self.shards[name].query_many,
+                [queries[i] for i in positions],
+                n_results,
+                fields,
+                [embeddings[i] for i in positions],
+            )
+            for name, positions in by_shard.items()
+        }
+        merged: list[dict[str, dict]] = [{} for _ in queries]
+        for name, future in futures.items():
+            for i, rooms in zip(by_shard[name], future.result(), strict=True):
+                # A listing can be in both its shard and the "all" fallback
+                for room in rooms:
+                    merged[i].setdefault(room["id"], room)
+        return [
+            sorted(
+                rooms.values(), key=lambda room: room["similarity_score"], reverse=True
+            )[:n_results]
+            for rooms in merged
+        ]
+
+    def query_similar_rooms(
+        self, query: str, n_results: int = 5, fields: tuple[str, ...] = ROOM_FIELDS
+    ):
+        """
+        Tool to search for lodges and villas based on user query using ChromaDB.
+        """
+        return self.query_many([query], n_results=n_results, fields=fields)[0]
+
+    def get_rooms(
+        self, ids: list[str], scores: list[float], fields: tuple[str, ...] = ROOM_FIELDS
+    ) -> list[dict]:
+        """
+        Fetch rooms by ID in the given order from whichever shard holds them.
+        """
+        self._discover()
+        found = {}
+        remaining = dict(zip(ids, scores, strict=True))
+        for shard in self.shards.values():
+            listings = shard.listings
+            mine = [i for i in remaining if listings is None or i in listings]
+            if not mine:
+                continue
+            for room in shard.get_rooms(mine, [remaining[i] for i in mine], fields):
+                found[room["id"]] = room
+                remaining.pop(room["id"])
+        return [found[room_id] for room_id in ids if room_id in found]
+
+
+if VECTOR_INDEX_MODE == "sidecar":
+    from app.helper.retrieval_sidecar import RetrievalSidecarClient
+
+    chroma_db_service = RetrievalSidecarClient()
+else:
+    chroma_db_service = ShardedChromaDBService()
@@ -0,0 +1,108 @@
+"""
+Chunk-level index of review comments and description passages.
+
+Each listing gets at most CHUNKS_PER_LISTING chunks in a second collection
+next to the summary embeddings, so queries about what guests actually
+wrote ("quiet, clean, friendly host") can match. Chunk hits are aggregated
+per listing, by the best chunk or the mean of the best few, and merged with
+the summary hits. The cap also bounds query cost: n listings are covered by
+at most n * CHUNKS_PER_LISTING chunk hits.
+"""
+
+import re
+
+from app.settings import (
+    CHUNK_AGGREGATION,
+    CHUNK_MARGIN,
+    CHUNK_MAX_CHARS,
+    CHUNK_MIN_CHARS,
+    CHUNK_TOP_M,
+    CHUNKS_PER_LISTING,
+)
+
+CHUNK_COLLECTION_NAME = "room_chunks"
+
+# Sentence ends, including the Persian question mark, and line breaks
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s+|\n+")
+
+
+def description_passages(text: str, max_chars: int = CHUNK_MAX_CHARS) -> list[str]:
+    """Split a description into passages of whole sentences up to max_chars"""
+    passages, current = [], ""
+    for sentence in _SENTENCE_END.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()[:max_chars]
+    if current:
+        passages.append(current)
+    return passages
+
+
+def listing_chunks(
+    description: str,
+    comments: list[str],
+    cap: int = CHUNKS_PER_LISTING,
+    max_chars: int = CHUNK_MAX_CHARS,
+    min_chars: int = CHUNK_MIN_CHARS,
+) -> list[tuple[str, str]]:
+    """
+    (kind, text) chunks of one listing: description passages first, up to
+    half the cap, then the longest distinct reviews, then any passages left
+    """
+    passages = [
+        p for p in description_passages(description, max_chars) if len(p) >= min_chars
+    ]
+    reviews = sorted(
+        {
+            comment.strip()[:max_chars]
+            for comment in comments
+            if len(comment.strip()) >= min_chars
+        },
+        key=len,
+        reverse=True,
+    )
+    head = passages[: cap // 2]
+    chunks = [("description", p) for p in head]
+    chunks += [("review", r) for r in reviews[: cap - len(chunks)]]
+    chunks += [("description", p) for p in passages[len(head) : len(head) + cap - len(chunks)]]
+    return chunks
+
+
+def aggregate_chunk_hits(
+    listing_ids: list[str],
+    similarities: list[float],
+    method: str = CHUNK_AGGREGATION,
+    top_m: int = CHUNK_TOP_M,
+) -> dict[str, float]:
+    """Listing-level score from its chunk hits: the best one, or a top-m mean"""
+    by_listing: dict[str, list[float]] = {}
+    for listing_id, similarity in zip(listing_ids, similarities, strict=True):
+        by_listing.setdefault(listing_id, []).append(similarity)
+    if method == "mean":
+        return {
+            listing_id: sum(best) / len(best)
+            for listing_id, scores in by_listing.items()
+            for best in [sorted(scores, reverse=True)[:top_m]]
+        }
+    return {listing_id: max(scores) for listing_id, scores in by_listing.items()}
+
+
+def merge_scores(
+    summary_scores: dict[str, float],
+    chunk_scores: dict[str, float],
+    n_results: int,
+    margin: float = CHUNK_MARGIN,
+) -> list[tuple[str, float]]:
+    """
+    Top listings by the better of their summary score and their chunk score
+    less margin, so a strong review match can surface a listing whose
+    summary missed the query without outranking equally strong summary matches
+    """
+    merged = dict(summary_scores)
+    for listing_id, score in chunk_scores.items():
+        merged[listing_id] = max(merged.get(listing_id, float("-inf")), score - margin)
+    return sorted(merged.items(), key=lambda item: item[1], reverse=True)[:n_results]
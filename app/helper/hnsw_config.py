@@ -0,0 +1,22 @@
+from app.settings import HNSW_CONSTRUCTION_EF, HNSW_M, HNSW_SEARCH_EF, HNSW_SPACE
+
+
+def hnsw_configuration(
+    space: str = HNSW_SPACE,
+    m: int = HNSW_M,
+    construction_ef: int = HNSW_CONSTRUCTION_EF,
+    search_ef: int = HNSW_SEARCH_EF,
+) -> dict:
+    """
+    Collection configuration of the room index. Chroma fixes all of it when
+    a collection is created, so new values take effect with the next build.
+    Pick values with benchmarks/hnsw_benchmark.py.
+    """
+    return {
+        "hnsw": {
+            "space": space,
+            "max_neighbors": m,
+            "ef_construction": construction_ef,
+            "ef_search": search_ef,
+        }
+    }
@@ -0,0 +1,99 @@
+"""
+Content-addressed store of listing thumbnails.
+
+A thumbnail is named after the SHA-256 of the original image bytes, so a
+photo crawled under several listings or URLs is stored once, and a name
+never changes meaning, which lets clients and CDNs cache it forever. A
+manifest maps every source URL fetched to its digest, so later runs only
+fetch URLs they haven't seen. It sits next to the store rather than in it,
+since everything in the store is served as immutable.
+"""
+
+import json
+import os
+import tempfile
+
+from starlette.staticfiles import StaticFiles
+
+from app.settings import IMAGE_BASE_URL, IMAGE_STORE_DIR
+
+# Manifest name inside the store, where earlier versions kept it
+LEGACY_MANIFEST = "sources.json"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write via a temporary file so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class ImageStore:
+    """WebP thumbnails on disk, keyed by the digest of the original image"""
+
+    def __init__(
+        self,
+        root: str = IMAGE_STORE_DIR,
+        base_url: str = IMAGE_BASE_URL,
+        manifest_path: str | None = None,
+    ):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        # image_store -> image_store.sources.json
+        self.manifest_path = manifest_path or f"{os.path.normpath(root)}.sources.json"
+
+    def _relative_path(self, digest: str) -> str:
+        # Two-character fan-out keeps directories small
+        return f"{digest[:2]}/{digest}.webp"
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, self._relative_path(digest))
+
+    def url(self, digest: str) -> str:
+        return f"{self.base_url}/{self._relative_path(digest)}"
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def put(self, digest: str, thumbnail: bytes) -> None:
+        _write_atomic(self.path(digest), thumbnail)
+
+    def load_manifest(self) -> dict[str, str]:
+        """Source URL -> digest of every image stored so far"""
+        for path in (self.manifest_path, os.path.join(self.root, LEGACY_MANIFEST)):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue
+        return {}
+
+    def save_manifest(self, manifest: dict[str, str]) -> None:
+        _write_atomic(
+            self.manifest_path,
+            json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+        )
+        # Stop serving a manifest left in the store by earlier versions
+        try:
+            os.unlink(os.path.join(self.root, LEGACY_MANIFEST))
+        except FileNotFoundError:
+            pass
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names are content hashes, cacheable forever"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+image_store = ImageStore()
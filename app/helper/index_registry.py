@@ -0,0 +1,112 @@
+"""
+Versioned index snapshots with an atomically switched "active" pointer.
+
+    chroma_db/
+        ACTIVE                  # name of the version the API serves
+        versions/
+            20250601-120000-a1b2c3/
+            20250608-120000-d4e5f6/
+
+Builds write a new version side by side, the pointer is replaced with
+os.replace only after validation, and readers pick the change up on their
+next reload check. A root without ACTIVE is served as a legacy, unversioned
+index.
+
+Province shards are independent registries under chroma_db/shards/<name>,
+so one shard can be rebuilt and swapped without touching the others.
+"""
+
+import os
+import shutil
+import time
+import uuid
+
+from app.settings import INDEX_RETENTION, INDEX_ROOT
+
+
+class IndexRegistry:
+    """Manages index versions under one root directory"""
+
+    def __init__(self, root: str = INDEX_ROOT):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer_path = os.path.join(root, "ACTIVE")
+
+    def version_path(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def new_version(self) -> tuple[str, str]:
+        """Create an empty directory for a new build and return (version, path)"""
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        path = self.version_path(version)
+        os.makedirs(path)
+        return version, path
+
+    def active_version(self) -> str | None:
+        try:
+            with open(self.pointer_path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def active_path(self) -> str:
+        """Directory the API should serve from"""
+        version = self.active_version()
+        return self.version_path(version) if version else self.root
+
+    def activate(self, version: str) -> None:
+        """Atomically point readers at version"""
+        if not os.path.isdir(self.version_path(version)):
+            raise FileNotFoundError(f"Index version {version} does not exist")
+        tmp_path = f"{self.pointer_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer_path)
+
+    def list_versions(self) -> list[str]:
+        """All versions, oldest first"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.versions_dir)
+            if os.path.isdir(self.version_path(name))
+        )
+
+    def discard(self, version: str) -> None:
+        """Remove a version that failed validation"""
+        shutil.rmtree(self.version_path(version), ignore_errors=True)
+
+    def garbage_collect(self, retention: int = INDEX_RETENTION) -> list[str]:
+        """
+        Delete versions older than the active one, keeping the newest
+        `retention` of them for rollback. Newer versions are left alone since
+        they may be builds in progress.
+        """
+        active = self.active_version()
+        if active is None:
+            return []
+        older = [v for v in self.list_versions() if v < active]
+        expired = older[: max(len(older) - retention, 0)]
+        for version in expired:
+            self.discard(version)
+        return expired
+
+
+def shard_root(name: str, root: str = INDEX_ROOT) -> str:
+    """Registry root of a province shard"""
+    return os.path.join(root, "shards", name)
+
+
+def list_shards(root: str = INDEX_ROOT) -> list[str]:
+    """Shards that have an active version"""
+    shards_dir = os.path.join(root, "shards")
+    if not os.path.isdir(shards_dir):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(shards_dir)
+        if IndexRegistry(shard_root(name, root)).active_version()
+    )
@@ -0,0 +1,298 @@
+"""
+Concurrent liveness checks for listing and image URLs.
+
+Each URL gets a HEAD request, or a GET whose body is never read when the
+server rejects HEAD. Connections are capped overall and per host so one
+slow site can't starve the rest. Results are cached in Redis, alive ones
+for longer than dead ones since a failure is more likely to be transient.
+
+Ingestion drops dead listings outright. At serve time only cached results
+are used, so a request never waits on a check; unknown URLs are checked in
+the background and URLs that were recently served are revalidated before
+their cache entries expire. A URL already being checked in the background
+is not scheduled again, and background checks share one client and take
+turns through a semaphore so a burst of requests can't flood the sites.
+"""
+
+import asyncio
+import hashlib
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.helper.redis_helper import redis_manager
+from app.settings import (
+    LINK_ALIVE_TTL,
+    LINK_BACKGROUND_CHECKS,
+    LINK_CHECK_CONCURRENCY,
+    LINK_CHECK_ENABLED,
+    LINK_CHECK_PER_HOST,
+    LINK_CHECK_TIMEOUT,
+    LINK_DEAD_TTL,
+    LINK_HOT_LIMIT,
+    LINK_HOT_WINDOW,
+    LINK_REVALIDATE_INTERVAL,
+)
+
+# Statuses meaning "this server doesn't do HEAD", retried with GET
+HEAD_UNSUPPORTED = {403, 405, 501}
+USER_AGENT = "Mozilla/5.0 (compatible; KheshtLinkChecker/1.0)"
+
+# (image, url) pairs scheduled for a background check and not finished yet
+_pending: set[tuple[bool, str]] = set()
+
+
+class LinkChecker:
+    """Checks URLs concurrently and caches whether they are alive"""
+
+    def __init__(
+        self,
+        concurrency: int = LINK_CHECK_CONCURRENCY,
+        per_host: int = LINK_CHECK_PER_HOST,
+        timeout: float = LINK_CHECK_TIMEOUT,
+        background_checks: int = LINK_BACKGROUND_CHECKS,
+    ):
+        self.status_prefix = "link_status:"
+        self.hot_key = "link_hot"
+        self.revalidate_lock_key = "link_revalidate_lock"
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.checked = 0
+        self.dead = 0
+        self.filtered = 0
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._background: set[asyncio.Task] = set()
+        self._background_limit = asyncio.Semaphore(background_checks)
+        self._client: httpx.AsyncClient | None = None
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency),
+        )
+
+    def start(self) -> None:
+        """Open the client shared by every check until close()"""
+        if self._client is None:
+            self._client = self._new_client()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_status_key(self, url: str, image: bool) -> str:
+        """Generate Redis key for the cached status of a URL"""
+        kind = "image" if image else "page"
+        return f"{self.status_prefix}{kind}:{hashlib.sha1(url.encode()).hexdigest()}"
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _probe(self, client: httpx.AsyncClient, url: str, image: bool) -> bool:
+        """Whether url answers with a 2xx (and an image content type for images)"""
+        async with self._host_limit(url):
+            try:
+                response = await client.head(url)
+                if response.status_code in HEAD_UNSUPPORTED:
+                    async with client.stream("GET", url) as response:
+                        pass
+            # A malformed URL (InvalidURL is not an HTTPError) is as dead as a 404
+            except (httpx.HTTPError, httpx.InvalidURL, ValueError):
+                return False
+        if not response.is_success:
+            return False
+        content_type = response.headers.get("content-type", "")
+        return content_type.startswith("image/") if image else True
+
+    async def _read_cache(self, urls: list[str], image: bool) -> dict[str, bool]:
+        if not urls:
+            return {}
+        try:
+            redis_client = await redis_manager.get_client()
+            values = await redis_client.mget(
+                [self._get_status_key(url, image) for url in urls]
+            )
+        except Exception as e:
+            print(f"Error reading link statuses: {e}")
+            return {}
+        return {
+            url: value == "1"
+            for url, value in zip(urls, values, strict=True)
+            if value is not None
+        }
+
+    async def _write_cache(self, results: dict[str, bool], image: bool) -> None:
+        try:
+            redis_client = await redis_manager.get_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            for url, alive in results.items():
+                pipeline.setex(
+                    self._get_status_key(url, image),
+                    LINK_ALIVE_TTL if alive else LINK_DEAD_TTL,
+                    "1" if alive else "0",
+                )
+            await pipeline.execute()
+        except Exception as e:
+            print(f"Error saving link statuses: {e}")
+
+    async def check_many(
+        self, urls: list[str], image: bool = False, use_cache: bool = True
+    ) -> dict[str, bool]:
+        """Alive/dead for every URL, checking the ones not cached"""
+        urls = list(dict.fromkeys(url for url in urls if url))
+        results = await self._read_cache(urls, image) if use_cache else {}
+        pending = [url for url in urls if url not in results]
+        if not pending:
+            return results
+
+        if self._client is not None:
+            checked = await asyncio.gather(
+                *(self._probe(self._client, url, image) for url in pending)
+            )
+        else:
+            # Not started (e.g. ingestion scripts): a client for this call only
+            async with self._new_client() as client:
+                checked = await asyncio.gather(
+                    *(self._probe(client, url, image) for url in pending)
+                )
+        fresh = dict(zip(pending, checked, strict=True))
+        self.checked += len(fresh)
+        self.dead += sum(not alive for alive in fresh.values())
+        await self._write_cache(fresh, image)
+        return results | fresh
+
+    def _in_background(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _check_in_background(self, urls: list[str], image: bool = False) -> None:
+        """Schedule a check of the urls not already being checked"""
+        urls = [url for url in dict.fromkeys(urls) if (image, url) not in _pending]
+        if not urls:
+            return
+        _pending.update((image, url) for url in urls)
+        self._in_background(self._check_pending(urls, image))
+
+    async def _check_pending(self, urls: list[str], image: bool) -> None:
+        try:
+            async with self._background_limit:
+                await self.check_many(urls, image=image)
+        except Exception as e:
+            print(f"Error checking links: {e}")
+        finally:
+            _pending.difference_update((image, url) for url in urls)
+
+    async def _mark_hot(self, urls: list[str]) -> None:
+        """Remember when URLs were last served, for background revalidation"""
+        try:
+            redis_client = await redis_manager.get_client()
+            now = time.time()
+            await redis_client.zadd(self.hot_key, {url: now for url in urls})
+        except Exception as e:
+            print(f"Error recording served links: {e}")
+
+    async def filter_rooms(self, rooms: list[dict]) -> list[dict]:
+        """
+        Drop rooms whose listing is known to be dead and blank known-dead
+        images, using cached statuses only. Unknown URLs are checked in the
+        background so the next request can filter them.
+        """
+        if not LINK_CHECK_ENABLED or not rooms:
+            return rooms
+        pages = [room.get("web_url") for room in rooms]
+        # Thumbnails from our own image store need no checking
+        images = [
+            url if url and url.startswith("http") else None
+            for url in (room.get("image_url") for room in rooms)
+        ]
+        page_status = await self._read_cache([u for u in pages if u], image=False)
+        image_status = await self._read_cache([u for u in images if u], image=True)
+
+        unknown_pages = [u for u in pages if u and u not in page_status]
+        unknown_images = [u for u in images if u and u not in image_status]
+        if unknown_pages:
+            self._check_in_background(unknown_pages)
+        if unknown_images:
+            self._check_in_background(unknown_images, image=True)
+        if any(pages):
+            self._in_background(self._mark_hot([u for u in pages if u]))
+
+        alive = []
+        for room in rooms:
+            if page_status.get(room.get("web_url"), True) is False:
+                self.filtered += 1
+                continue
+            if image_status.get(room.get("image_url"), True) is False:
+                room = {**room, "image_url": None}
+            alive.append(room)
+        return alive
+
+    async def filter_places(self, places: list[dict]) -> list[dict]:
+        """
+        Drop places whose page is dead and prune their dead images, checking
+        every URL not cached yet. Used where results are produced, not served.
+        """
+        if not LINK_CHECK_ENABLED or not places:
+            return places
+        page_status, image_status = await asyncio.gather(
+            self.check_many([place.get("web_url") for place in places]),
+            self.check_many(
+                [url for place in places for url in place.get("image_urls") or []],
+                image=True,
+            ),
+        )
+        alive = []
+        for place in places:
+            if not page_status.get(place.get("web_url"), False):
+                self.filtered += 1
+                continue
+            images = [url for url in place.get("image_urls") or [] if image_status.get(url)]
+            alive.append({**place, "image_urls": images})
+        return alive
+
+    async def revalidate_hot(self) -> int:
+        """Recheck recently served listings, bypassing the cache"""
+        redis_client = await redis_manager.get_client()
+        # One worker per interval does the work
+        if not await redis_client.set(
+            self.revalidate_lock_key, "1", nx=True, ex=max(int(LINK_REVALIDATE_INTERVAL), 1)
+        ):
+            return 0
+        cutoff = time.time() - LINK_HOT_WINDOW
+        await redis_client.zremrangebyscore(self.hot_key, "-inf", cutoff)
+        urls = await redis_client.zrevrange(self.hot_key, 0, LINK_HOT_LIMIT - 1)
+        if urls:
+            await self.check_many(urls, use_cache=False)
+        return len(urls)
+
+    async def run_revalidation(self) -> None:
+        """Revalidate hot listings every LINK_REVALIDATE_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(LINK_REVALIDATE_INTERVAL)
+            try:
+                count = await self.revalidate_hot()
+                if count:
+                    print(f"🔗 Revalidated {count} hot listing links")
+            except Exception as e:
+                print(f"Error revalidating hot links: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "checked": self.checked,
+            "dead": self.dead,
+            "filtered": self.filtered,
+            "background_checks": len(self._background),
+            "pending_links": len(_pending),
+        }
+
+
+link_checker = LinkChecker()
@@ -0,0 +1,120 @@
+"""
+Compact, memory-mapped columnar store for listing fields.
+
+Chroma keeps only IDs, vectors and filterable fields; everything a client
+sees (titles, prices, images, URLs, full text) lives here and is hydrated
+per query with field projection. Each column is two files:
+
+    <column>.offsets.npy    int64 offsets, one per row plus one
+    <column>.data           concatenated JSON-encoded values
+
+so reading a column for a handful of rows only touches those byte ranges.
+"""
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+LISTINGS_DIRECTORY = "listings"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+# Fields hydrated from the store for API responses
+ROOM_FIELDS = (
+    "title",
+    "type",
+    "description",
+    "price",
+    "city",
+    "rating",
+    "reviews_count",
+    "image_url",
+    "web_url",
+)
+
+
+class ListingStore:
+    """Read side of the columnar listing store"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported listing store format {manifest['format']}")
+        self.columns = manifest["columns"]
+        self._offsets = {}
+        self._data = {}
+        for column in ["id"] + self.columns:
+            self._open_column(column)
+        self._rows = {
+            listing_id: row for row, listing_id in enumerate(self._read_column("id"))
+        }
+
+    def _open_column(self, column: str) -> None:
+        self._offsets[column] = np.load(
+            os.path.join(self.path, f"{column}.offsets.npy"), mmap_mode="r"
+        )
+        data_path = os.path.join(self.path, f"{column}.data")
+        if os.path.getsize(data_path) == 0:
+            self._data[column] = b""
+            return
+        with open(data_path, "rb") as f:
+            self._data[column] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read(self, column: str, row: int):
+        offsets = self._offsets[column]
+        return json.loads(self._data[column][int(offsets[row]) : int(offsets[row + 1])])
+
+    def _read_column(self, column: str) -> list:
+        return [self._read(column, row) for row in range(len(self._offsets[column]) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, listing_id: str) -> bool:
+        return listing_id in self._rows
+
+    def get(self, ids: list[str], fields: tuple[str, ...] | None = None) -> list[dict | None]:
+        """Rows for ids in order (None for unknown IDs), projected to fields"""
+        fields = fields or tuple(self.columns)
+        rows = []
+        for listing_id in ids:
+            row = self._rows.get(listing_id)
+            if row is None:
+                rows.append(None)
+                continue
+            rows.append({field: self._read(field, row) for field in fields})
+        return rows
+
+    @classmethod
+    def open_if_exists(cls, path: str) -> "ListingStore | None":
+        if not os.path.exists(os.path.join(path, MANIFEST)):
+            return None
+        return cls(path)
+
+    @staticmethod
+    def write(path: str, records: list[dict], columns: list[str]) -> None:
+        """Write records (each with an "id") as a new store at path"""
+        os.makedirs(path, exist_ok=True)
+        records = sorted(records, key=lambda record: record["id"])
+        for column in ["id"] + columns:
+            offsets = [0]
+            with open(os.path.join(path, f"{column}.data"), "wb") as f:
+                for record in records:
+                    value = json.dumps(
+                        record.get(column), ensure_ascii=False, separators=(",", ":")
+                    ).encode()
+                    f.write(value)
+                    offsets.append(offsets[-1] + len(value))
+            np.save(
+                os.path.join(path, f"{column}.offsets.npy"),
+                np.asarray(offsets, dtype=np.int64),
+            )
+        # The manifest is written last, so a store without one is incomplete
+        with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(
+                {"format": FORMAT_VERSION, "columns": columns, "count": len(records)}, f
+            )
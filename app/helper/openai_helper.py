@@ -1,11 +1,17 @@
-from dataclasses import dataclass
+import asyncio
+import math
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
 from enum import StrEnum
 from typing import TypeVar
 
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI
 from pydantic import BaseModel
 
 from app import settings
+from app.helper.resilience_helper import CircuitBreaker, LatencyTracker, backoff_delay
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -26,12 +32,167 @@ class OpenAIMessage:
     content: str
 
 
+class OpenAIError(Exception):
+    """Raised when an OpenAI call fails after retries"""
+
+
+class CircuitOpenError(OpenAIError):
+    """Raised without calling OpenAI while the model's breaker is open"""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"OpenAI circuit for {model} is open")
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+# Transient failures worth retrying; anything else is the request's own fault
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+@dataclass(slots=True)
+class ModelHealth:
+    """Latency, breaker and hedging counters of one model"""
+
+    breaker: CircuitBreaker
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+    calls: int = 0
+    retries: int = 0
+    failures: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait before hedging, None until enough latencies are known"""
+        if (
+            not settings.OPENAI_HEDGE_ENABLED
+            or len(self.latency) < settings.OPENAI_HEDGE_MIN_SAMPLES
+        ):
+            return None
+        return max(
+            self.latency.percentile(settings.OPENAI_HEDGE_PERCENTILE),
+            settings.OPENAI_HEDGE_MIN_DELAY,
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "breaker": self.breaker.snapshot(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+            "hedge_delay": self.hedge_delay(),
+        }
+
+
 class OpenAIService:
     """Service class for OpenAI API interactions with structured data"""
 
     def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+        # Retries are done here, with hedging and a breaker around them
+        self.client = AsyncOpenAI(
+            api_key=api_key, timeout=settings.OPENAI_TIMEOUT, max_retries=0
+        )
         self.model = 'gpt-4o-mini'
+        self.health: dict[str, ModelHealth] = {}
+
+    def _health(self, model: str) -> ModelHealth:
+        if model not in self.health:
+            self.health[model] = ModelHealth(
+                CircuitBreaker(
+                    settings.OPENAI_BREAKER_FAILURES, settings.OPENAI_BREAKER_RESET_SECONDS
+                )
+            )
+        return self.health[model]
+
+    async def _hedged(self, health: ModelHealth, request: Callable[[], Awaitable]):
+        """
+        Send request; if it is still pending after the model's p95 latency,
+        send a second copy and take whichever succeeds first.
+        """
+        async def timed():
+            started = time.perf_counter()
+            result = await request()
+            health.latency.record(time.perf_counter() - started)
+            return result
+
+        primary = asyncio.create_task(timed())
+        tasks = [primary]
+        try:
+            delay = health.hedge_delay()
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            health.hedges += 1
+            hedge = asyncio.create_task(timed())
+            tasks.append(hedge)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            health.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _call(self, model: str, request: Callable[[], Awaitable]):
+        """Run request with hedging, jittered retries and the model's breaker"""
+        health = self._health(model)
+        health.calls += 1
+        for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+            if not health.breaker.allow():
+                raise CircuitOpenError(model, health.breaker.retry_after())
+            try:
+                result = await self._hedged(health, request)
+            except RETRYABLE_ERRORS as e:
+                health.breaker.record_failure()
+                if attempt == settings.OPENAI_MAX_RETRIES:
+                    health.failures += 1
+                    raise OpenAIError(f"OpenAI API error: {e}") from e
+                health.retries += 1
+                await asyncio.sleep(
+                    backoff_delay(
+                        attempt,
+                        settings.OPENAI_RETRY_BASE_DELAY,
+                        settings.OPENAI_RETRY_MAX_DELAY,
+                    )
+                )
+                continue
+            except Exception as e:
+                # A bad request says nothing about the model's health
+                health.failures += 1
+                raise OpenAIError(f"OpenAI API error: {e}") from e
+            finally:
+                # A probe that was cancelled or failed on its own input must
+                # not leave the half-open breaker waiting for it forever
+                health.breaker.release()
+            health.breaker.record_success()
+            return result
+
+    def snapshot(self) -> dict:
+        """Per-model breaker state and hedging counters"""
+        return {model: health.snapshot() for model, health in self.health.items()}
 
     def create_message(self, role: OpendAIRole, content: str) -> OpenAIMessage:
         """Create a structured message"""
@@ -48,36 +209,36 @@ class OpenAIService:
         tools: list[dict] = None,
     ) -> T:
         """Send structured chat completion request to OpenAI"""
-        try:
-            # Convert messages to dict format
-            message_dicts = self.messages_to_dict(messages)
+        # Convert messages to dict format
+        message_dicts = self.messages_to_dict(messages)
 
-            # Send request to OpenAI
-            response = self.client.responses.parse(
+        # Send request to OpenAI
+        response = await self._call(
+            self.model,
+            lambda: self.client.responses.parse(
                 model=self.model,
                 input=message_dicts,
                 text_format=response_format,
-            )
-            return response.output_parsed
+                tools=tools or openai.NOT_GIVEN,
+            ),
+        )
+        return response.output_parsed
 
-        except Exception as e:
-            raise Exception(f"OpenAI API error: {e}")
-
-    def chat_completions_create(
+    async def chat_completions_create(
         self, messages: list[OpenAIMessage], tools: list[dict] = None
     ):
         """Send chat completion request to OpenAI"""
         message_dicts = self.messages_to_dict(messages)
-        try:
-            return self.client.chat.completions.create(
+        return await self._call(
+            self.model,
+            lambda: self.client.chat.completions.create(
                 model=self.model,
                 messages=message_dicts,
                 tools=tools,
                 tool_choice="auto",
                 temperature=0.0,
-            )
-        except Exception as e:
-            raise Exception(f"OpenAI API error: {e}")
+            ),
+        )
 
     def create_system_message(self, content: str) -> OpenAIMessage:
         """Helper to create system message"""
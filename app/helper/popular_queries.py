@@ -0,0 +1,62 @@
+"""
+How often each retrieval query is searched, counted in a Redis sorted set.
+
+Queries are normalized (app/services/intent_router.normalize_prompt) so
+spelling variants of one search share a count, and only the
+POPULAR_QUERY_LIMIT most frequent are kept. The cache prewarmer
+(app/services/prewarm_service.py) replays the top of the set after a deploy
+or an index swap. Counting happens in the background; a search never waits
+on it.
+"""
+
+import asyncio
+
+from app.helper.redis_helper import redis_manager
+from app.services.intent_router import normalize_prompt
+from app.settings import POPULAR_QUERY_LIMIT
+
+
+class PopularQueries:
+    """Search counts of normalized retrieval queries"""
+
+    def __init__(self, limit: int = POPULAR_QUERY_LIMIT):
+        self.queries_key = "popular_queries"
+        self.limit = limit
+        self.recorded = 0
+        self.record_errors = 0
+        self._background: set[asyncio.Task] = set()
+
+    async def _increment(self, query: str) -> None:
+        try:
+            redis_client = await redis_manager.get_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.zincrby(self.queries_key, 1, query)
+            # Least searched first; keep the top `limit`
+            pipeline.zremrangebyrank(self.queries_key, 0, -self.limit - 1)
+            await pipeline.execute()
+            self.recorded += 1
+        except Exception as e:
+            self.record_errors += 1
+            print(f"Error recording popular query: {e}")
+
+    def record(self, query: str) -> None:
+        """Count a search for query, without waiting for Redis"""
+        normalized = normalize_prompt(query)
+        if not normalized:
+            return
+        task = asyncio.create_task(self._increment(normalized))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def top(self, n: int) -> list[str]:
+        """The n most searched queries, most searched first"""
+        if n <= 0:
+            return []
+        redis_client = await redis_manager.get_client()
+        return await redis_client.zrevrange(self.queries_key, 0, n - 1)
+
+    def snapshot(self) -> dict:
+        return {"recorded": self.recorded, "record_errors": self.record_errors}
+
+
+popular_queries = PopularQueries()
@@ -0,0 +1,162 @@
+"""
+Live price and availability overlay over the vector index.
+
+Prices stored with the index are those of the crawl it was built from, so
+they drift within days. Fresh prices are kept apart from the index, one
+small Redis entry per listing ID, and merged into retrieval results at serve
+time; the index is never rewritten for a price change. Entries expire after
+PRICE_OVERLAY_TTL, after which the indexed price applies again.
+
+Listings that are served are remembered, and the price refresher
+(crawlers/prices.py) refetches the recently served ones whose entry is older
+than PRICE_STALE_AFTER through the crawler site adapters.
+"""
+
+import asyncio
+import json
+import time
+
+from app.helper.redis_helper import redis_manager
+from app.settings import (
+    PRICE_HOT_LIMIT,
+    PRICE_HOT_WINDOW,
+    PRICE_OVERLAY_ENABLED,
+    PRICE_OVERLAY_TTL,
+    PRICE_REFRESH_INTERVAL,
+    PRICE_STALE_AFTER,
+)
+
+# Room fields an overlay entry can replace
+PRICE_FIELDS = ("price", "max_price", "extra_price")
+
+
+def _like(current, value):
+    """value in the type of the field it replaces; the listing store keeps text"""
+    return str(value) if isinstance(current, str) else value
+
+
+class PriceOverlay:
+    """Latest known price and availability of listings, keyed by listing ID"""
+
+    def __init__(self):
+        self.overlay_prefix = "price_overlay:"
+        self.hot_key = "price_hot"
+        self.refresh_lock_key = "price_refresh_lock"
+        self.applied = 0
+        self.unavailable = 0
+        self._background: set[asyncio.Task] = set()
+
+    def _get_overlay_key(self, listing_id: str) -> str:
+        """Generate Redis key for the overlay entry of a listing"""
+        return f"{self.overlay_prefix}{listing_id}"
+
+    async def get_many(self, listing_ids: list[str]) -> dict[str, dict]:
+        """Overlay entries of the listings that have one"""
+        if not listing_ids:
+            return {}
+        try:
+            redis_client = await redis_manager.get_client()
+            values = await redis_client.mget(
+                [self._get_overlay_key(listing_id) for listing_id in listing_ids]
+            )
+        except Exception as e:
+            print(f"Error reading price overlay: {e}")
+            return {}
+        return {
+            listing_id: json.loads(value)
+            for listing_id, value in zip(listing_ids, values, strict=True)
+            if value is not None
+        }
+
+    async def put_many(self, entries: dict[str, dict]) -> None:
+        """
+        Store {listing_id: {"price", "max_price", "extra_price", "available",
+        "updated_at"}} entries
+        """
+        if not entries:
+            return
+        try:
+            redis_client = await redis_manager.get_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            for listing_id, entry in entries.items():
+                pipeline.setex(
+                    self._get_overlay_key(listing_id),
+                    PRICE_OVERLAY_TTL,
+                    json.dumps(entry),
+                )
+            await pipeline.execute()
+        except Exception as e:
+            print(f"Error saving price overlay: {e}")
+
+    def _in_background(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _mark_hot(self, listing_ids: list[str]) -> None:
+        """Remember when listings were last served, for the price refresher"""
+        try:
+            redis_client = await redis_manager.get_client()
+            now = time.time()
+            await redis_client.zadd(self.hot_key, {listing_id: now for listing_id in listing_ids})
+        except Exception as e:
+            print(f"Error recording served listings: {e}")
+
+    async def apply(self, rooms: list[dict]) -> list[dict]:
+        """
+        Replace indexed prices with overlay prices and drop listings known to
+        be unavailable. Fields a room doesn't carry are left out.
+        """
+        if not PRICE_OVERLAY_ENABLED or not rooms:
+            return rooms
+        listing_ids = [room["id"] for room in rooms]
+        overlays = await self.get_many(listing_ids)
+        self._in_background(self._mark_hot(listing_ids))
+
+        merged = []
+        for room in rooms:
+            overlay = overlays.get(room["id"])
+            if overlay is None:
+                merged.append(room)
+                continue
+            if not overlay.get("available", True):
+                self.unavailable += 1
+                continue
+            self.applied += 1
+            prices = {
+                field: _like(room[field], overlay[field])
+                for field in PRICE_FIELDS
+                if field in room and overlay.get(field) is not None
+            }
+            merged.append({**room, **prices, "price_updated_at": overlay["updated_at"]})
+        return merged
+
+    async def due_for_refresh(self) -> list[str]:
+        """
+        Recently served listings whose overlay entry is missing or stale.
+        Only one worker per refresh interval gets any.
+        """
+        redis_client = await redis_manager.get_client()
+        if not await redis_client.set(
+            self.refresh_lock_key, "1", nx=True, ex=max(int(PRICE_REFRESH_INTERVAL), 1)
+        ):
+            return []
+        await redis_client.zremrangebyscore(self.hot_key, "-inf", time.time() - PRICE_HOT_WINDOW)
+        listing_ids = await redis_client.zrevrange(self.hot_key, 0, PRICE_HOT_LIMIT - 1)
+        overlays = await self.get_many(listing_ids)
+        stale_before = time.time() - PRICE_STALE_AFTER
+        return [
+            listing_id
+            for listing_id in listing_ids
+            if listing_id not in overlays or overlays[listing_id]["updated_at"] < stale_before
+        ]
+
+    def snapshot(self) -> dict:
+        return {
+            "applied": self.applied,
+            "unavailable": self.unavailable,
+            "background_tasks": len(self._background),
+        }
+
+
+price_overlay = PriceOverlay()
@@ -0,0 +1,197 @@
+"""
+Opt-in sampling profiler for single requests.
+
+A profiled request gets a sampler thread that looks at the event loop
+thread every few milliseconds. If the request's task is the one running,
+the Python stack below the middleware is recorded; otherwise the request
+is suspended and the chain of awaits it is parked on is recorded under an
+"[awaiting]" leaf. That splits Python work from time spent waiting on I/O.
+
+Profiles are written in collapsed-stack format, one "frame;frame;... count"
+line per stack, which flamegraph.pl, speedscope and inferno read directly.
+Requests that aren't profiled only pay for a header lookup.
+"""
+
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from app.settings import (
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_TOKEN,
+)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+AWAITING = "[awaiting]"
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _frame_name(code) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_qualname}"
+
+
+class RequestSampler:
+    """Samples one request's task from a background thread"""
+
+    def __init__(self, root_frame, task: asyncio.Task, interval: float):
+        self.root_frame = root_frame
+        self.task = task
+        self.interval = interval
+        self.loop_thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = self._running_stack(frame)
+            if stack is None:
+                stack = self._awaiting_stack()
+            self.stacks[";".join(stack) or "[middleware]"] += 1
+
+    def _running_stack(self, frame) -> list[str] | None:
+        """Stack from the middleware down, if the request is the one running"""
+        names = []
+        while frame is not None:
+            if frame is self.root_frame:
+                return names[::-1]
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        return None
+
+    def _awaiting_stack(self) -> list[str]:
+        """Coroutines the suspended request is awaiting through, outermost first"""
+        names = []
+        awaitable = self.task.get_coro()
+        seen_root = False
+        while awaitable is not None and hasattr(awaitable, "cr_code"):
+            if seen_root:
+                names.append(_frame_name(awaitable.cr_code))
+            seen_root = seen_root or awaitable.cr_frame is self.root_frame
+            awaitable = awaitable.cr_await
+        if awaitable is not None:
+            names.append(type(awaitable).__name__)
+        return names + [AWAITING]
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware that profiles a request when it carries the X-Profile
+    token or falls into PROFILE_SAMPLE_RATE. Written as plain ASGI rather
+    than BaseHTTPMiddleware so the endpoint runs in the profiled task.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _should_profile(self, scope) -> bool:
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            return True
+        if not PROFILE_TOKEN:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.encode(), profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = RequestSampler(
+            sys._getframe(), asyncio.current_task(), PROFILE_INTERVAL_MS / 1000
+        )
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            elapsed = time.perf_counter() - started
+            try:
+                profile_store.save(profile_id, sampler.stacks)
+                print(
+                    f"🔥 Profiled {scope['path']} in {elapsed * 1000:.0f} ms "
+                    f"({sum(sampler.stacks.values())} samples): /profiles/{profile_id}"
+                )
+            except Exception as e:
+                print(f"Error saving profile {profile_id}: {e}")
+
+
+class ProfileStore:
+    """Collapsed-stack profiles kept in a local directory"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.collapsed")
+
+    def save(self, profile_id: str, stacks: Counter) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id), "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self._prune()
+
+    def load(self, profile_id: str) -> str | None:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _prune(self) -> None:
+        """Keep only the newest max_files profiles"""
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".collapsed")
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[: max(len(paths) - self.max_files, 0)]:
+            os.remove(path)
+
+
+def is_authorized(token: str | None) -> bool:
+    """Whether a request may read stored profiles"""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+profile_store = ProfileStore()
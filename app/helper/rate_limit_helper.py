@@ -0,0 +1,156 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
+
+from app.helper.redis_helper import redis_manager
+from app.settings import (
+    BATCH_RATE_LIMIT_BURST,
+    BATCH_RATE_LIMIT_PER_MINUTE,
+    IP_RATE_LIMIT_BURST,
+    IP_RATE_LIMIT_PER_MINUTE,
+    MAX_CONCURRENT_DEGRADED_PROMPTS,
+    MAX_CONCURRENT_PROMPTS,
+    MAX_QUEUED_PROMPTS,
+    PROMPT_QUEUE_TIMEOUT,
+    SESSION_RATE_LIMIT_BURST,
+    SESSION_RATE_LIMIT_PER_MINUTE,
+)
+
+# Refill and take tokens atomically. Redis TIME keeps every worker on the
+# same clock. Returns {allowed, seconds until enough tokens are available}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed before doing any work"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucketLimiter:
+    """Redis-backed token bucket shared by all workers"""
+
+    def __init__(self, prefix: str, per_minute: float, burst: int):
+        self.prefix = prefix
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.rejected = 0
+
+    async def acquire(self, key: str, cost: int = 1) -> float:
+        """Take tokens for key; return 0 if allowed, else seconds to wait"""
+        try:
+            redis_client = await redis_manager.get_client()
+            allowed, retry_after = await redis_client.eval(
+                TOKEN_BUCKET_SCRIPT,
+                1,
+                f"{self.prefix}{key}",
+                self.rate,
+                self.burst,
+                cost,
+            )
+        except Exception as e:
+            # Fail open: a Redis blip must not turn into an outage
+            print(f"Error checking rate limit for {key}: {e}")
+            return 0.0
+
+        if int(allowed):
+            return 0.0
+        self.rejected += 1
+        return float(retry_after)
+
+
+class ConcurrencyLimiter:
+    """Per-process cap on in-flight work with a bounded, timed wait queue"""
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the block or raise OverloadedError"""
+        if self._semaphore.locked():
+            if self.queued >= self.max_queued:
+                self.shed += 1
+                raise OverloadedError("Prompt queue is full", self.queue_timeout)
+            self.queued += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), timeout=self.queue_timeout
+                )
+            except TimeoutError:
+                self.shed += 1
+                raise OverloadedError(
+                    "Timed out waiting for a prompt slot", self.queue_timeout
+                ) from None
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "shed": self.shed,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+        }
+
+
+session_rate_limiter = TokenBucketLimiter(
+    "rate_limit:session:", SESSION_RATE_LIMIT_PER_MINUTE, SESSION_RATE_LIMIT_BURST
+)
+ip_rate_limiter = TokenBucketLimiter(
+    "rate_limit:ip:", IP_RATE_LIMIT_PER_MINUTE, IP_RATE_LIMIT_BURST
+)
+# Batches are charged one token per unique prompt
+batch_rate_limiter = TokenBucketLimiter(
+    "rate_limit:batch:", BATCH_RATE_LIMIT_PER_MINUTE, BATCH_RATE_LIMIT_BURST
+)
+prompt_concurrency_limiter = ConcurrencyLimiter(
+    MAX_CONCURRENT_PROMPTS, MAX_QUEUED_PROMPTS, PROMPT_QUEUE_TIMEOUT
+)
+# Retrieval-only answers to shed prompts; no queue, full means 503
+degraded_concurrency_limiter = ConcurrencyLimiter(
+    MAX_CONCURRENT_DEGRADED_PROMPTS, 0, PROMPT_QUEUE_TIMEOUT
+)
@@ -0,0 +1,188 @@
+"""
+Single retrieval process shared by all API workers.
+
+The sidecar owns the only Chroma client (and so the only copy of the HNSW
+index in RAM). Workers talk to it over a Unix socket with newline-delimited
+JSON; concurrent requests are coalesced into one embedding call and one
+index search.
+
+    python -m app.helper.retrieval_sidecar
+    VECTOR_INDEX_MODE=sidecar gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w 8
+"""
+
+import asyncio
+import json
+import os
+import socket
+from dataclasses import dataclass, field
+
+from app.helper.listing_store import ROOM_FIELDS
+from app.settings import (
+    RETRIEVAL_BATCH_WINDOW_MS,
+    RETRIEVAL_MAX_BATCH,
+    RETRIEVAL_SOCKET_PATH,
+    RETRIEVAL_SOCKET_TIMEOUT,
+)
+
+
+class RetrievalSidecarClient:
+    """Drop-in replacement for ChromaDBService that queries the sidecar"""
+
+    def __init__(
+        self,
+        socket_path: str = RETRIEVAL_SOCKET_PATH,
+        timeout: float = RETRIEVAL_SOCKET_TIMEOUT,
+    ):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, payload: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(payload).encode() + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+        if not line:
+            raise ConnectionError("Retrieval sidecar closed the connection")
+        return json.loads(line)
+
+    def query_many(self, queries: list[str], n_results: int = 5) -> list[list[dict]]:
+        """Run several queries in one round-trip to the sidecar"""
+        try:
+            response = self._request({"queries": queries, "n_results": n_results})
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            return response["results"]
+        except Exception as e:
+            print(f"Error querying retrieval sidecar: {e}")
+            return [[] for _ in queries]
+
+    def query_similar_rooms(self, query: str, n_results: int = 5):
+        """
+        Tool to search for lodges and villas based on user query using the sidecar.
+        """
+        return self.query_many([query], n_results=n_results)[0]
+
+    def get_rooms(
+        self, ids: list[str], scores: list[float], fields: tuple[str, ...] = ROOM_FIELDS
+    ) -> list[dict]:
+        """Fetch rooms by ID from the sidecar, without any embedding call"""
+        try:
+            response = self._request(
+                {"op": "get", "ids": ids, "scores": scores, "fields": list(fields)}
+            )
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            return response["results"]
+        except Exception as e:
+            print(f"Error fetching rooms from retrieval sidecar: {e}")
+            return []
+
+
+@dataclass(slots=True)
+class _PendingQuery:
+    queries: list[str]
+    n_results: int
+    future: asyncio.Future = field(repr=False)
+
+
+class RetrievalSidecarServer:
+    """Unix socket server that batches queries against one index service"""
+
+    def __init__(
+        self,
+        service,
+        socket_path: str = RETRIEVAL_SOCKET_PATH,
+        batch_window_ms: float = RETRIEVAL_BATCH_WINDOW_MS,
+        max_batch: int = RETRIEVAL_MAX_BATCH,
+    ):
+        self.service = service
+        self.socket_path = socket_path
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue[_PendingQuery] = asyncio.Queue()
+        self.batches = 0
+        self.queries = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if request.get("op") == "get":
+                        # Lookups by ID need no embedding, so they skip the batcher
+                        results = await asyncio.to_thread(
+                            self.service.get_rooms,
+                            request["ids"],
+                            request["scores"],
+                            tuple(request.get("fields", ROOM_FIELDS)),
+                        )
+                    else:
+                        pending = _PendingQuery(
+                            queries=list(request["queries"]),
+                            n_results=int(request.get("n_results", 5)),
+                            future=asyncio.get_running_loop().create_future(),
+                        )
+                        await self.queue.put(pending)
+                        results = await pending.future
+                    response = {"results": results}
+                except Exception as e:
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _next_batch(self) -> list[_PendingQuery]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.batch_window
+        while sum(len(p.queries) for p in batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run_batches(self):
+        while True:
+            batch = await self._next_batch()
+            queries = [q for pending in batch for q in pending.queries]
+            n_results = max(pending.n_results for pending in batch)
+            try:
+                results = await asyncio.to_thread(
+                    self.service.query_many, queries, n_results
+                )
+            except Exception as e:
+                for pending in batch:
+                    pending.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.queries += len(queries)
+            offset = 0
+            for pending in batch:
+                rooms = results[offset : offset + len(pending.queries)]
+                offset += len(pending.queries)
+                pending.future.set_result([r[: pending.n_results] for r in rooms])
+
+    async def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        batcher = asyncio.create_task(self._run_batches())
+        print(f"🔎 Retrieval sidecar listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+if __name__ == "__main__":
+    from app.helper.chromadb_helper import ShardedChromaDBService
+
+    asyncio.run(RetrievalSidecarServer(ShardedChromaDBService()).serve_forever())
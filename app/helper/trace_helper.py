@@ -0,0 +1,177 @@
+"""
+Sampled, anonymized traces of /user-prompt requests for replay.
+
+A trace follows one request through a context variable: the chat service
+times its stages and notes the path taken, tool calls and token counts, and
+the endpoint appends the finished trace as one JSON line to TRACE_LOG_PATH.
+benchmarks/replay.py re-drives the API from that log.
+
+Whole sessions are sampled, by a hash of the session ID, so replayed
+sessions keep all their turns. Session IDs are replaced by a salted hash and
+numbers, emails and links in prompts are masked before anything is written.
+Requests that aren't traced pay for a few clock reads.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from app.settings import TRACE_LOG_PATH, TRACE_SALT, TRACE_SAMPLE_RATE
+
+# Phone, card and national ID numbers, in Latin or Persian digits
+_NUMBER = re.compile(r"[0-9۰-۹٠-٩][0-9۰-۹٠-٩ -]{5,}[0-9۰-۹٠-٩]")
+_EMAIL = re.compile(r"\S+@\S+\.\w+")
+_LINK = re.compile(r"https?://\S+")
+
+
+def scrub(text: str) -> str:
+    """Mask personal details in a prompt, keeping its shape and language"""
+    text = _LINK.sub("<link>", text)
+    text = _EMAIL.sub("<email>", text)
+    return _NUMBER.sub("<number>", text)
+
+
+@dataclass(slots=True)
+class RequestTrace:
+    """What one request did and how long each stage took"""
+
+    prompt: str
+    session_id: str = ""
+    started: float = field(default_factory=time.time)
+    turn: int = 0
+    path: str = ""
+    status: int = 200
+    results: int = 0
+    stages: dict[str, float] = field(default_factory=dict)
+    tool_calls: list[dict] = field(default_factory=list)
+    tokens: dict[str, int] = field(default_factory=dict)
+    _clock: float = field(default_factory=time.perf_counter, repr=False)
+
+
+_current: ContextVar[RequestTrace | None] = ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def trace_stage(name: str):
+    """Add the time spent in the block to the current request's stage"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        trace.stages[name] = trace.stages.get(name, 0.0) + elapsed
+
+
+def annotate(**fields) -> None:
+    """Set fields (path, turn, results) of the current request's trace"""
+    trace = _current.get()
+    if trace is not None:
+        for name, value in fields.items():
+            setattr(trace, name, value)
+
+
+def record_tool_call(name: str, query: str) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.tool_calls.append({"name": name, "query": scrub(query)})
+
+
+def record_usage(usage) -> None:
+    """Token counts of an OpenAI completion"""
+    trace = _current.get()
+    if trace is not None and usage is not None:
+        trace.tokens["prompt"] = trace.tokens.get("prompt", 0) + usage.prompt_tokens
+        trace.tokens["completion"] = (
+            trace.tokens.get("completion", 0) + usage.completion_tokens
+        )
+
+
+class RequestTracer:
+    """Starts request traces and appends the sampled ones to a local log"""
+
+    def __init__(
+        self,
+        path: str = TRACE_LOG_PATH,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        salt: str = TRACE_SALT,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.salt = salt.encode()
+        self.written = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def _session_hash(self, session_id: str) -> str:
+        return hmac.new(self.salt, session_id.encode(), hashlib.sha256).hexdigest()
+
+    def sampled(self, session_id: str) -> bool:
+        """Whether a session is traced; the same for all its requests"""
+        if not session_id:
+            return False
+        return int(self._session_hash(session_id)[:8], 16) / 0xFFFFFFFF < self.sample_rate
+
+    @contextmanager
+    def trace(self, prompt: str):
+        """
+        Trace the request run in the block. The block sets trace.session_id
+        once it's known; the trace is written if that session is sampled.
+        """
+        if not self.enabled:
+            yield None
+            return
+        trace = RequestTrace(prompt)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except Exception as e:
+            trace.status = getattr(e, "status_code", 500)
+            raise
+        finally:
+            _current.reset(token)
+            if self.sampled(trace.session_id):
+                self.write(trace)
+
+    def write(self, trace: RequestTrace) -> None:
+        record = {
+            "ts": round(trace.started, 3),
+            "session": self._session_hash(trace.session_id)[:16],
+            "turn": trace.turn,
+            "prompt": scrub(trace.prompt),
+            "path": trace.path,
+            "status": trace.status,
+            "results": trace.results,
+            "total_ms": round((time.perf_counter() - trace._clock) * 1000, 2),
+            "stages": {name: round(ms, 2) for name, ms in trace.stages.items()},
+            "tool_calls": trace.tool_calls,
+            "tokens": trace.tokens,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self.written += 1
+        except OSError as e:
+            print(f"Error writing request trace: {e}")
+
+    def snapshot(self) -> dict:
+        return {"sample_rate": self.sample_rate, "written": self.written}
+
+
+request_tracer = RequestTracer()
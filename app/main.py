@@ -1,19 +1,57 @@
+import asyncio
+import json
+import math
 import os
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
+from app.helper.chromadb_helper import embedding_cache
+from app.helper.image_store import ImmutableStaticFiles
+from app.helper.link_checker import link_checker
+from app.helper.openai_helper import openapi_service
+from app.helper.popular_queries import popular_queries
+from app.helper.price_overlay import price_overlay
+from app.helper.profiler_helper import ProfilerMiddleware, is_authorized, profile_store
+from app.helper.rate_limit_helper import (
+    OverloadedError,
+    batch_rate_limiter,
+    degraded_concurrency_limiter,
+    ip_rate_limiter,
+    prompt_concurrency_limiter,
+    session_rate_limiter,
+)
 from app.helper.redis_helper import redis_manager
-from app.services.chat_service import get_suggestion_places_from_db
+from app.helper.trace_helper import request_tracer
+from app.schema import BatchPromptRequest
+from app.services.batch_service import batch_prompt_service
+from app.services.chat_manager import chat_manager
+from app.services.chat_service import get_more_places, get_suggestion_places_from_db
+from app.services.intent_router import intent_router
+from app.services.prewarm_service import cache_prewarmer
+from app.services.suggestion_cache import suggestion_cache
 from app.settings import (
     ALLOW_ALL_ORIGINS,
     CORS_ORIGINS,
+    DEGRADE_ON_OVERLOAD,
     ENVIRONMENT,
     HOST,
+    IMAGE_BASE_URL,
+    IMAGE_STORE_DIR,
+    LINK_CHECK_ENABLED,
+    LINK_REVALIDATE_INTERVAL,
     PORT,
+    PREWARM_ON_STARTUP,
+    PRICE_OVERLAY_ENABLED,
+    PRICE_REFRESH_INTERVAL,
+    RATE_LIMIT_ENABLED,
+    TRUST_PROXY_HEADERS,
 )
+from crawlers.prices import price_refresher
 
 
 @asynccontextmanager
@@ -25,10 +63,36 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"❌ Startup failed: {e}")
         raise
+    chat_manager.start()
+    link_checker.start()
+    # Directory behind the /images mount, unless thumbnails come from a CDN
+    if IMAGE_BASE_URL.startswith("/"):
+        os.makedirs(IMAGE_STORE_DIR, exist_ok=True)
+
+    # Load the index and fill the embedding cache before serving
+    if PREWARM_ON_STARTUP:
+        await cache_prewarmer.run()
+
+    # Keep links of recently served listings checked before their cache expires
+    revalidation = None
+    if LINK_CHECK_ENABLED and LINK_REVALIDATE_INTERVAL > 0:
+        revalidation = asyncio.create_task(link_checker.run_revalidation())
+
+    # Keep prices of recently served listings fresh in the price overlay
+    price_refresh = None
+    if PRICE_OVERLAY_ENABLED and PRICE_REFRESH_INTERVAL > 0:
+        price_refresh = asyncio.create_task(price_refresher.run())
 
     yield
 
     # Shutdown
+    if revalidation is not None:
+        revalidation.cancel()
+    if price_refresh is not None:
+        price_refresh.cancel()
+    # Write sessions still waiting in the write-behind queue
+    await chat_manager.stop()
+    await link_checker.close()
     try:
         await redis_manager.disconnect()
     except Exception as e:
@@ -48,6 +112,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps every other middleware
+app.add_middleware(ProfilerMiddleware)
+
+# Listing thumbnails, unless IMAGE_BASE_URL points them at a CDN
+# (the directory is created at startup, not on import)
+if IMAGE_BASE_URL.startswith("/"):
+    app.mount(
+        IMAGE_BASE_URL,
+        ImmutableStaticFiles(directory=IMAGE_STORE_DIR, check_dir=False),
+        name="images",
+    )
+
+# Prompts answered retrieval-only because the LLM path was saturated
+degraded_prompts = 0
 
 
 @app.get("/")
@@ -60,12 +138,117 @@ async def root():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for the prompt pipeline"""
+    cache = intent_router.cache_info()
+    return {
+        "router": {
+            **intent_router.stats.snapshot(),
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        },
+        "admission": {
+            **prompt_concurrency_limiter.snapshot(),
+            "session_rate_limited": session_rate_limiter.rejected,
+            "ip_rate_limited": ip_rate_limiter.rejected,
+            "degraded": degraded_prompts,
+            "degraded_in_flight": degraded_concurrency_limiter.in_flight,
+            "degraded_shed": degraded_concurrency_limiter.shed,
+        },
+        "sessions": chat_manager.snapshot(),
+        "prewarm": {**cache_prewarmer.snapshot(), **popular_queries.snapshot()},
+        "embeddings": embedding_cache.snapshot(),
+        "openai": openapi_service.snapshot(),
+        "suggestions": suggestion_cache.snapshot(),
+        "links": link_checker.snapshot(),
+        "traces": request_tracer.snapshot(),
+        "prices": {**price_overlay.snapshot(), **price_refresher.snapshot()},
+        "batch": {
+            **batch_prompt_service.stats.snapshot(),
+            "rate_limited": batch_rate_limiter.rejected,
+        },
+    }
+
+
+@app.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, request: Request):
+    """Collapsed-stack profile of a request, for flamegraph.pl or speedscope"""
+    if not is_authorized(request.headers.get("x-profile")):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    profile = profile_store.load(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+def _client_ip(request: Request) -> str:
+    """Client address, taken from X-Forwarded-For only behind a trusted proxy"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if TRUST_PROXY_HEADERS and forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def _check_rate_limits(request: Request, session_id: str) -> None:
+    """Reject the request with 429 if its session or client IP is over budget"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    buckets = [(ip_rate_limiter, _client_ip(request), 1)]
+    if session_id:
+        buckets.append((session_rate_limiter, session_id, 1))
+    await _acquire_or_reject(buckets)
+
+
+async def _acquire_or_reject(buckets: list[tuple]) -> None:
+    """Take cost tokens from each (limiter, key, cost) bucket or raise 429"""
+    for limiter, key, cost in buckets:
+        retry_after = await limiter.acquire(key, cost)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+def _unavailable(error: OverloadedError) -> HTTPException:
+    """503 telling the client when to retry a shed request"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": error.retry_after_header},
+    )
+
+
 @app.get("/user-prompt")
-async def user_prompt(prompt: str, session_id: str = ""):
+async def user_prompt(request: Request, prompt: str, session_id: str = ""):
     """User prompt endpoint"""
-    places, session_id, content = await get_suggestion_places_from_db(
-        prompt, session_id
-    )
+    global degraded_prompts
+    await _check_rate_limits(request, session_id)
+    with request_tracer.trace(prompt) as trace:
+        if trace is not None:
+            trace.session_id = session_id
+        try:
+            async with prompt_concurrency_limiter.slot():
+                places, session_id, content = await get_suggestion_places_from_db(
+                    prompt, session_id
+                )
+        except OverloadedError as e:
+            if not DEGRADE_ON_OVERLOAD:
+                raise _unavailable(e) from e
+            # Shed the LLM work but still answer from the vector index,
+            # unless that path is saturated too
+            try:
+                async with degraded_concurrency_limiter.slot():
+                    degraded_prompts += 1
+                    places, session_id, content = await get_suggestion_places_from_db(
+                        prompt, session_id, retrieval_only=True
+                    )
+            except OverloadedError as degraded_error:
+                raise _unavailable(degraded_error) from degraded_error
+        if trace is not None:
+            trace.session_id = session_id
     return {
         "tool_response": places,
         "session_id": session_id,
@@ -73,6 +256,37 @@ async def user_prompt(prompt: str, session_id: str = ""):
     }
 
 
+@app.post("/user-prompt/batch")
+async def user_prompt_batch(request: Request, body: BatchPromptRequest):
+    """
+    Answer many prompts at once, streamed as NDJSON lines in completion order.
+    Each line carries the index of the item it answers.
+    """
+    items = [(item.prompt, item.session_id or "") for item in body.items]
+    if RATE_LIMIT_ENABLED:
+        cost = len(batch_prompt_service.group(items))
+        await _acquire_or_reject([(batch_rate_limiter, _client_ip(request), cost)])
+
+    async def lines():
+        async for result in batch_prompt_service.run(items):
+            yield json.dumps(jsonable_encoder(result), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/user-prompt/more")
+async def user_prompt_more(request: Request, session_id: str, cursor: int | None = None):
+    """Next page of the session's last search, without a new LLM or embedding call"""
+    await _check_rate_limits(request, session_id)
+    places, query, next_cursor = await get_more_places(session_id, cursor)
+    return {
+        "tool_response": places,
+        "session_id": session_id,
+        "query": query,
+        "next_cursor": next_cursor,
+    }
+
+
 if __name__ == "__main__":
     print(f"🚀 Starting Khesht API on {HOST}:{PORT}")
     print(f"🌍 Environment: {ENVIRONMENT}")
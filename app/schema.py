@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 
+from app.settings import BATCH_MAX_ITEMS
+
 
 class UserPromptRequest(BaseModel):
     """Request body for user prompt"""
@@ -8,6 +10,18 @@ class UserPromptRequest(BaseModel):
     session_id: str | None = Field(default="")
 
 
+class BatchPromptItem(BaseModel):
+    """One prompt of a batch"""
+
+    prompt: str = Field(min_length=1)
+    session_id: str | None = Field(default="")
+
+
+class BatchPromptRequest(BaseModel):
+    """Request body for a batch of user prompts"""
+
+    items: list[BatchPromptItem] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
 
 class Place(BaseModel):
     """Place model"""
@@ -0,0 +1,257 @@
+"""
+Batch prompt answering for partner and back-office jobs.
+
+Identical sessionless prompts, and identical searches of one session, are
+answered once. Prompts the router can answer from the index are searched
+together: their queries are embedded in one call and looked up in one
+multi-query index search. The rest need the LLM and run at most
+BATCH_LLM_CONCURRENCY at a time, through the same admission control as
+single prompts. Prompts of one session run one after
+another in input order, so each sees the turns saved before it; different
+sessions run in parallel. Results are yielded as each prompt completes,
+tagged with the index of the item they answer.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
+from functools import partial
+
+from app.helper.chromadb_helper import chroma_db_service
+from app.helper.rate_limit_helper import (
+    OverloadedError,
+    degraded_concurrency_limiter,
+    prompt_concurrency_limiter,
+)
+from app.services.chat_manager import chat_manager
+from app.services.chat_service import answer_from_index, get_suggestion_places_from_db
+from app.services.intent_router import (
+    Intent,
+    RouteDecision,
+    intent_router,
+    normalize_prompt,
+)
+from app.settings import (
+    BATCH_LLM_CONCURRENCY,
+    CANDIDATE_POOL_SIZE,
+    DEGRADE_ON_OVERLOAD,
+)
+
+
+@dataclass(slots=True)
+class BatchStats:
+    """Counters describing batches and the work deduplication saved"""
+
+    batches: int = 0
+    items: int = 0
+    unique_items: int = 0
+    searched_queries: int = 0
+    llm_items: int = 0
+    degraded: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_batch(self, items: int, unique_items: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += items
+            self.unique_items += unique_items
+
+    def add(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "unique_items": self.unique_items,
+                "deduplicated": self.items - self.unique_items,
+                "searched_queries": self.searched_queries,
+                "llm_items": self.llm_items,
+                "degraded": self.degraded,
+                "failed": self.failed,
+                "avg_batch_seconds": self.seconds / self.batches if self.batches else 0.0,
+            }
+
+
+def _answer(places: list, session_id: str, content: str) -> dict:
+    return {
+        "tool_response": places,
+        "session_id": session_id,
+        "assistant_response": content,
+    }
+
+
+class BatchPromptService:
+    """Answers many (prompt, session_id) items with shared retrieval work"""
+
+    def __init__(self, llm_concurrency: int = BATCH_LLM_CONCURRENCY):
+        self.llm_concurrency = llm_concurrency
+        self.stats = BatchStats()
+
+    @staticmethod
+    def group(items: list[tuple[str, str]]) -> dict[tuple[str, str, int], list[int]]:
+        """
+        Item indexes by unit of work. Sessionless duplicates share one new
+        session, as a single answer is given to all of them. Within a session
+        only duplicate fast-path searches are merged: paging and chat turns
+        change the session, so each of those runs once per item.
+        """
+        groups: dict[tuple[str, str, int], list[int]] = {}
+        for index, (prompt, session_id) in enumerate(items):
+            decision = intent_router.route(prompt)
+            stateless = decision.fast_path and decision.intent == Intent.SEARCH
+            key = (
+                normalize_prompt(prompt),
+                session_id or "",
+                -1 if stateless or not session_id else index,
+            )
+            groups.setdefault(key, []).append(index)
+        return groups
+
+    async def _search(
+        self, decisions: dict[int, RouteDecision]
+    ) -> dict[int, list[dict]]:
+        """
+        Candidates of every fast-path item from one multi-query search;
+        empty if the search fails
+        """
+        queries = list(dict.fromkeys(d.query for d in decisions.values()))
+        if not queries:
+            return {}
+        try:
+            results = await asyncio.to_thread(
+                chroma_db_service.query_many, queries, CANDIDATE_POOL_SIZE
+            )
+        except Exception as e:
+            print(f"Error searching batch queries: {e}")
+            return {}
+        self.stats.add("searched_queries", len(queries))
+        by_query = dict(zip(queries, results, strict=True))
+        return {index: by_query[d.query] for index, d in decisions.items()}
+
+    async def _answer_from_index(
+        self, session_id: str, decision: RouteDecision, candidates: list[dict]
+    ) -> dict:
+        started = time.perf_counter()
+        previous_messages = await chat_manager.get_session_messages(session_id)
+        places, content = await answer_from_index(
+            session_id, previous_messages, decision, candidates
+        )
+        intent_router.stats.record_fast_path(time.perf_counter() - started)
+        return _answer(places, session_id, content)
+
+    async def _answer_with_llm(
+        self, llm_slots: asyncio.Semaphore, prompt: str, session_id: str
+    ) -> dict:
+        async with llm_slots:
+            self.stats.add("llm_items")
+            try:
+                async with prompt_concurrency_limiter.slot():
+                    return _answer(*await get_suggestion_places_from_db(prompt, session_id))
+            except OverloadedError:
+                if not DEGRADE_ON_OVERLOAD:
+                    raise
+                async with degraded_concurrency_limiter.slot():
+                    self.stats.add("degraded")
+                    return _answer(
+                        *await get_suggestion_places_from_db(
+                            prompt, session_id, retrieval_only=True
+                        )
+                    )
+
+    async def _answer_routed(
+        self,
+        llm_slots: asyncio.Semaphore,
+        search: asyncio.Task,
+        leader: int,
+        prompt: str,
+        session_id: str,
+        decision: RouteDecision,
+    ) -> dict:
+        # Shielded: one cancelled item must not cancel the others' search
+        candidates = await asyncio.shield(search)
+        if leader in candidates:
+            return await self._answer_from_index(session_id, decision, candidates[leader])
+        # Without a shared search each one is answered like a single prompt
+        return await self._answer_with_llm(llm_slots, prompt, session_id)
+
+    async def _tagged(
+        self, leader: int, previous: asyncio.Task | None, work: Callable[[], Awaitable]
+    ) -> tuple[int, dict]:
+        """
+        Answer one unique item once the previous item of its session is done,
+        turning failures into an error result
+        """
+        if previous is not None:
+            await asyncio.wait({previous})
+        try:
+            return leader, await work()
+        except Exception as e:
+            print(f"Error answering batch item {leader}: {e}")
+            self.stats.add("failed")
+            return leader, {"error": str(e) or type(e).__name__}
+
+    async def run(self, items: list[tuple[str, str]]) -> AsyncIterator[dict]:
+        """
+        Yield {"index", "tool_response", "session_id", "assistant_response"},
+        or {"index", "error"}, for every item as soon as its answer is ready
+        """
+        started = time.perf_counter()
+        groups = self.group(items)
+        self.stats.record_batch(len(items), len(groups))
+        llm_slots = asyncio.Semaphore(self.llm_concurrency)
+
+        # Route every unique prompt first so all fast-path searches share a call
+        leaders: dict[int, list[int]] = {}
+        sessions: dict[int, str] = {}
+        fast: dict[int, RouteDecision] = {}
+        for indexes in groups.values():
+            leader = indexes[0]
+            prompt, session_id = items[leader]
+            leaders[leader] = indexes
+            sessions[leader] = session_id or str(uuid.uuid4())
+            decision = intent_router.route(prompt)
+            if decision.fast_path and decision.intent == Intent.SEARCH:
+                fast[leader] = decision
+
+        search = asyncio.create_task(self._search(fast))
+        # Last task of each session; the session's next item waits for it
+        chains: dict[str, asyncio.Task] = {}
+        tasks: list[asyncio.Task] = []
+        # Groups are in input order, so each session's items chain in that order
+        for leader in leaders:
+            prompt, session_id = items[leader][0], sessions[leader]
+            if leader in fast:
+                work = partial(
+                    self._answer_routed,
+                    llm_slots, search, leader, prompt, session_id, fast[leader],
+                )
+            else:
+                # LLM items start while the index is searched
+                work = partial(self._answer_with_llm, llm_slots, prompt, session_id)
+            task = asyncio.create_task(
+                self._tagged(leader, chains.get(session_id), work)
+            )
+            chains[session_id] = task
+            tasks.append(task)
+
+        try:
+            for done in asyncio.as_completed(tasks):
+                leader, answer = await done
+                for index in leaders[leader]:
+                    yield {"index": index, **answer}
+        finally:
+            # A client that disconnects mid-stream cancels the remaining work
+            for task in [search, *tasks]:
+                task.cancel()
+            self.stats.add("seconds", time.perf_counter() - started)
+
+
+batch_prompt_service = BatchPromptService()
@@ -0,0 +1,67 @@
+import json
+
+from app.helper.redis_helper import redis_manager
+
+
+class CandidateManager:
+    """Ranked candidate list of a session's last search, paged by cursor"""
+
+    def __init__(self):
+        self.candidates_prefix = "chat_candidates:"
+
+    def _get_candidates_key(self, session_id: str) -> str:
+        """Generate Redis key for a session's candidates"""
+        return f"{self.candidates_prefix}{session_id}"
+
+    async def save_candidates(
+        self, session_id: str, query: str, rooms: list[dict], cursor: int
+    ) -> None:
+        """Store room IDs and scores of a search; rooms before cursor were shown"""
+        try:
+            redis_client = await redis_manager.get_client()
+            seen = set()
+            candidates = []
+            for room in rooms:
+                if room["id"] not in seen:
+                    seen.add(room["id"])
+                    candidates.append([room["id"], round(room["similarity_score"], 4)])
+            data = {"query": query, "candidates": candidates, "cursor": cursor}
+
+            # Same lifetime as the session messages (24 hours)
+            await redis_client.setex(
+                self._get_candidates_key(session_id), 86400, json.dumps(data)
+            )
+        except Exception as e:
+            print(f"Error saving candidates for session {session_id}: {e}")
+
+    async def next_page(
+        self, session_id: str, page_size: int, cursor: int | None = None
+    ) -> tuple[str, list[tuple[str, float]], int | None]:
+        """
+        Return (query, [(room_id, score)], next_cursor) for the page at cursor,
+        defaulting to the first page not yet shown. next_cursor is None when
+        the candidate list is exhausted.
+        """
+        try:
+            redis_client = await redis_manager.get_client()
+            key = self._get_candidates_key(session_id)
+            data_json = await redis_client.get(key)
+            if data_json is None:
+                return "", [], None
+
+            data = json.loads(data_json)
+            start = data["cursor"] if cursor is None else max(cursor, 0)
+            page = [tuple(c) for c in data["candidates"][start : start + page_size]]
+            end = start + len(page)
+
+            data["cursor"] = max(data["cursor"], end)
+            await redis_client.setex(key, 86400, json.dumps(data))
+
+            next_cursor = end if end < len(data["candidates"]) else None
+            return data["query"], page, next_cursor
+        except Exception as e:
+            print(f"Error reading candidates for session {session_id}: {e}")
+            return "", [], None
+
+
+candidate_manager = CandidateManager()
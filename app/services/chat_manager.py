@@ -1,12 +1,115 @@
+"""
+Session history with an in-process cache in front of Redis.
+
+Histories are kept in a size-bounded LRU per worker. Each one carries a
+version that grows with every save, and Redis stores the version next to
+the messages. A cached history is trusted for SESSION_CACHE_FRESH_SECONDS;
+after that Redis is asked whether it holds a newer version, and the
+messages are only sent back when it does.
+
+Saves are write-behind: they update the local entry and queue the session,
+and a background flusher writes queued sessions in pipelined batches. A
+write only lands if Redis doesn't already hold a newer version, so a worker
+with a stale copy can't overwrite history another worker has saved since;
+its unsaved messages are instead appended to the stored history and
+written again, so turns saved by two workers at once are both kept.
+Several saves of a session between flushes are written once. The queue is
+bounded; a save that finds it full flushes first. Pending writes are
+flushed on shutdown. Without a running flusher, saves are written at once.
+"""
+
+import asyncio
 import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 
 from app.helper.openai_helper import OpenAIMessage, OpendAIRole
 from app.helper.redis_helper import redis_manager
+from app.settings import (
+    SESSION_CACHE_FRESH_SECONDS,
+    SESSION_CACHE_SIZE,
+    SESSION_DIRTY_LIMIT,
+    SESSION_FLUSH_BATCH,
+    SESSION_FLUSH_INTERVAL,
+)
+
+# Sessions live for 24 hours after their last save
+SESSION_TTL = 86400
+# Wait after a failed flush before trying again
+FLUSH_RETRY_DELAY = 1.0
+
+# Returns {0} if the session is missing, {1, version} if the stored version
+# is not newer than ARGV[1], else {2, version, messages}. Sessions saved
+# before versioning, plain JSON strings, count as version 0.
+FETCH_SCRIPT = """
+local kind = redis.call('TYPE', KEYS[1]).ok
+if kind == 'none' then
+    return {0}
+end
+if kind == 'string' then
+    return {2, 0, redis.call('GET', KEYS[1])}
+end
+local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if version <= tonumber(ARGV[1]) then
+    return {1, version}
+end
+return {2, version, redis.call('HGET', KEYS[1], 'messages')}
+"""
+
+# Store messages ARGV[2] as version ARGV[1] unless the stored version is
+# the same or newer. Returns 1 if written, 0 if another worker got there first.
+SAVE_SCRIPT = """
+if redis.call('TYPE', KEYS[1]).ok == 'string' then
+    redis.call('DEL', KEYS[1])
+end
+local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if version >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'messages', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+@dataclass(slots=True)
+class _Entry:
+    version: int
+    # Serialized messages, ready to be written
+    payload: str
+    checked_at: float
 
 
 class ChatManager:
-    def __init__(self):
+    def __init__(
+        self,
+        max_entries: int = SESSION_CACHE_SIZE,
+        fresh_seconds: float = SESSION_CACHE_FRESH_SECONDS,
+        dirty_limit: int = SESSION_DIRTY_LIMIT,
+        flush_interval: float = SESSION_FLUSH_INTERVAL,
+        flush_batch: int = SESSION_FLUSH_BATCH,
+    ):
         self.session_prefix = "chat_session:"
+        self.max_entries = max_entries
+        self.fresh_seconds = fresh_seconds
+        self.dirty_limit = dirty_limit
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # Sessions with unsaved changes, oldest first
+        self._dirty: OrderedDict[str, None] = OrderedDict()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.merged = 0
+        self.dropped = 0
+        self.flush_errors = 0
 
     def _get_session_key(self, session_id: str) -> str:
         """Generate Redis key for session"""
@@ -22,41 +125,238 @@ class ChatManager:
             role=OpendAIRole(message_dict["role"]), content=message_dict["content"]
         )
 
+    def _messages(self, entry: _Entry) -> list[OpenAIMessage]:
+        return [self._deserialize_message(msg) for msg in json.loads(entry.payload)]
+
+    def _remember(self, session_id: str, entry: _Entry) -> None:
+        """Cache entry, evicting the least recently used saved sessions"""
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            evictable = next(
+                (
+                    sid
+                    for sid in self._entries
+                    if sid not in self._dirty and sid != session_id
+                ),
+                None,
+            )
+            if evictable is None:
+                break
+            del self._entries[evictable]
+
     async def get_session_messages(self, session_id: str) -> list[OpenAIMessage]:
         """Retrieve all messages for a session"""
+        entry = self._entries.get(session_id)
+        now = time.monotonic()
+        if entry is not None:
+            self._entries.move_to_end(session_id)
+            if session_id in self._dirty or now - entry.checked_at < self.fresh_seconds:
+                self.hits += 1
+                return self._messages(entry)
+
         try:
             redis_client = await redis_manager.get_client()
-            session_key = self._get_session_key(session_id)
-            messages_json = await redis_client.get(session_key)
-
-            if messages_json is None:
-                return []
-
-            messages_data = json.loads(messages_json)
-            return [self._deserialize_message(msg) for msg in messages_data]
-
+            known = entry.version if entry is not None else -1
+            reply = await redis_client.eval(
+                FETCH_SCRIPT, 1, self._get_session_key(session_id), known
+            )
         except Exception as e:
             # Log the error in a real application
             print(f"Error retrieving messages for session {session_id}: {e}")
+            return self._messages(entry) if entry is not None else []
+
+        status = int(reply[0])
+        if status == 0:
+            # Expired in Redis, unless a write of ours is still queued
+            if session_id not in self._dirty:
+                self._entries.pop(session_id, None)
+                return []
+            return self._messages(self._entries[session_id])
+        if status == 1 and entry is not None:
+            self.revalidated += 1
+            entry.checked_at = now
+            return self._messages(entry)
+        if status == 1:
             return []
 
+        self.fetched += 1
+        version = int(reply[1])
+        current = self._entries.get(session_id)
+        if current is not None and current.version > version:
+            # Saved locally meanwhile; the queued write is newer
+            return self._messages(current)
+        entry = _Entry(version, reply[2], now)
+        self._remember(session_id, entry)
+        return self._messages(entry)
+
     async def save_session_messages(
         self, session_id: str, messages: list[OpenAIMessage]
     ) -> None:
-        """Save messages for a session"""
+        """Save messages for a session; written to Redis in the background"""
+        payload = json.dumps([self._serialize_message(msg) for msg in messages])
+        entry = self._entries.get(session_id)
+        if entry is None:
+            entry = _Entry(0, payload, time.monotonic())
+        entry.version += 1
+        entry.payload = payload
+        self._remember(session_id, entry)
+
+        if session_id not in self._dirty and len(self._dirty) >= self.dirty_limit:
+            await self.flush()
+            if len(self._dirty) >= self.dirty_limit:
+                # Redis is unreachable: give up the oldest unsaved session
+                oldest, _ = self._dirty.popitem(last=False)
+                self._entries.pop(oldest, None)
+                self.dropped += 1
+                print(f"Error saving messages for session {oldest}: dirty queue is full")
+        self._dirty[session_id] = None
+
+        if self._flusher is None:
+            await self.flush_all()
+        else:
+            self._wake.set()
+
+    def _requeue(self, batch: list[tuple[str, int, str]]) -> None:
+        """Queue unwritten sessions again, behind anything saved meanwhile"""
+        for session_id, _, _ in batch:
+            self._dirty.setdefault(session_id, None)
+
+    async def flush(self) -> bool:
+        """Write up to flush_batch queued sessions in one pipeline"""
+        async with self._flush_lock:
+            batch = []
+            while self._dirty and len(batch) < self.flush_batch:
+                session_id, _ = self._dirty.popitem(last=False)
+                entry = self._entries.get(session_id)
+                if entry is not None:
+                    batch.append((session_id, entry.version, entry.payload))
+            if not batch:
+                return True
+
+            try:
+                redis_client = await redis_manager.get_client()
+                pipeline = redis_client.pipeline(transaction=False)
+                for session_id, version, payload in batch:
+                    pipeline.eval(
+                        SAVE_SCRIPT,
+                        1,
+                        self._get_session_key(session_id),
+                        version,
+                        payload,
+                        SESSION_TTL,
+                    )
+                written = await pipeline.execute()
+            except asyncio.CancelledError:
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                print(f"Error saving messages for {len(batch)} sessions: {e}")
+                self.flush_errors += 1
+                self._requeue(batch)
+                return False
+
+            conflicted = []
+            for (session_id, _, _), ok in zip(batch, written, strict=True):
+                if int(ok):
+                    self.writes += 1
+                else:
+                    # Another worker saved a newer history first
+                    self.conflicts += 1
+                    if session_id in self._entries:
+                        conflicted.append(session_id)
+            return await self._merge(conflicted) if conflicted else True
+
+    async def _merge(self, session_ids: list[str]) -> bool:
+        """
+        Rebase the unsaved messages of sessions that lost a write onto the
+        history stored in Redis and queue them again
+        """
         try:
             redis_client = await redis_manager.get_client()
-            session_key = self._get_session_key(session_id)
-            messages_data = [self._serialize_message(msg) for msg in messages]
-            messages_json = json.dumps(messages_data)
+            pipeline = redis_client.pipeline(transaction=False)
+            for session_id in session_ids:
+                pipeline.eval(FETCH_SCRIPT, 1, self._get_session_key(session_id), -1)
+            replies = await pipeline.execute()
+        except Exception as e:
+            print(f"Error reloading {len(session_ids)} conflicting sessions: {e}")
+            self.flush_errors += 1
+            for session_id in session_ids:
+                self._dirty.setdefault(session_id, None)
+            return False
 
-            # Set with expiration (24 hours = 86400 seconds)
-            await redis_client.setex(session_key, 86400, messages_json)
+        now = time.monotonic()
+        for session_id, reply in zip(session_ids, replies, strict=True):
+            entry = self._entries.get(session_id)
+            if entry is None:
+                continue
+            if int(reply[0]) != 2:
+                # Gone from Redis since; ours can be written as it is
+                self._dirty.setdefault(session_id, None)
+                continue
+            version, stored = int(reply[1]), json.loads(reply[2])
+            local = json.loads(entry.payload)
+            # Histories only grow, so whatever follows the shared prefix is ours
+            common = 0
+            while common < min(len(stored), len(local)) and stored[common] == local[common]:
+                common += 1
+            pending = local[common:]
+            entry.checked_at = now
+            if not pending:
+                entry.version, entry.payload = version, reply[2]
+                continue
+            self.merged += 1
+            entry.version = max(entry.version, version) + 1
+            entry.payload = json.dumps(stored + pending)
+            self._dirty.setdefault(session_id, None)
+        return True
 
-        except Exception as e:
-            # Log the error in a real application
-            print(f"Error saving messages for session {session_id}: {e}")
-            raise
+    async def flush_all(self) -> bool:
+        """Flush until the queue is empty or a flush fails"""
+        while self._dirty:
+            if not await self.flush():
+                return False
+        return True
+
+    async def _run_flusher(self) -> None:
+        while True:
+            await self._wake.wait()
+            # Let saves arriving together share a pipeline
+            await asyncio.sleep(self.flush_interval)
+            self._wake.clear()
+            if not await self.flush_all():
+                await asyncio.sleep(FLUSH_RETRY_DELAY)
+                self._wake.set()
+
+    def start(self) -> None:
+        """Start writing saves in the background"""
+        if self._flusher is None:
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def stop(self) -> None:
+        """Stop the background writer and flush pending saves"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if not await self.flush_all():
+            print(f"❌ {len(self._dirty)} sessions could not be saved on shutdown")
+
+    def snapshot(self) -> dict:
+        return {
+            "cached": len(self._entries),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "fetched": self.fetched,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+        }
 
 
 chat_manager = ChatManager()
@@ -1,12 +1,56 @@
+import asyncio
 import json
+import time
 import uuid
 
 from pydantic import BaseModel
 
-from app.helper.openai_helper import openapi_service
 from app.helper.chromadb_helper import chroma_db_service
+from app.helper.link_checker import link_checker
+from app.helper.openai_helper import OpenAIError, openapi_service
+from app.helper.popular_queries import popular_queries
+from app.helper.price_overlay import price_overlay
+from app.helper.trace_helper import (
+    annotate,
+    record_tool_call,
+    record_usage,
+    trace_stage,
+)
 from app.schema import Place
+from app.services.candidate_manager import candidate_manager
 from app.services.chat_manager import chat_manager
+from app.services.intent_router import (
+    Intent,
+    RouteDecision,
+    destination_key,
+    intent_router,
+)
+from app.services.suggestion_cache import suggestion_cache
+from app.settings import (
+    CANDIDATE_POOL_SIZE,
+    RESULTS_PAGE_SIZE,
+    SUGGESTION_CACHE_ENABLED,
+)
+
+ROOM_SEARCH_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "query_similar_rooms",
+            "description": "Search for lodges and villas based on user preferences",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "The search query describing the desired accommodation",
+                    }
+                },
+                "required": ["query"],
+            },
+        },
+    }
+]
 
 
 class SuggestionPlaces(BaseModel):
@@ -59,18 +103,32 @@ Only include listings from approved sources that can be **actually reserved** on
 """
     )
     user_message = openapi_service.create_user_message(prompt)
-    messages = [system_message] + previous_messages + [user_message]
-    response = await openapi_service.send_chat_completion(
-        messages,
-        SuggestionPlaces,
-        tools=[
-            {
-                "type": "web_search_preview",
-                "search_context_size": "low",
-            }
-        ],
-    )
-    places = response.places
+    # Cacheable prompts are searched without the conversation, so one entry
+    # serves every session asking for the same destination
+    cache_key = destination_key(prompt) if SUGGESTION_CACHE_ENABLED else None
+    history = previous_messages if cache_key is None else []
+
+    async def search_web() -> list[dict]:
+        response = await openapi_service.send_chat_completion(
+            [system_message] + history + [user_message],
+            SuggestionPlaces,
+            tools=[
+                {
+                    "type": "web_search_preview",
+                    "search_context_size": "low",
+                }
+            ],
+        )
+        # The prompt asks for live links only; make sure before caching
+        return await link_checker.filter_places(
+            [place.model_dump() for place in response.places]
+        )
+
+    if cache_key is None:
+        places_data = await search_web()
+    else:
+        places_data = await suggestion_cache.get_or_fetch(cache_key, search_web)
+    places = [Place.model_validate(place) for place in places_data]
     assistant_message = openapi_service.create_assistant_message(
         f"suggestions places: {places}"
     )
@@ -80,13 +138,107 @@ Only include listings from approved sources that can be **actually reserved** on
     return places, session_id
 
 
+async def search_rooms(
+    session_id: str, query: str, candidates: list[dict] | None = None
+) -> list[dict]:
+    """
+    Over-fetch candidates once, remember them and return the first page.
+    Pass candidates already searched for query to skip the index search.
+    """
+    if candidates is None:
+        with trace_stage("retrieval"):
+            # Off the event loop: the index and the sidecar client both block
+            candidates = await asyncio.to_thread(
+                chroma_db_service.query_similar_rooms,
+                query,
+                n_results=CANDIDATE_POOL_SIZE,
+            )
+    # Counted for the cache prewarmer
+    popular_queries.record(query)
+    with trace_stage("filter"):
+        candidates = await link_checker.filter_rooms(candidates)
+        candidates = await price_overlay.apply(candidates)
+    await candidate_manager.save_candidates(
+        session_id, query, candidates, cursor=RESULTS_PAGE_SIZE
+    )
+    return candidates[:RESULTS_PAGE_SIZE]
+
+
+async def get_more_places(
+    session_id: str, cursor: int | None = None
+) -> tuple[list[dict], str, int | None]:
+    """Page through the session's stored candidates without LLM or embedding calls"""
+    query, page, next_cursor = await candidate_manager.next_page(
+        session_id, RESULTS_PAGE_SIZE, cursor
+    )
+    if not page:
+        return [], query, next_cursor
+    ids, scores = zip(*page, strict=True)
+    with trace_stage("retrieval"):
+        places = await asyncio.to_thread(
+            chroma_db_service.get_rooms, list(ids), list(scores)
+        )
+    with trace_stage("filter"):
+        places = await link_checker.filter_rooms(places)
+        places = await price_overlay.apply(places)
+    return places, query, next_cursor
+
+
+async def answer_from_index(
+    session_id: str,
+    previous_messages: list,
+    decision: RouteDecision,
+    candidates: list[dict] | None = None,
+) -> tuple[list[dict], str]:
+    """Answer a prompt with retrieval and a templated reply, no LLM call"""
+    places = await search_rooms(session_id, decision.query, candidates)
+    content = intent_router.render_reply(decision, places)
+    assistant_message = openapi_service.create_assistant_message(
+        f"query: {decision.query} \nsuggestions places: {places}"
+    )
+    await chat_manager.save_session_messages(
+        session_id, previous_messages + [assistant_message]
+    )
+    return places, content
+
+
 async def get_suggestion_places_from_db(
-    prompt: str, session_id: str = ""
+    prompt: str, session_id: str = "", retrieval_only: bool = False
 ) -> tuple[list[Place], str]:
     if not session_id:
         session_id = str(uuid.uuid4())
 
-    previous_messages = await chat_manager.get_session_messages(session_id)
+    with trace_stage("history"):
+        previous_messages = await chat_manager.get_session_messages(session_id)
+    annotate(turn=len(previous_messages))
+
+    # Plain search prompts skip the LLM round-trip and go straight to retrieval.
+    # Under overload every prompt is degraded to this path.
+    with trace_stage("route"):
+        decision = intent_router.route(prompt)
+    if decision.intent == Intent.MORE and decision.fast_path:
+        started = time.perf_counter()
+        places, query, _ = await get_more_places(session_id)
+        if query:
+            content = intent_router.render_more_reply(query, places)
+            assistant_message = openapi_service.create_assistant_message(
+                f"query: {query} \nsuggestions places: {places}"
+            )
+            await chat_manager.save_session_messages(
+                session_id, previous_messages + [assistant_message]
+            )
+            intent_router.stats.record_fast_path(time.perf_counter() - started)
+            annotate(path="more", results=len(places))
+            return places, session_id, content
+
+    if (decision.fast_path and decision.intent == Intent.SEARCH) or retrieval_only:
+        started = time.perf_counter()
+        places, content = await answer_from_index(session_id, previous_messages, decision)
+        intent_router.stats.record_fast_path(time.perf_counter() - started)
+        annotate(path="degraded" if retrieval_only else "fast_path", results=len(places))
+        return places, session_id, content
+
+    started = time.perf_counter()
     system_message = openapi_service.create_system_message("""
 You're a friendly and down-to-earth assistant helping people find lodges and villas, and plan their trips in Iran — all in Persian.
 You speak naturally and kindly, like a real person having a helpful conversation.
@@ -96,28 +248,20 @@ You can use the following tool:
 """)
     user_message = openapi_service.create_user_message(prompt)
     messages = [system_message] + previous_messages + [user_message]
-    response = openapi_service.chat_completions_create(
-        messages,
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "query_similar_rooms",
-                    "description": "Search for lodges and villas based on user preferences",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "The search query describing the desired accommodation",
-                            }
-                        },
-                        "required": ["query"],
-                    },
-                },
-            }
-        ],
-    ).choices[0].message
+    try:
+        with trace_stage("llm"):
+            completion = await openapi_service.chat_completions_create(
+                messages, tools=ROOM_SEARCH_TOOLS
+            )
+    except OpenAIError as e:
+        # OpenAI is failing or its breaker is open: answer from the index alone
+        print(f"Error calling OpenAI, answering from the index: {e}")
+        intent_router.stats.record_llm_unavailable()
+        places, content = await answer_from_index(session_id, previous_messages, decision)
+        annotate(path="llm_unavailable", results=len(places))
+        return places, session_id, content
+    record_usage(getattr(completion, "usage", None))
+    response = completion.choices[0].message
 
     places = []
     if response.tool_calls:
@@ -127,7 +271,8 @@ You can use the following tool:
         if tool_name == "query_similar_rooms":
             query = json.loads(tool_args)["query"]
             print(f"query: {query}")
-            places = chroma_db_service.query_similar_rooms(query, n_results=3)
+            record_tool_call(tool_name, query)
+            places = await search_rooms(session_id, query)
 
             assistant_message = openapi_service.create_assistant_message(
                 f"query: {query} \nsuggestions places: {places}"
@@ -142,4 +287,6 @@ You can use the following tool:
         await chat_manager.save_session_messages(
             session_id, previous_messages + [assistant_message]
         )
+    intent_router.stats.record_llm(time.perf_counter() - started)
+    annotate(path="llm", results=len(places))
     return places, session_id, response.content
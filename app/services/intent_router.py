@@ -0,0 +1,387 @@
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from enum import StrEnum
+from functools import lru_cache
+
+from app.settings import (
+    FAST_PATH_ENABLED,
+    FAST_PATH_MIN_CONFIDENCE,
+    ROUTER_CACHE_SIZE,
+)
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_LETTERS = str.maketrans({"ي": "ی", "ك": "ک", "ة": "ه", "‌": " "})
+_PUNCTUATION = re.compile(r"[!\"#$%&'()*+,/:;<=>@\[\\\]^_`{|}~،؛«»…]")
+
+PROVINCES = {
+    "mazandaran": ("مازندران",),
+    "gilan": ("گیلان",),
+    "golestan": ("گلستان",),
+}
+
+# Regions spanning several provinces, and the provinces they cover
+REGIONS = {
+    "north": ("شمال",),
+}
+REGION_PROVINCES = {
+    "north": ("mazandaran", "gilan", "golestan"),
+}
+
+CITIES = {
+    "mazandaran": (
+        "رامسر", "چالوس", "نوشهر", "کلاردشت", "عباس آباد", "تنکابن", "ساری",
+        "بابلسر", "آمل", "محمودآباد", "فریدونکنار", "سوادکوه", "نشتارود",
+        "سلمانشهر", "کلارآباد", "بابل", "نور", "قائمشهر",
+    ),
+    "gilan": (
+        "رشت", "بندر انزلی", "انزلی", "ماسوله", "لاهیجان", "آستارا", "رودسر",
+        "لنگرود", "فومن", "تالش", "چابکسر", "کیاشهر", "املش", "رضوانشهر",
+    ),
+    "golestan": (
+        "گرگان", "گنبد", "علی آباد", "کردکوی", "بندر ترکمن", "مینودشت",
+        "آزادشهر", "رامیان", "ناهارخوران", "بندر گز",
+    ),
+}
+
+ACCOMMODATION_TYPES = {
+    "ویلا": ("ویلا", "ویلای", "villa"),
+    "کلبه": ("کلبه", "cottage", "cabin"),
+    "سوئیت": ("سوئیت", "سوییت", "suite"),
+    "آپارتمان": ("آپارتمان", "apartment"),
+    "بوم گردی": ("بوم گردی", "بومگردی", "اقامتگاه بومی"),
+    "اقامتگاه": ("اقامتگاه", "لاج", "lodge"),
+    "خانه": ("خانه روستایی", "خانه باغ", "خانه"),
+}
+
+AMENITIES = {
+    "استخر": ("استخردار", "استخر"),
+    "جکوزی": ("جکوزی",),
+    "ساحل": ("ساحلی", "کنار دریا", "لب دریا", "ساحل"),
+    "جنگل": ("جنگلی", "جنگل"),
+    "کوهستان": ("کوهستانی", "ییلاقی", "کوه"),
+    "منظره": ("ویو", "منظره", "چشم انداز"),
+    "باربیکیو": ("باربیکیو", "کباب پز"),
+    "پارکینگ": ("پارکینگ",),
+    "سونا": ("سونا",),
+}
+
+CHAT_MARKERS = (
+    "سلام", "ممنون", "مرسی", "خداحافظ", "چطوری", "چرا", "برنامه سفر",
+    "برنامه ریزی", "جاذبه", "دیدنی", "آب و هوا", "بلیط", "hello", "thanks",
+)
+REFERENCE_MARKERS = (
+    "قبلی", "اولی", "دومی", "سومی", "همین", "همون", "ارزانتر", "ارزون تر",
+    "ارزان تر", "بهتر", "اون", "آن یکی", "توضیح",
+)
+FOLLOW_UP_MARKERS = REFERENCE_MARKERS + ("بیشتر", "دیگه", "دیگر")
+MORE_MARKERS = (
+    "بیشتر", "بقیه", "ادامه", "موارد دیگه", "موارد دیگر", "گزینه های دیگه",
+    "گزینه های دیگر", "گزینه دیگه", "باز هم", "بازم", "more",
+)
+
+_PRICE = re.compile(
+    r"(?:زیر|کمتر از|تا|حداکثر|ماکزیمم|under)\s*(\d+(?:\.\d+)?)\s*(میلیون|هزار|تومان|m)"
+)
+_GUESTS = re.compile(r"(\d+)\s*(?:نفر|نفره|مسافر)")
+
+# Weights of the logistic scorer, tuned by hand on logged prompts. A prompt
+# that names what and where with no conversational markers scores ~0.9+.
+_WEIGHTS = {
+    "bias": -1.5,
+    "type": 2.0,
+    "location": 1.5,
+    "price": 1.0,
+    "amenity": 0.7,
+    "guests": 0.5,
+    "chat": -2.5,
+    "follow_up": -3.0,
+    "question": -0.8,
+    "long": -1.0,
+}
+
+
+class Intent(StrEnum):
+    """Enum for the routed intent of a user prompt"""
+
+    SEARCH = "search"
+    MORE = "more"
+    CHAT = "chat"
+
+
+@dataclass(slots=True, frozen=True)
+class SearchSlots:
+    """Slots extracted from a search prompt"""
+
+    province: str | None = None
+    # Set instead of province when only a region like "شمال" is named
+    region: str | None = None
+    city: str | None = None
+    accommodation_type: str | None = None
+    amenities: tuple[str, ...] = ()
+    max_price: int | None = None
+    guests: int | None = None
+
+
+@dataclass(slots=True, frozen=True)
+class RouteDecision:
+    """Outcome of routing a single prompt"""
+
+    intent: Intent
+    confidence: float
+    query: str
+    slots: SearchSlots
+    fast_path: bool
+
+
+@dataclass(slots=True)
+class RouterStats:
+    """Counters describing router decisions and the LLM time they saved"""
+
+    fast_path: int = 0
+    llm_fallback: int = 0
+    # LLM-path prompts answered from the index because OpenAI was unavailable
+    llm_unavailable: int = 0
+    fast_path_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_fast_path(self, elapsed: float) -> None:
+        with self._lock:
+            self.fast_path += 1
+            self.fast_path_seconds += elapsed
+
+    def record_llm(self, elapsed: float) -> None:
+        with self._lock:
+            self.llm_fallback += 1
+            self.llm_seconds += elapsed
+
+    def record_llm_unavailable(self) -> None:
+        with self._lock:
+            self.llm_unavailable += 1
+
+    def snapshot(self) -> dict:
+        """Return the counters plus the estimated latency saved by the fast path"""
+        with self._lock:
+            total = self.fast_path + self.llm_fallback
+            avg_fast = self.fast_path_seconds / self.fast_path if self.fast_path else 0.0
+            avg_llm = self.llm_seconds / self.llm_fallback if self.llm_fallback else 0.0
+            saved = max(avg_llm - avg_fast, 0.0) * self.fast_path if avg_llm else 0.0
+            return {
+                "fast_path": self.fast_path,
+                "llm_fallback": self.llm_fallback,
+                "llm_unavailable": self.llm_unavailable,
+                "fast_path_ratio": self.fast_path / total if total else 0.0,
+                "avg_fast_path_seconds": avg_fast,
+                "avg_llm_seconds": avg_llm,
+                "estimated_saved_seconds": saved,
+            }
+
+
+def normalize_prompt(text: str) -> str:
+    """Normalize digits, Arabic letters, ZWNJ and punctuation of a prompt"""
+    text = text.translate(_DIGITS).translate(_LETTERS).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+
+# Suffixes a word may carry and still count as that word: plural and ezafe
+# ("ویلاها", "ویلای"). Anything longer is another word ("بهترین", "نورگیر").
+_SUFFIX = r"(?:ها|های|ی|ای)?"
+
+
+def _has_word(text: str, words: tuple[str, ...]) -> bool:
+    """Whether any word or phrase appears as a whole word in text"""
+    return any(
+        re.search(rf"(?<!\S){re.escape(w)}{_SUFFIX}(?!\S)", text) for w in words
+    )
+
+
+def _find(text: str, vocabulary: dict[str, tuple[str, ...]]) -> list[str]:
+    return [key for key, words in vocabulary.items() if _has_word(text, words)]
+
+
+def extract_slots(normalized: str) -> SearchSlots:
+    """Extract location, type, amenity, price and guest slots from a prompt"""
+    province, city = None, None
+    for key, cities in CITIES.items():
+        found = next((c for c in cities if _has_word(normalized, (c,))), None)
+        if found:
+            province, city = key, found
+            break
+    region = None
+    if province is None:
+        provinces = _find(normalized, PROVINCES)
+        province = provinces[0] if provinces else None
+    if province is None:
+        regions = _find(normalized, REGIONS)
+        region = regions[0] if regions else None
+
+    types = _find(normalized, ACCOMMODATION_TYPES)
+
+    max_price = None
+    if match := _PRICE.search(normalized):
+        amount, unit = float(match.group(1)), match.group(2)
+        if unit in ("میلیون", "m"):
+            amount *= 1_000_000
+        elif unit == "هزار":
+            amount *= 1_000
+        max_price = int(amount)
+
+    guests = int(match.group(1)) if (match := _GUESTS.search(normalized)) else None
+
+    return SearchSlots(
+        province=province,
+        region=region,
+        city=city,
+        accommodation_type=types[0] if types else None,
+        amenities=tuple(_find(normalized, AMENITIES)),
+        max_price=max_price,
+        guests=guests,
+    )
+
+
+def province_of(text: str) -> str | None:
+    """Province key (also the index shard name) mentioned in text, if any"""
+    return extract_slots(normalize_prompt(text)).province
+
+
+def provinces_of(text: str) -> tuple[str, ...]:
+    """Provinces a text refers to: the one it names, or all of a named region"""
+    slots = extract_slots(normalize_prompt(text))
+    if slots.province is not None:
+        return (slots.province,)
+    return REGION_PROVINCES.get(slots.region, ())
+
+
+def destination_key(prompt: str) -> str | None:
+    """
+    Cache key of a prompt from its destination and intent slots, so different
+    wordings of the same request share one entry. None for follow-ups and for
+    prompts naming no destination, whose meaning depends on the conversation.
+    """
+    normalized = normalize_prompt(prompt)
+    if _has_word(normalized, FOLLOW_UP_MARKERS):
+        return None
+    slots = extract_slots(normalized)
+    destination = slots.city or slots.province or slots.region
+    if destination is None:
+        return None
+    return "|".join(
+        [
+            f"dest:{destination}",
+            f"type:{slots.accommodation_type or ''}",
+            f"amenities:{','.join(sorted(slots.amenities))}",
+            f"guests:{slots.guests or ''}",
+            f"max_price:{slots.max_price or ''}",
+        ]
+    )
+
+
+def _score(normalized: str, slots: SearchSlots, raw: str) -> float:
+    features = {
+        "bias": 1.0,
+        "type": float(slots.accommodation_type is not None),
+        "location": float(slots.province is not None or slots.region is not None),
+        "price": float(slots.max_price is not None),
+        "amenity": float(bool(slots.amenities)),
+        "guests": float(slots.guests is not None),
+        "chat": float(_has_word(normalized, CHAT_MARKERS)),
+        "follow_up": float(_has_word(normalized, FOLLOW_UP_MARKERS)),
+        "question": float("?" in raw or "؟" in raw),
+        "long": float(len(normalized.split()) > 25),
+    }
+    z = sum(_WEIGHTS[name] * value for name, value in features.items())
+    return 1 / (1 + math.exp(-z))
+
+
+class IntentRouter:
+    """Rules plus a small logistic scorer that decide whether a prompt needs the LLM"""
+
+    def __init__(
+        self,
+        enabled: bool = FAST_PATH_ENABLED,
+        min_confidence: float = FAST_PATH_MIN_CONFIDENCE,
+        cache_size: int = ROUTER_CACHE_SIZE,
+    ):
+        self.enabled = enabled
+        self.min_confidence = min_confidence
+        self.stats = RouterStats()
+        self._classify = lru_cache(maxsize=cache_size)(self._classify_uncached)
+
+    def _classify_uncached(self, raw: str) -> RouteDecision:
+        normalized = normalize_prompt(raw)
+        slots = extract_slots(normalized)
+        # "Show me more" pages through the previous search instead of a new one
+        if (
+            len(normalized.split()) <= 6
+            and _has_word(normalized, MORE_MARKERS)
+            and not _has_word(normalized, REFERENCE_MARKERS)
+            and slots.accommodation_type is None
+            and slots.province is None
+            and slots.region is None
+        ):
+            return RouteDecision(
+                intent=Intent.MORE,
+                confidence=1.0,
+                query=normalized,
+                slots=slots,
+                fast_path=self.enabled,
+            )
+
+        confidence = _score(normalized, slots, raw)
+        is_search = confidence >= 0.5
+        # Hard rules: a fast-path prompt must say what it looks for and one
+        # more constraint, otherwise the LLM is better at asking back.
+        has_constraint = bool(
+            slots.province
+            or slots.region
+            or slots.max_price
+            or slots.amenities
+            or slots.guests
+        )
+        fast_path = (
+            self.enabled
+            and confidence >= self.min_confidence
+            and slots.accommodation_type is not None
+            and has_constraint
+        )
+        return RouteDecision(
+            intent=Intent.SEARCH if is_search else Intent.CHAT,
+            confidence=confidence,
+            query=normalized,
+            slots=slots,
+            fast_path=fast_path,
+        )
+
+    def route(self, prompt: str) -> RouteDecision:
+        """Route a prompt, caching decisions per distinct prompt text"""
+        return self._classify(prompt.strip())
+
+    def cache_info(self):
+        return self._classify.cache_info()
+
+    def render_reply(self, decision: RouteDecision, places: list) -> str:
+        """Templated assistant reply used instead of an LLM answer"""
+        if not places:
+            return (
+                f"متأسفانه اقامتگاهی مطابق «{decision.query}» پیدا نکردم. "
+                "لطفاً شرایط جستجو را کمی تغییر دهید."
+            )
+        return (
+            f"چند گزینه مناسب برای «{decision.query}» پیدا کردم. "
+            "اگر گزینه‌های بیشتری می‌خواهید یا شرایط دیگری دارید، بگویید."
+        )
+
+    def render_more_reply(self, query: str, places: list) -> str:
+        """Templated assistant reply for a page of an earlier search"""
+        if not places:
+            return (
+                f"گزینه دیگری برای «{query}» باقی نمانده است. "
+                "می‌توانید شرایط جستجو را تغییر دهید."
+            )
+        return f"چند گزینه دیگر برای «{query}»:"
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,149 @@
+"""
+Cache prewarming from popular retrieval queries.
+
+After a deploy or an index swap every cache starts cold: the first searches
+page the HNSW index and listing store in, and every query pays for an
+embedding call. The prewarmer runs the most searched queries
+(app/helper/popular_queries.py) through the vector index in small batches,
+which loads the index and fills the embedding cache, so the first users
+don't pay for it.
+
+With PREWARM_ON_STARTUP a worker prewarms in its lifespan before it starts
+serving, for at most PREWARM_BUDGET_SECONDS. It can also be run on its own,
+which warms the retrieval sidecar after it restarts (VECTOR_INDEX_MODE=sidecar)
+or, with a local index, only the OS page cache of the index files:
+
+    python -m app.services.prewarm_service
+    python -m app.services.prewarm_service --top 500 --budget 120
+    python -m app.services.prewarm_service --list
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.helper.chromadb_helper import chroma_db_service, embedding_cache
+from app.helper.popular_queries import popular_queries
+from app.helper.redis_helper import redis_manager
+from app.settings import (
+    CANDIDATE_POOL_SIZE,
+    PREWARM_BATCH_SIZE,
+    PREWARM_BUDGET_SECONDS,
+    PREWARM_TOP_N,
+)
+
+
+class CachePrewarmer:
+    """Replays popular queries through the index within a time budget"""
+
+    def __init__(
+        self,
+        top_n: int = PREWARM_TOP_N,
+        budget_seconds: float = PREWARM_BUDGET_SECONDS,
+        batch_size: int = PREWARM_BATCH_SIZE,
+    ):
+        self.top_n = top_n
+        self.budget_seconds = budget_seconds
+        self.batch_size = batch_size
+        # idle, running, done, timed_out or failed
+        self.state = "idle"
+        self.queries = 0
+        self.warmed = 0
+        self.failed_batches = 0
+        self.seconds = 0.0
+        self._budget = budget_seconds
+
+    async def _warm(self, queries: list[str], deadline: float) -> None:
+        for start in range(0, len(queries), self.batch_size):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.state = "timed_out"
+                return
+            batch = queries[start:start + self.batch_size]
+            try:
+                # A batch cut off by the budget still finishes in its thread
+                await asyncio.wait_for(
+                    asyncio.to_thread(
+                        chroma_db_service.query_many, batch, CANDIDATE_POOL_SIZE
+                    ),
+                    remaining,
+                )
+            except TimeoutError:
+                self.state = "timed_out"
+                return
+            except Exception as e:
+                self.failed_batches += 1
+                print(f"Error prewarming {len(batch)} queries: {e}")
+                continue
+            self.warmed += len(batch)
+        self.state = "done"
+
+    async def run(
+        self, top_n: int | None = None, budget_seconds: float | None = None
+    ) -> int:
+        """Search the top_n most popular queries; returns how many were run"""
+        top_n = self.top_n if top_n is None else top_n
+        budget_seconds = self.budget_seconds if budget_seconds is None else budget_seconds
+        started = time.perf_counter()
+        deadline = started + budget_seconds
+        self._budget = budget_seconds
+        self.state = "running"
+        self.queries = self.warmed = self.failed_batches = 0
+        try:
+            queries = await asyncio.wait_for(popular_queries.top(top_n), budget_seconds)
+        except Exception as e:
+            self.state = "failed"
+            print(f"Error loading popular queries: {e}")
+            return 0
+        self.queries = len(queries)
+        try:
+            await self._warm(queries, deadline)
+        finally:
+            self.seconds = time.perf_counter() - started
+        print(
+            f"🔥 Prewarmed {self.warmed}/{self.queries} popular queries "
+            f"in {self.seconds:.1f}s ({self.state})"
+        )
+        return self.warmed
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "queries": self.queries,
+            "warmed": self.warmed,
+            "progress": self.warmed / self.queries if self.queries else 0.0,
+            "failed_batches": self.failed_batches,
+            "seconds": round(self.seconds, 2),
+            "budget_seconds": self._budget,
+        }
+
+
+cache_prewarmer = CachePrewarmer()
+
+
+async def main(top_n: int, budget_seconds: float, list_only: bool) -> None:
+    await redis_manager.connect()
+    try:
+        if list_only:
+            for query in await popular_queries.top(top_n):
+                print(query)
+            return
+        await cache_prewarmer.run(top_n, budget_seconds)
+    finally:
+        await redis_manager.disconnect()
+    print(f"✅ Prewarm: {cache_prewarmer.snapshot()}, embeddings: {embedding_cache.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Warm the vector index and embedding cache with popular queries"
+    )
+    parser.add_argument("--top", type=int, default=PREWARM_TOP_N, help="Queries to replay")
+    parser.add_argument(
+        "--budget", type=float, default=PREWARM_BUDGET_SECONDS, help="Seconds to spend at most"
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="Print the popular queries instead of replaying them"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.top, args.budget, args.list))
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections.abc import Awaitable, Callable
+
+from app.helper.redis_helper import redis_manager
+from app.settings import (
+    SUGGESTION_FRESH_SECONDS,
+    SUGGESTION_REFRESH_LOCK_SECONDS,
+    SUGGESTION_STALE_SECONDS,
+)
+
+Fetch = Callable[[], Awaitable[list[dict]]]
+
+
+class SuggestionCache:
+    """
+    Stale-while-revalidate cache of web-search suggestions. Fresh entries are
+    served as is; stale ones are served immediately while a single worker
+    refreshes them in the background. Concurrent misses for one key in a
+    worker share a single fetch.
+    """
+
+    def __init__(
+        self,
+        fresh_seconds: int = SUGGESTION_FRESH_SECONDS,
+        stale_seconds: int = SUGGESTION_STALE_SECONDS,
+    ):
+        self.suggestions_prefix = "suggestions:"
+        self.refresh_prefix = "suggestions_refresh:"
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._fetching: dict[str, asyncio.Task] = {}
+        # Strong references, so background refreshes aren't garbage collected
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    def _digest(self, cache_key: str) -> str:
+        return hashlib.sha1(cache_key.encode()).hexdigest()
+
+    def _get_suggestions_key(self, cache_key: str) -> str:
+        """Generate Redis key for cached suggestions"""
+        return f"{self.suggestions_prefix}{self._digest(cache_key)}"
+
+    def _get_refresh_key(self, cache_key: str) -> str:
+        """Generate Redis key for the refresh lock of cached suggestions"""
+        return f"{self.refresh_prefix}{self._digest(cache_key)}"
+
+    async def get(self, cache_key: str) -> tuple[list[dict] | None, bool]:
+        """Return (places, is_fresh), or (None, False) on a miss"""
+        try:
+            redis_client = await redis_manager.get_client()
+            data_json = await redis_client.get(self._get_suggestions_key(cache_key))
+        except Exception as e:
+            print(f"Error reading cached suggestions: {e}")
+            return None, False
+        if data_json is None:
+            return None, False
+        data = json.loads(data_json)
+        return data["places"], time.time() - data["fetched_at"] < self.fresh_seconds
+
+    async def save(self, cache_key: str, places: list[dict]) -> None:
+        try:
+            redis_client = await redis_manager.get_client()
+            await redis_client.setex(
+                self._get_suggestions_key(cache_key),
+                self.stale_seconds,
+                json.dumps({"places": places, "fetched_at": time.time()}, ensure_ascii=False),
+            )
+        except Exception as e:
+            print(f"Error saving cached suggestions: {e}")
+
+    async def _fetch_and_save(self, cache_key: str, fetch: Fetch) -> list[dict]:
+        places = await fetch()
+        await self.save(cache_key, places)
+        return places
+
+    def _single_flight(self, cache_key: str, fetch: Fetch) -> asyncio.Task:
+        """The in-progress fetch of cache_key in this worker, started if needed"""
+        task = self._fetching.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_save(cache_key, fetch))
+            self._fetching[cache_key] = task
+            task.add_done_callback(lambda _: self._fetching.pop(cache_key, None))
+        return task
+
+    async def _refresh(self, cache_key: str, fetch: Fetch) -> None:
+        # One refresh across all workers; the lock expires if a worker dies
+        try:
+            redis_client = await redis_manager.get_client()
+            locked = await redis_client.set(
+                self._get_refresh_key(cache_key),
+                "1",
+                nx=True,
+                ex=SUGGESTION_REFRESH_LOCK_SECONDS,
+            )
+            if not locked:
+                return
+            self.refreshes += 1
+            await self._single_flight(cache_key, fetch)
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"Error refreshing cached suggestions: {e}")
+
+    async def get_or_fetch(self, cache_key: str, fetch: Fetch) -> list[dict]:
+        """Serve cached suggestions, refreshing stale ones in the background"""
+        places, fresh = await self.get(cache_key)
+        if places is None:
+            self.misses += 1
+            # Shielded so one caller going away doesn't cancel the others' fetch
+            return await asyncio.shield(self._single_flight(cache_key, fetch))
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            if cache_key not in self._refreshing:
+                refresh = asyncio.create_task(self._refresh(cache_key, fetch))
+                self._refreshing[cache_key] = refresh
+                refresh.add_done_callback(lambda _: self._refreshing.pop(cache_key, None))
+        return places
+
+    def snapshot(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "in_flight": len(self._fetching) + len(self._refreshing),
+        }
+
+
+suggestion_cache = SuggestionCache()
@@ -22,3 +22,181 @@ CORS_ALLOW_HEADERS = os.environ.get("CORS_ALLOW_HEADERS", "*").split(",")
 
 # Security Configuration
 ALLOW_ALL_ORIGINS = os.environ.get("ALLOW_ALL_ORIGINS", "true").lower() == "true"
+
+# Intent Router Configuration
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MIN_CONFIDENCE = float(os.environ.get("FAST_PATH_MIN_CONFIDENCE", 0.8))
+ROUTER_CACHE_SIZE = int(os.environ.get("ROUTER_CACHE_SIZE", 4096))
+
+# Admission Control Configuration
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+SESSION_RATE_LIMIT_PER_MINUTE = float(os.environ.get("SESSION_RATE_LIMIT_PER_MINUTE", 20))
+SESSION_RATE_LIMIT_BURST = int(os.environ.get("SESSION_RATE_LIMIT_BURST", 5))
+IP_RATE_LIMIT_PER_MINUTE = float(os.environ.get("IP_RATE_LIMIT_PER_MINUTE", 60))
+IP_RATE_LIMIT_BURST = int(os.environ.get("IP_RATE_LIMIT_BURST", 20))
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "false").lower() == "true"
+MAX_CONCURRENT_PROMPTS = int(os.environ.get("MAX_CONCURRENT_PROMPTS", 32))
+MAX_QUEUED_PROMPTS = int(os.environ.get("MAX_QUEUED_PROMPTS", 64))
+PROMPT_QUEUE_TIMEOUT = float(os.environ.get("PROMPT_QUEUE_TIMEOUT", 5))
+DEGRADE_ON_OVERLOAD = os.environ.get("DEGRADE_ON_OVERLOAD", "true").lower() == "true"
+# Prompts shed to the retrieval-only path still embed and query the index;
+# beyond MAX_CONCURRENT_DEGRADED_PROMPTS of them at once, 503 is returned
+MAX_CONCURRENT_DEGRADED_PROMPTS = int(os.environ.get("MAX_CONCURRENT_DEGRADED_PROMPTS", 128))
+
+# Vector Index Configuration
+# "local" opens the Chroma index in every worker, "sidecar" sends queries to
+# one retrieval process over a Unix socket (python -m app.helper.retrieval_sidecar)
+VECTOR_INDEX_MODE = os.environ.get("VECTOR_INDEX_MODE", "local")
+RETRIEVAL_SOCKET_PATH = os.environ.get("RETRIEVAL_SOCKET_PATH", "/tmp/khesht-retrieval.sock")
+RETRIEVAL_SOCKET_TIMEOUT = float(os.environ.get("RETRIEVAL_SOCKET_TIMEOUT", 10))
+RETRIEVAL_BATCH_WINDOW_MS = float(os.environ.get("RETRIEVAL_BATCH_WINDOW_MS", 5))
+RETRIEVAL_MAX_BATCH = int(os.environ.get("RETRIEVAL_MAX_BATCH", 32))
+
+# Result Pagination Configuration
+CANDIDATE_POOL_SIZE = int(os.environ.get("CANDIDATE_POOL_SIZE", 30))
+RESULTS_PAGE_SIZE = int(os.environ.get("RESULTS_PAGE_SIZE", 3))
+
+# Index Versioning Configuration
+INDEX_ROOT = os.environ.get("INDEX_ROOT", "chroma_db")
+INDEX_RETENTION = int(os.environ.get("INDEX_RETENTION", 2))
+INDEX_RELOAD_INTERVAL = float(os.environ.get("INDEX_RELOAD_INTERVAL", 10))
+INDEX_MIN_RECALL = float(os.environ.get("INDEX_MIN_RECALL", 0.9))
+
+# Profiling Configuration
+# Requests sending "X-Profile: <PROFILE_TOKEN>" are profiled, plus a random
+# PROFILE_SAMPLE_RATE fraction of all requests; both are off by default
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))
+
+# OpenAI Resilience Configuration
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 30))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 2))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", 0.5))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", 8))
+# A second copy of a request is sent once it outlives the model's p95 latency
+OPENAI_HEDGE_ENABLED = os.environ.get("OPENAI_HEDGE_ENABLED", "true").lower() == "true"
+OPENAI_HEDGE_PERCENTILE = float(os.environ.get("OPENAI_HEDGE_PERCENTILE", 95))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.environ.get("OPENAI_HEDGE_MIN_SAMPLES", 20))
+OPENAI_HEDGE_MIN_DELAY = float(os.environ.get("OPENAI_HEDGE_MIN_DELAY", 0.5))
+OPENAI_BREAKER_FAILURES = int(os.environ.get("OPENAI_BREAKER_FAILURES", 5))
+OPENAI_BREAKER_RESET_SECONDS = float(os.environ.get("OPENAI_BREAKER_RESET_SECONDS", 30))
+
+# Web Search Suggestion Cache Configuration
+# Entries are served fresh for SUGGESTION_FRESH_SECONDS, then served stale
+# while one worker refreshes them, until SUGGESTION_STALE_SECONDS
+SUGGESTION_CACHE_ENABLED = os.environ.get("SUGGESTION_CACHE_ENABLED", "true").lower() == "true"
+SUGGESTION_FRESH_SECONDS = int(os.environ.get("SUGGESTION_FRESH_SECONDS", 21600))
+SUGGESTION_STALE_SECONDS = int(os.environ.get("SUGGESTION_STALE_SECONDS", 604800))
+SUGGESTION_REFRESH_LOCK_SECONDS = int(os.environ.get("SUGGESTION_REFRESH_LOCK_SECONDS", 120))
+
+# Link Checker Configuration
+LINK_CHECK_ENABLED = os.environ.get("LINK_CHECK_ENABLED", "true").lower() == "true"
+LINK_CHECK_TIMEOUT = float(os.environ.get("LINK_CHECK_TIMEOUT", 5))
+LINK_CHECK_CONCURRENCY = int(os.environ.get("LINK_CHECK_CONCURRENCY", 50))
+LINK_CHECK_PER_HOST = int(os.environ.get("LINK_CHECK_PER_HOST", 4))
+LINK_ALIVE_TTL = int(os.environ.get("LINK_ALIVE_TTL", 86400))
+LINK_DEAD_TTL = int(os.environ.get("LINK_DEAD_TTL", 3600))
+# Background checks of unknown links running at once (others wait their turn)
+LINK_BACKGROUND_CHECKS = int(os.environ.get("LINK_BACKGROUND_CHECKS", 4))
+# Listings served within LINK_HOT_WINDOW seconds are rechecked every
+# LINK_REVALIDATE_INTERVAL seconds (0 disables revalidation)
+LINK_HOT_WINDOW = int(os.environ.get("LINK_HOT_WINDOW", 3600))
+LINK_HOT_LIMIT = int(os.environ.get("LINK_HOT_LIMIT", 500))
+LINK_REVALIDATE_INTERVAL = float(os.environ.get("LINK_REVALIDATE_INTERVAL", 600))
+
+# Price Overlay Configuration (app/helper/price_overlay.py, crawlers/prices.py)
+# Listings served within PRICE_HOT_WINDOW seconds whose price is older than
+# PRICE_STALE_AFTER are refetched every PRICE_REFRESH_INTERVAL seconds
+# (0 disables the refresher); overlay entries expire after PRICE_OVERLAY_TTL
+PRICE_OVERLAY_ENABLED = os.environ.get("PRICE_OVERLAY_ENABLED", "true").lower() == "true"
+PRICE_OVERLAY_TTL = int(os.environ.get("PRICE_OVERLAY_TTL", 172800))
+PRICE_HOT_WINDOW = int(os.environ.get("PRICE_HOT_WINDOW", 86400))
+PRICE_HOT_LIMIT = int(os.environ.get("PRICE_HOT_LIMIT", 1000))
+PRICE_STALE_AFTER = int(os.environ.get("PRICE_STALE_AFTER", 3600))
+PRICE_REFRESH_INTERVAL = float(os.environ.get("PRICE_REFRESH_INTERVAL", 900))
+PRICE_REFRESH_CONCURRENCY = int(os.environ.get("PRICE_REFRESH_CONCURRENCY", 8))
+PRICE_REFRESH_PER_HOST = int(os.environ.get("PRICE_REFRESH_PER_HOST", 2))
+
+# Request Trace Configuration (app/helper/trace_helper.py, benchmarks/replay.py)
+# TRACE_SAMPLE_RATE of sessions (0 disables tracing) are logged to
+# TRACE_LOG_PATH; session IDs are hashed with TRACE_SALT, shared by all workers
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH", "traces/requests.jsonl")
+TRACE_SALT = os.environ.get("TRACE_SALT", "")
+
+# Session Cache Configuration (app/services/chat_manager.py)
+# Each worker caches up to SESSION_CACHE_SIZE histories, trusted for
+# SESSION_CACHE_FRESH_SECONDS before Redis is asked for a newer version.
+# Saves are flushed to Redis every SESSION_FLUSH_INTERVAL seconds in
+# pipelines of SESSION_FLUSH_BATCH; at most SESSION_DIRTY_LIMIT wait unsaved
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+SESSION_CACHE_FRESH_SECONDS = float(os.environ.get("SESSION_CACHE_FRESH_SECONDS", 5))
+SESSION_DIRTY_LIMIT = int(os.environ.get("SESSION_DIRTY_LIMIT", 5000))
+SESSION_FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL", 0.05))
+SESSION_FLUSH_BATCH = int(os.environ.get("SESSION_FLUSH_BATCH", 500))
+
+# Cache Prewarm Configuration (app/services/prewarm_service.py)
+# Retrieval queries are counted in Redis, keeping the POPULAR_QUERY_LIMIT most
+# frequent. With PREWARM_ON_STARTUP a worker runs the PREWARM_TOP_N most
+# frequent through the index, PREWARM_BATCH_SIZE at a time, for at most
+# PREWARM_BUDGET_SECONDS before it starts serving. Query embeddings are
+# cached in process, up to EMBEDDING_CACHE_SIZE (0 disables the cache)
+POPULAR_QUERY_LIMIT = int(os.environ.get("POPULAR_QUERY_LIMIT", 5000))
+PREWARM_ON_STARTUP = os.environ.get("PREWARM_ON_STARTUP", "false").lower() == "true"
+PREWARM_TOP_N = int(os.environ.get("PREWARM_TOP_N", 200))
+PREWARM_BUDGET_SECONDS = float(os.environ.get("PREWARM_BUDGET_SECONDS", 30))
+PREWARM_BATCH_SIZE = int(os.environ.get("PREWARM_BATCH_SIZE", 16))
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 10000))
+
+# HNSW Index Configuration (chosen with benchmarks/hnsw_benchmark.py)
+# Applied when an index version is built (python warmup_db.py)
+HNSW_SPACE = os.environ.get("HNSW_SPACE", "l2")
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_CONSTRUCTION_EF = int(os.environ.get("HNSW_CONSTRUCTION_EF", 100))
+HNSW_SEARCH_EF = int(os.environ.get("HNSW_SEARCH_EF", 100))
+
+# Crawl Frontier Configuration (crawlers/worker.py)
+# A claimed work item is requeued if not acknowledged within CRAWL_LEASE_SECONDS;
+# requests to one host are spaced CRAWL_HOST_DELAY seconds apart across all workers
+CRAWL_LEASE_SECONDS = float(os.environ.get("CRAWL_LEASE_SECONDS", 60))
+CRAWL_HOST_DELAY = float(os.environ.get("CRAWL_HOST_DELAY", 0.5))
+CRAWL_MAX_ATTEMPTS = int(os.environ.get("CRAWL_MAX_ATTEMPTS", 5))
+CRAWL_REQUEST_TIMEOUT = float(os.environ.get("CRAWL_REQUEST_TIMEOUT", 20))
+CRAWL_OUTPUT_DIR = os.environ.get("CRAWL_OUTPUT_DIR", "crawl_output")
+
+# Image Thumbnail Configuration (crawlers/images.py)
+# Thumbnails are written to IMAGE_STORE_DIR and served under IMAGE_BASE_URL;
+# point IMAGE_BASE_URL at a CDN in front of the store to serve them from there.
+# The source URL manifest is kept beside it, in IMAGE_STORE_DIR.sources.json
+IMAGE_STORE_DIR = os.environ.get("IMAGE_STORE_DIR", "image_store")
+IMAGE_BASE_URL = os.environ.get("IMAGE_BASE_URL", "/images")
+IMAGE_THUMBNAIL_SIZE = int(os.environ.get("IMAGE_THUMBNAIL_SIZE", 480))
+IMAGE_THUMBNAIL_QUALITY = int(os.environ.get("IMAGE_THUMBNAIL_QUALITY", 75))
+IMAGE_FETCH_CONCURRENCY = int(os.environ.get("IMAGE_FETCH_CONCURRENCY", 32))
+IMAGE_FETCH_PER_HOST = int(os.environ.get("IMAGE_FETCH_PER_HOST", 8))
+IMAGE_FETCH_TIMEOUT = float(os.environ.get("IMAGE_FETCH_TIMEOUT", 15))
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 15_000_000))
+
+# Review/Description Chunk Index Configuration
+# Review comments and description passages are embedded as chunks next to
+# the summaries; a listing's chunk score is its best chunk ("max") or the mean
+# of its best CHUNK_TOP_M chunks ("mean"), less CHUNK_MARGIN against summaries
+CHUNK_INDEX_ENABLED = os.environ.get("CHUNK_INDEX_ENABLED", "true").lower() == "true"
+CHUNKS_PER_LISTING = int(os.environ.get("CHUNKS_PER_LISTING", 12))
+CHUNK_MAX_CHARS = int(os.environ.get("CHUNK_MAX_CHARS", 400))
+CHUNK_MIN_CHARS = int(os.environ.get("CHUNK_MIN_CHARS", 20))
+CHUNK_AGGREGATION = os.environ.get("CHUNK_AGGREGATION", "max")
+CHUNK_TOP_M = int(os.environ.get("CHUNK_TOP_M", 3))
+CHUNK_MARGIN = float(os.environ.get("CHUNK_MARGIN", 0.05))
+
+# Batch Prompt Configuration (POST /user-prompt/batch)
+# Batches are rate limited per client IP by unit of work (items after
+# deduplication, see BatchPromptService.group); other prompts wait for one
+# of BATCH_LLM_CONCURRENCY slots on top of the admission control
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 500))
+BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", 8))
+BATCH_RATE_LIMIT_PER_MINUTE = float(os.environ.get("BATCH_RATE_LIMIT_PER_MINUTE", 2000))
+BATCH_RATE_LIMIT_BURST = int(os.environ.get("BATCH_RATE_LIMIT_BURST", 1000))
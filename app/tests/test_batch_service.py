@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+
+from app.helper.rate_limit_helper import ConcurrencyLimiter
+from app.services import batch_service
+from app.services.batch_service import BatchPromptService
+
+SEARCH_PROMPTS = ["ویلا استخردار در رامسر", "کلبه جنگلی در ماسوله"]
+CHAT_PROMPTS = [f"سلام، برای سفر شماره {i} چه پیشنهادی داری؟" for i in range(6)]
+
+
+class FakeIndex:
+    """Vector index stub recording every multi-query search"""
+
+    def __init__(self):
+        self.searches = []
+
+    def query_many(self, queries, n_results=5):
+        self.searches.append(list(queries))
+        return [[{"id": query, "score": 1.0}] for query in queries]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Batch service wired to stub retrieval, chat history and LLM path"""
+    fake = FakeIndex()
+    llm = {"calls": [], "running": 0, "peak": 0}
+
+    async def get_session_messages(session_id):
+        return []
+
+    async def answer_from_index(session_id, previous_messages, decision, candidates=None):
+        assert candidates is not None, "fast-path items must reuse the batch search"
+        return candidates, f"reply to {decision.query}"
+
+    async def get_suggestion_places_from_db(prompt, session_id="", retrieval_only=False):
+        llm["calls"].append(prompt)
+        llm["running"] += 1
+        llm["peak"] = max(llm["peak"], llm["running"])
+        await asyncio.sleep(0.01)
+        llm["running"] -= 1
+        if "5" in prompt:
+            raise RuntimeError("model failed")
+        return [], session_id, f"reply to {prompt}"
+
+    monkeypatch.setattr(batch_service, "chroma_db_service", fake)
+    monkeypatch.setattr(batch_service.chat_manager, "get_session_messages", get_session_messages)
+    monkeypatch.setattr(batch_service, "answer_from_index", answer_from_index)
+    monkeypatch.setattr(
+        batch_service, "get_suggestion_places_from_db", get_suggestion_places_from_db
+    )
+    monkeypatch.setattr(
+        batch_service, "prompt_concurrency_limiter", ConcurrencyLimiter(100, 100, 1)
+    )
+    fake.llm = llm
+    return fake
+
+
+async def collect(service, items):
+    return [result async for result in service.run(items)]
+
+
+class TestBatchService:
+    """Test deduplication, shared retrieval and capped LLM work of batches"""
+
+    @pytest.mark.asyncio
+    async def test_search_prompts_share_one_index_search(self, index):
+        """Every fast-path prompt is answered from a single multi-query search"""
+        items = [(prompt, "") for prompt in SEARCH_PROMPTS]
+
+        results = await collect(BatchPromptService(), items)
+
+        assert index.searches == [SEARCH_PROMPTS]
+        assert sorted(r["index"] for r in results) == [0, 1]
+        assert all(r["tool_response"][0]["id"] in SEARCH_PROMPTS for r in results)
+        assert index.llm["calls"] == []
+
+    @pytest.mark.asyncio
+    async def test_identical_prompts_are_answered_once(self, index):
+        """Sessionless duplicates and a session's repeated searches get one answer"""
+        items = [
+            (SEARCH_PROMPTS[0], ""),
+            (SEARCH_PROMPTS[0] + "!", ""),
+            (SEARCH_PROMPTS[1], "s1"),
+            (SEARCH_PROMPTS[1], "s1"),
+            (CHAT_PROMPTS[0], ""),
+            (CHAT_PROMPTS[0], ""),
+        ]
+        service = BatchPromptService()
+
+        results = {r["index"]: r for r in await collect(service, items)}
+
+        assert sorted(results) == [0, 1, 2, 3, 4, 5]
+        assert index.searches == [SEARCH_PROMPTS]
+        assert results[0]["session_id"] == results[1]["session_id"]
+        assert results[4]["session_id"] == results[5]["session_id"]
+        assert len(index.llm["calls"]) == 1
+        assert service.stats.snapshot()["deduplicated"] == 3
+
+    @pytest.mark.asyncio
+    async def test_repeated_stateful_prompts_of_a_session_each_run(self, index):
+        """Paging and chat turns change the session, so repeats aren't merged"""
+        items = [
+            (CHAT_PROMPTS[0], "s1"),
+            (CHAT_PROMPTS[0], "s1"),
+            ("بیشتر", "s1"),
+            ("بیشتر", "s1"),
+        ]
+        service = BatchPromptService()
+
+        assert len(service.group(items)) == 4
+        results = await collect(service, items)
+
+        assert sorted(r["index"] for r in results) == [0, 1, 2, 3]
+        assert index.llm["calls"] == [CHAT_PROMPTS[0], CHAT_PROMPTS[0], "بیشتر", "بیشتر"]
+        assert service.stats.snapshot()["deduplicated"] == 0
+
+    @pytest.mark.asyncio
+    async def test_llm_work_is_capped_and_failures_are_reported(self, index):
+        """LLM prompts respect the cap and a failing one doesn't sink the batch"""
+        items = [(prompt, "") for prompt in CHAT_PROMPTS]
+        service = BatchPromptService(llm_concurrency=2)
+
+        results = {r["index"]: r for r in await collect(service, items)}
+
+        assert index.llm["peak"] == 2
+        assert results[5] == {"index": 5, "error": "model failed"}
+        assert results[0]["assistant_response"] == f"reply to {CHAT_PROMPTS[0]}"
+        assert service.stats.snapshot()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_results_stream_in_completion_order(self, index):
+        """Index answers are yielded before slower LLM answers finish"""
+        items = [(CHAT_PROMPTS[0], ""), (SEARCH_PROMPTS[0], "")]
+
+        results = await collect(BatchPromptService(), items)
+
+        assert [r["index"] for r in results] == [1, 0]
+
+    @pytest.mark.asyncio
+    async def test_prompts_of_one_session_run_in_order(self, index, monkeypatch):
+        """Each prompt of a session sees the turns saved before it; sessions overlap"""
+        history = {}
+        running = {"now": 0, "peak": 0}
+
+        async def save_turn(session_id, prompt):
+            turns = len(history.get(session_id, []))
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            history.setdefault(session_id, []).append(prompt)
+            return f"reply after {turns} turns"
+
+        async def get_suggestion_places_from_db(prompt, session_id="", retrieval_only=False):
+            return [], session_id, await save_turn(session_id, prompt)
+
+        async def answer_from_index(session_id, previous_messages, decision, candidates=None):
+            return candidates, await save_turn(session_id, decision.query)
+
+        monkeypatch.setattr(
+            batch_service, "get_suggestion_places_from_db", get_suggestion_places_from_db
+        )
+        monkeypatch.setattr(batch_service, "answer_from_index", answer_from_index)
+        items = [
+            (CHAT_PROMPTS[0], "s1"),
+            (SEARCH_PROMPTS[0], "s1"),
+            (CHAT_PROMPTS[1], "s1"),
+            (CHAT_PROMPTS[2], "s2"),
+        ]
+
+        results = {r["index"]: r for r in await collect(BatchPromptService(), items)}
+
+        assert history["s1"] == [CHAT_PROMPTS[0], SEARCH_PROMPTS[0], CHAT_PROMPTS[1]]
+        assert [results[i]["assistant_response"] for i in range(3)] == [
+            "reply after 0 turns",
+            "reply after 1 turns",
+            "reply after 2 turns",
+        ]
+        assert running["peak"] == 2
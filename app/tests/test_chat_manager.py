@@ -0,0 +1,174 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+import pytest_asyncio
+import redis.asyncio as redis
+
+from app.helper.openai_helper import OpenAIMessage, OpendAIRole
+from app.helper.redis_helper import redis_manager
+from app.services.chat_manager import ChatManager
+from app.settings import REDIS_URL
+
+
+def message(content: str) -> OpenAIMessage:
+    return OpenAIMessage(role=OpendAIRole.ASSISTANT, content=content)
+
+
+def contents(messages: list[OpenAIMessage]) -> list[str]:
+    return [msg.content for msg in messages]
+
+
+@pytest_asyncio.fixture
+async def redis_client(monkeypatch):
+    """A real Redis; the versioned writes are Lua scripts"""
+    client = redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        await client.ping()
+    except redis.ConnectionError:
+        pytest.skip(f"Redis is not reachable at {REDIS_URL}")
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(redis_manager, "get_client", get_client)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def session_id(redis_client):
+    return f"test-{uuid.uuid4().hex}"
+
+
+def worker(**kwargs) -> ChatManager:
+    """A ChatManager standing in for one API worker"""
+    manager = ChatManager(**kwargs)
+    manager.session_prefix = "test_chat_session:"
+    return manager
+
+
+class TestChatManager:
+    """Test the session cache and its write-behind to Redis"""
+
+    @pytest.mark.asyncio
+    async def test_saves_are_coalesced_and_flushed_in_background(self, session_id):
+        """Saves return at once; the latest history is written once"""
+        manager = worker(flush_interval=0.05)
+        manager.start()
+        try:
+            for turn in range(3):
+                await manager.save_session_messages(
+                    session_id, [message(f"turn {i}") for i in range(turn + 1)]
+                )
+            assert manager.writes == 0
+            assert contents(await manager.get_session_messages(session_id)) == [
+                "turn 0", "turn 1", "turn 2",
+            ]
+            await asyncio.sleep(0.2)
+        finally:
+            await manager.stop()
+
+        assert manager.writes == 1
+        assert contents(await worker().get_session_messages(session_id))[-1] == "turn 2"
+
+    @pytest.mark.asyncio
+    async def test_cached_history_is_revalidated_without_payload(self, session_id):
+        """An unchanged history is confirmed by version, a newer one refetched"""
+        reader, writer = worker(fresh_seconds=0), worker()
+        await writer.save_session_messages(session_id, [message("a")])
+
+        await reader.get_session_messages(session_id)
+        await reader.get_session_messages(session_id)
+        assert (reader.fetched, reader.revalidated) == (1, 1)
+
+        await writer.save_session_messages(session_id, [message("a"), message("b")])
+        assert contents(await reader.get_session_messages(session_id)) == ["a", "b"]
+        assert reader.fetched == 2
+
+    @pytest.mark.asyncio
+    async def test_stale_worker_cannot_overwrite_newer_history(self, session_id):
+        """A save based on an old version is appended to the newer one instead"""
+        first, second = worker(), worker()
+        await first.save_session_messages(session_id, [message("a")])
+        await second.get_session_messages(session_id)
+
+        await first.save_session_messages(session_id, [message("a"), message("b")])
+        await second.save_session_messages(session_id, [message("a"), message("c")])
+
+        assert (second.conflicts, second.merged) == (1, 1)
+        assert contents(await worker().get_session_messages(session_id)) == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writers_lose_no_messages(self, session_id):
+        """Two workers saving turns of one session at once keep every turn"""
+        workers = [worker(flush_interval=0.01), worker(flush_interval=0.01)]
+        for manager in workers:
+            manager.start()
+
+        async def chat(manager, name):
+            for turn in range(5):
+                history = await manager.get_session_messages(session_id)
+                await manager.save_session_messages(
+                    session_id, history + [message(f"{name} {turn}")]
+                )
+                await asyncio.sleep(0.015)
+
+        try:
+            await asyncio.gather(chat(workers[0], "a"), chat(workers[1], "b"))
+        finally:
+            for manager in workers:
+                await manager.stop()
+
+        saved = contents(await worker().get_session_messages(session_id))
+        assert sorted(saved) == sorted(f"{name} {turn}" for name in "ab" for turn in range(5))
+        assert sum(manager.conflicts for manager in workers) > 0
+
+    @pytest.mark.asyncio
+    async def test_redis_outage_keeps_saves_queued(self, session_id, monkeypatch):
+        """A failed write doesn't raise; it is retried once Redis is back"""
+        manager = worker()
+        get_client = redis_manager.get_client
+
+        async def unreachable():
+            raise redis.ConnectionError("connection refused")
+
+        monkeypatch.setattr(redis_manager, "get_client", unreachable)
+        await manager.save_session_messages(session_id, [message("a")])
+        assert manager.snapshot()["dirty"] == 1
+        assert contents(await manager.get_session_messages(session_id)) == ["a"]
+
+        monkeypatch.setattr(redis_manager, "get_client", get_client)
+        await manager.stop()
+        assert manager.snapshot()["dirty"] == 0
+        assert contents(await worker().get_session_messages(session_id)) == ["a"]
+
+    @pytest.mark.asyncio
+    async def test_cache_and_dirty_queue_are_bounded(self, redis_client, monkeypatch):
+        """Old saved sessions are evicted; a full queue drops its oldest write"""
+        manager = worker(max_entries=2, dirty_limit=2)
+
+        async def unreachable():
+            raise redis.ConnectionError("connection refused")
+
+        monkeypatch.setattr(redis_manager, "get_client", unreachable)
+        for session in ("s1", "s2", "s3"):
+            await manager.save_session_messages(session, [message(session)])
+
+        assert manager.snapshot()["dirty"] == 2
+        assert manager.dropped == 1
+        assert len(manager._entries) == 2
+
+    @pytest.mark.asyncio
+    async def test_unversioned_sessions_are_upgraded(self, redis_client, session_id):
+        """Histories stored as plain JSON before versioning are still read"""
+        manager = worker()
+        await redis_client.set(
+            manager._get_session_key(session_id),
+            json.dumps([{"role": "assistant", "content": "old"}]),
+        )
+
+        assert contents(await manager.get_session_messages(session_id)) == ["old"]
+        await manager.save_session_messages(session_id, [message("old"), message("new")])
+        assert await redis_client.hget(manager._get_session_key(session_id), "version") == "1"
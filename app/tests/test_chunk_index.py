@@ -0,0 +1,62 @@
+import pytest
+
+from app.helper.chunk_index import (
+    aggregate_chunk_hits,
+    description_passages,
+    listing_chunks,
+    merge_scores,
+)
+
+
+class TestChunkIndex:
+    """Test review/description chunking and listing-level aggregation"""
+
+    def test_passages_keep_whole_sentences(self):
+        """Descriptions are split at sentence ends, Persian ones included"""
+        text = "ویلا دو خوابه است. استخر دارد؟ " + "حیاط بزرگ. " * 10
+
+        passages = description_passages(text, max_chars=60)
+
+        assert passages[0] == "ویلا دو خوابه است. استخر دارد؟ حیاط بزرگ. حیاط بزرگ."
+        assert all(len(p) <= 60 for p in passages)
+        assert "".join(passages).count("حیاط بزرگ.") == 10
+
+    def test_chunks_are_capped_per_listing(self):
+        """Passages fill half the cap, then the longest distinct reviews"""
+        description = ". ".join(f"sentence number {i} of the description" for i in range(10))
+        comments = ["short", "a clean and quiet place", "a clean and quiet place"] + [
+            f"the host was friendly and helpful {'!' * i}" for i in range(10)
+        ]
+
+        chunks = listing_chunks(description, comments, cap=6, max_chars=50, min_chars=10)
+
+        assert len(chunks) == 6
+        assert [kind for kind, _ in chunks] == ["description"] * 3 + ["review"] * 3
+        assert chunks[3][1] == "the host was friendly and helpful !!!!!!!!!"
+
+    def test_few_reviews_leave_room_for_passages(self):
+        """Without enough reviews the cap is filled with further passages"""
+        description = ". ".join(f"sentence number {i} of the description" for i in range(10))
+
+        chunks = listing_chunks(description, ["a clean and quiet place"], cap=6, max_chars=50)
+
+        assert [kind for kind, _ in chunks].count("review") == 1
+        assert len(chunks) == 6
+
+    def test_aggregation_by_max_or_top_m_mean(self):
+        """A listing scores its best chunk, or the mean of its best m"""
+        ids = ["a", "a", "a", "b"]
+        similarities = [0.9, 0.5, 0.1, 0.7]
+
+        assert aggregate_chunk_hits(ids, similarities, "max") == {"a": 0.9, "b": 0.7}
+        assert aggregate_chunk_hits(ids, similarities, "mean", top_m=2) == {
+            "a": 0.7,
+            "b": 0.7,
+        }
+
+    def test_merge_surfaces_chunk_only_listings(self):
+        """Chunk matches join the summary hits, behind equal summary scores"""
+        merged = merge_scores({"a": 0.8, "b": 0.4}, {"b": 0.6, "c": 0.8}, 3, margin=0.05)
+
+        assert [listing_id for listing_id, _ in merged] == ["a", "c", "b"]
+        assert merged[2][1] == pytest.approx(0.55)
@@ -0,0 +1,238 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pytest
+import redis
+
+from app.settings import REDIS_URL
+from crawlers import worker
+from crawlers.frontier import CrawlFrontier, LocalFrontier, WorkItem
+from crawlers.sites import ShabAdapter, SiteAdapter
+from crawlers.worker import crawl_locally, merge, run_workers, seed
+
+# Province -> room IDs it lists; the two provinces share rooms 25..48
+PROVINCES = {"gilan": range(1, 49), "mazandaran": range(25, 73)}
+FLAKY_ROOM = 5
+
+
+class FakeShabHandler(BaseHTTPRequestHandler):
+    """shab.ir data routes: 24 rooms per search page, one flaky detail page"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), url.path))
+            count = sum(path == url.path for _, path in self.server.requests)
+
+        if "/search/province/" in url.path:
+            province = unquote(url.path.rsplit("/", 1)[1]).removesuffix(".json")
+            rooms = list(PROVINCES[province])
+            page = int(query["page"][0])
+            listed = rooms[(page - 1) * 24 : page * 24] if page else []
+            data = {
+                "pagination": {"total": len(rooms)},
+                "list": [{"id": room_id} for room_id in listed],
+            }
+        else:
+            room_id = int(query["id"][0])
+            if room_id == FLAKY_ROOM and count == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            data = {"id": room_id, "title": f"room {room_id}"}
+
+        body = json.dumps({"pageProps": {"data": data}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def redis_client():
+    """A real Redis; the frontier's Lua scripts aren't worth faking"""
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip(f"Redis is not reachable at {REDIS_URL}")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def frontier_name(redis_client):
+    name = f"test-crawl-{uuid.uuid4().hex}"
+    yield name
+    CrawlFrontier(redis_client, name).clear()
+
+
+@pytest.fixture(params=["redis", "memory"])
+def make_frontier(request):
+    """Builds frontiers of both kinds; they must behave the same"""
+    if request.param == "memory":
+        return LocalFrontier
+    client = request.getfixturevalue("redis_client")
+    name = request.getfixturevalue("frontier_name")
+    return lambda **options: CrawlFrontier(client, name, **options)
+
+
+@pytest.fixture
+def site():
+    """Fake shab.ir running in a thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeShabHandler)
+    server.requests = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_port}/_next/data/build"
+    server.shutdown()
+    server.server_close()
+
+
+def item(key: str, host: str = "example.com") -> WorkItem:
+    return WorkItem("shab", "detail", key, f"http://{host}/houses/{key}", {})
+
+
+class TestCrawlFrontier:
+    """Test the crawl frontiers and their workers"""
+
+    def test_duplicate_rooms_are_queued_once(self, make_frontier):
+        """A room pushed again, by any worker, is dropped by the dedup set"""
+        frontier = make_frontier()
+
+        assert frontier.push([item("1"), item("2")]) == 2
+        assert frontier.push([item("2"), item("3")]) == 1
+        assert frontier.pending() == 3
+
+    def test_expired_lease_is_reclaimed(self, make_frontier):
+        """An item not acked within its lease goes to the next claimant"""
+        frontier = make_frontier(lease_seconds=0.1, host_delay=0)
+        frontier.push([item("1")])
+
+        first, _ = frontier.claim("worker-a")
+        assert frontier.claim("worker-b")[0] is None
+        time.sleep(0.15)
+        second, _ = frontier.claim("worker-b")
+
+        assert second.item == first.item
+        assert second.attempts == 1
+        assert not frontier.ack(first)
+        assert frontier.ack(second)
+        assert frontier.pending() == 0
+
+    def test_politeness_is_shared_by_workers(self, make_frontier):
+        """No worker may hit a host again within its delay; other hosts are free"""
+        frontier = make_frontier(host_delay=0.3)
+        frontier.push([item("1"), item("2"), item("3", host="other.example.com")])
+
+        first, _ = frontier.claim("worker-a")
+        second, _ = frontier.claim("worker-b")
+        blocked, wait = frontier.claim("worker-c")
+
+        assert first.item.host == "example.com"
+        assert second.item.host == "other.example.com"
+        assert blocked is None and 0 < wait <= 0.3
+
+    def test_failed_items_retry_then_die(self, make_frontier):
+        """Failures are retried until max_attempts, then kept as dead items"""
+        frontier = make_frontier(host_delay=0, max_attempts=2)
+        frontier.push([item("1")])
+
+        lease, _ = frontier.claim("worker-a")
+        assert frontier.fail(lease, 0, "status 503") == 1
+        lease, _ = frontier.claim("worker-a")
+        assert lease.attempts == 1
+        assert frontier.fail(lease, 0, "status 503") == 0
+
+        assert frontier.pending() == 0
+        assert frontier.dead_items()["shab:detail:1"]["reason"] == "status 503"
+
+    def test_item_crashing_its_worker_dies(self, make_frontier):
+        """Leases that keep expiring count as attempts until the item is dead"""
+        frontier = make_frontier(lease_seconds=0.05, host_delay=0, max_attempts=2)
+        frontier.push([item("1")])
+
+        assert frontier.claim("worker-a")[0].attempts == 0
+        time.sleep(0.1)
+        assert frontier.claim("worker-b")[0].attempts == 1
+        time.sleep(0.1)
+        lease, wait = frontier.claim("worker-c")
+
+        assert lease is None and wait is None
+        assert frontier.pending() == 0
+        assert frontier.dead_items()["shab:detail:1"]["reason"] == "lease expired"
+
+    def test_incomplete_adapter_cannot_be_created(self):
+        class NoHandle(SiteAdapter):
+            def search_item(self, location_id, page): ...
+            def detail_item(self, room_id, location_id, page): ...
+            def seeds(self, location_ids=None): ...
+
+        with pytest.raises(TypeError):
+            NoHandle()
+
+    def test_backed_off_host_is_left_alone(self, make_frontier):
+        """After a 429 no item of the host is handed out until the back-off ends"""
+        frontier = make_frontier(host_delay=0)
+        frontier.push([item("1")])
+        frontier.back_off_host("example.com", 0.3)
+
+        blocked, wait = frontier.claim("worker-a")
+
+        assert blocked is None and 0 < wait <= 0.3
+
+    def test_worker_processes_crawl_a_site_together(
+        self, redis_client, frontier_name, site, tmp_path
+    ):
+        """Several processes fetch every room once, politely, into one merged file"""
+        server, base_url = site
+        adapter = ShabAdapter(base_url)
+        frontier = CrawlFrontier(redis_client, frontier_name)
+        seed(frontier, adapter, list(PROVINCES), host_delay=0.02)
+
+        run_workers(
+            REDIS_URL,
+            frontier_name,
+            {"shab": adapter},
+            str(tmp_path / "out"),
+            processes=3,
+            idle_exit=0.5,
+        )
+        count = merge("shab", str(tmp_path / "out"), str(tmp_path / "rooms.jsonl"))
+
+        rooms = [json.loads(line) for line in open(tmp_path / "rooms.jsonl")]
+        assert count == 72
+        assert sorted(room["id"] for room in rooms) == list(range(1, 73))
+        assert len(list((tmp_path / "out").glob("shab.*.jsonl"))) > 1
+
+        detail_paths = [path for _, path in server.requests if "/houses/" in path]
+        assert len(detail_paths) == 73  # every room once, the flaky one twice
+        # The delay is kept between claims, and requests reach the stub with
+        # some jitter, so it is asserted over the whole crawl, not per pair
+        times = sorted(at for at, _ in server.requests)
+        assert times[-1] - times[0] >= (len(times) - 1) * 0.02 - 0.05
+
+    def test_local_crawl_needs_no_redis(self, site, tmp_path, monkeypatch):
+        """The single-node crawl keeps its frontier in memory"""
+        server, base_url = site
+        adapter = ShabAdapter(base_url)
+        adapter.output_path = str(tmp_path / "rooms.json")
+        monkeypatch.setattr(worker, "SITES", {"shab": lambda: adapter})
+        monkeypatch.setattr(worker, "CRAWL_OUTPUT_DIR", str(tmp_path / "out"))
+        monkeypatch.setattr(worker, "LocalFrontier", lambda: LocalFrontier(host_delay=0))
+        monkeypatch.setattr(worker, "REDIS_URL", "redis://127.0.0.1:1/0")
+
+        crawl_locally("shab", ["gilan"])
+
+        rooms = json.load(open(tmp_path / "rooms.json"))
+        assert sorted(room["id"] for room in rooms) == list(range(1, 49))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from benchmarks.hnsw_benchmark import (
+    GridResult,
+    exact_neighbours,
+    recall_at_k,
+    recommend,
+    run_grid,
+)
+
+
+@pytest.fixture
+def vectors():
+    """Small random corpus and query set"""
+    rng = np.random.default_rng(7)
+    corpus = rng.standard_normal((300, 16)).astype(np.float32)
+    queries = rng.standard_normal((20, 16)).astype(np.float32)
+    return [f"room_{i}" for i in range(len(corpus))], corpus, queries
+
+
+class TestHnswBenchmark:
+    """Test the HNSW parameter benchmark harness"""
+
+    @pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+    def test_exact_neighbours_match_naive_search(self, vectors, space):
+        """Brute-force ground truth agrees with a per-query sort"""
+        _, corpus, queries = vectors
+        neighbours = exact_neighbours(corpus, queries, 5, space)
+
+        for query, row in zip(queries, neighbours, strict=True):
+            if space == "l2":
+                distances = ((corpus - query) ** 2).sum(axis=1)
+            elif space == "cosine":
+                distances = -(corpus @ query) / np.linalg.norm(corpus, axis=1)
+            else:
+                distances = -(corpus @ query)
+            assert list(row) == list(np.argsort(distances)[:5])
+
+    def test_recall_at_k(self):
+        """Recall is the mean share of the exact top-k that was found"""
+        assert recall_at_k([["a", "b"], ["c", "x"]], [["a", "b"], ["c", "d"]]) == 0.75
+
+    def test_grid_measures_each_configuration(self, vectors):
+        """Every grid point is built and evaluated against the ground truth"""
+        ids, corpus, queries = vectors
+
+        results = run_grid(ids, corpus, queries, ["l2"], [8], [50], [10, 100], k=5)
+
+        assert [r.search_ef for r in results] == [10, 100]
+        assert results[-1].recall >= 0.9
+        assert all(r.p99_ms >= r.p50_ms > 0 for r in results)
+
+    def test_recommend_prefers_fastest_config_meeting_recall(self):
+        """The recommendation is the lowest p99 among configurations meeting recall"""
+
+        def result(search_ef: int, recall: float, p99: float) -> GridResult:
+            return GridResult("l2", 16, 100, search_ef, recall, p99 / 2, p99, 1.0, 1.0)
+
+        results = [result(10, 0.8, 1.0), result(50, 0.96, 2.0), result(100, 0.99, 3.0)]
+
+        assert recommend(results, min_recall=0.95).search_ef == 50
+        assert recommend(results, min_recall=0.999) is None
@@ -0,0 +1,141 @@
+import io
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from app.helper.image_store import ImageStore, ImmutableStaticFiles
+from crawlers.images import ImagePipeline, attach_thumbnails, make_thumbnail
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def jpeg(width: int, height: int, color: str) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(output, "JPEG")
+    return output.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Image host stub: one photo under two URLs, another photo, a non-image"""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body, content_type = self.server.routes.get(self.path, (b"", None))
+        self.send_response(200 if content_type else 404)
+        self.send_header("Content-Type", content_type or "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def image_host():
+    """Base URL of a stub image host running in a thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    photo = jpeg(1600, 1200, "green")
+    server.routes = {
+        "/a.jpg": (photo, "image/jpeg"),
+        "/copy-of-a.jpg": (photo, "image/jpeg"),
+        "/b.jpg": (jpeg(800, 600, "blue"), "image/jpeg"),
+        "/placeholder": (b"<html></html>", "text/html"),
+    }
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path / "images"), "/images")
+
+
+class TestImagePipeline:
+    """Test the thumbnail stage and the content-addressed image store"""
+
+    def test_thumbnail_is_small_webp(self):
+        """Thumbnails are WebP, bounded on the longer side and much smaller"""
+        original = jpeg(1600, 1200, "green")
+
+        thumbnail = make_thumbnail(original, max_size=480, quality=75)
+
+        with Image.open(io.BytesIO(thumbnail)) as image:
+            assert image.format == "WEBP"
+            assert image.size == (480, 360)
+        assert len(thumbnail) < len(original)
+
+    @pytest.mark.asyncio
+    async def test_same_content_is_stored_once(self, image_host, store):
+        """Two URLs of the same photo share one thumbnail; non-images are dropped"""
+        _, base = image_host
+        pipeline = ImagePipeline(store, workers=1)
+        urls = [f"{base}/a.jpg", f"{base}/copy-of-a.jpg", f"{base}/b.jpg", f"{base}/placeholder"]
+
+        thumbnails = await pipeline.run(urls)
+
+        assert thumbnails[f"{base}/a.jpg"] == thumbnails[f"{base}/copy-of-a.jpg"]
+        assert thumbnails[f"{base}/b.jpg"].startswith("/images/")
+        assert f"{base}/placeholder" not in thumbnails
+        assert pipeline.stats.created == 2
+        assert pipeline.stats.duplicates == 1
+        assert pipeline.stats.failed == 1
+
+    @pytest.mark.asyncio
+    async def test_known_urls_are_not_fetched_again(self, image_host, store):
+        """A later run answers stored URLs from the manifest"""
+        server, base = image_host
+        await ImagePipeline(store, workers=1).run([f"{base}/a.jpg"])
+        requests = len(server.requests)
+
+        pipeline = ImagePipeline(store, workers=1)
+        thumbnails = await pipeline.run([f"{base}/a.jpg"])
+
+        assert len(server.requests) == requests
+        assert pipeline.stats.known == 1
+        assert list(thumbnails) == [f"{base}/a.jpg"]
+
+    def test_listings_point_at_thumbnails(self, image_host, store):
+        """Listing images are replaced by thumbnail URLs in order"""
+        _, base = image_host
+        records = [{"id": "a", "images": [f"{base}/placeholder", f"{base}/b.jpg"]}]
+
+        [record] = attach_thumbnails(records, ImagePipeline(store, workers=1))
+
+        assert len(record["images"]) == 1
+        assert record["images"][0].endswith(".webp")
+
+    def test_thumbnails_are_served_immutable(self, store):
+        """Stored thumbnails are served with a long-lived cache header"""
+        store.put("ab" + "0" * 62, b"RIFF....WEBP")
+        app = Starlette()
+        app.mount("/images", ImmutableStaticFiles(directory=store.root))
+
+        response = TestClient(app).get(store.url("ab" + "0" * 62))
+
+        assert response.status_code == 200
+        assert "immutable" in response.headers["cache-control"]
+
+    def test_manifest_is_kept_outside_the_served_store(self, store):
+        """The manifest is never served; one left in the store is moved out"""
+        os.makedirs(store.root)
+        with open(os.path.join(store.root, "sources.json"), "w") as f:
+            json.dump({"http://example.com/a.jpg": "ab" + "0" * 62}, f)
+        assert store.load_manifest() == {"http://example.com/a.jpg": "ab" + "0" * 62}
+
+        store.save_manifest(store.load_manifest())
+        app = Starlette()
+        app.mount("/images", ImmutableStaticFiles(directory=store.root))
+
+        assert os.path.commonpath([store.root, store.manifest_path]) != store.root
+        assert TestClient(app).get("/images/sources.json").status_code == 404
+        assert store.load_manifest() == {"http://example.com/a.jpg": "ab" + "0" * 62}
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from app.helper.index_registry import IndexRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    """Registry rooted in an empty temporary directory"""
+    return IndexRegistry(str(tmp_path))
+
+
+class TestIndexRegistry:
+    """Test versioned index snapshots and the active pointer"""
+
+    def test_legacy_root_is_served_without_pointer(self, registry):
+        """An index root without ACTIVE is served as is"""
+        assert registry.active_version() is None
+        assert registry.active_path() == registry.root
+
+    def test_activate_switches_active_path(self, registry):
+        """Activating a built version points readers at its directory"""
+        version, path = registry.new_version()
+        registry.activate(version)
+
+        assert registry.active_version() == version
+        assert registry.active_path() == path
+        assert not [f for f in os.listdir(registry.root) if f.endswith(".tmp")]
+
+    def test_activate_unknown_version_fails(self, registry):
+        """The pointer never references a missing directory"""
+        with pytest.raises(FileNotFoundError):
+            registry.activate("missing")
+
+    def test_garbage_collect_keeps_retention_and_newer_builds(self, registry):
+        """Old versions beyond retention go, in-progress newer builds stay"""
+        for name in ["v1", "v2", "v3", "v4", "v5"]:
+            os.makedirs(registry.version_path(name))
+        registry.activate("v4")
+
+        removed = registry.garbage_collect(retention=1)
+
+        assert removed == ["v1", "v2"]
+        assert registry.list_versions() == ["v3", "v4", "v5"]
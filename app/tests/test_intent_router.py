@@ -0,0 +1,120 @@
+import pytest
+
+from app.services.intent_router import (
+    Intent,
+    IntentRouter,
+    destination_key,
+    extract_slots,
+    normalize_prompt,
+    province_of,
+    provinces_of,
+)
+
+
+@pytest.fixture
+def router():
+    """Fresh router so cache and stats do not leak between tests"""
+    return IntentRouter(enabled=True, min_confidence=0.8, cache_size=32)
+
+
+class TestIntentRouter:
+    """Test the retrieval-only fast path decisions"""
+
+    def test_normalize_prompt(self):
+        """Persian digits, Arabic letters and punctuation are normalized"""
+        assert normalize_prompt("ويلا، زير ۵ ميليون!") == "ویلا زیر 5 میلیون"
+
+    def test_extract_slots(self):
+        """Location, type, amenity and price are extracted from a search prompt"""
+        slots = extract_slots(normalize_prompt("ویلا استخردار در رامسر زیر ۵ میلیون"))
+
+        assert slots.province == "mazandaran"
+        assert slots.city == "رامسر"
+        assert slots.accommodation_type == "ویلا"
+        assert slots.amenities == ("استخر",)
+        assert slots.max_price == 5_000_000
+
+    def test_plain_search_takes_fast_path(self, router):
+        """An obvious search prompt is routed straight to retrieval"""
+        decision = router.route("ویلا استخردار در رامسر زیر ۵ میلیون")
+
+        assert decision.intent == Intent.SEARCH
+        assert decision.fast_path
+        assert decision.confidence >= 0.8
+
+    @pytest.mark.parametrize(
+        "prompt",
+        [
+            "سلام، خوبی؟",
+            "ویلا",
+            "اولی رو بیشتر توضیح بده",
+            "یه برنامه سفر سه روزه برای گیلان بچین",
+        ],
+    )
+    def test_ambiguous_prompts_fall_back_to_llm(self, router, prompt):
+        """Greetings, bare types, follow-ups and planning requests need the LLM"""
+        assert not router.route(prompt).fast_path
+
+    @pytest.mark.parametrize("prompt", ["گزینه های بیشتر", "بازم بفرست", "more"])
+    def test_more_prompts_page_previous_search(self, router, prompt):
+        """Short "show me more" replies page through the stored candidates"""
+        decision = router.route(prompt)
+
+        assert decision.intent == Intent.MORE
+        assert decision.fast_path
+
+    def test_more_with_new_constraints_is_a_new_search(self, router):
+        """Asking for more of something specific starts a new search"""
+        assert router.route("باز هم ویلا در رامسر").intent == Intent.SEARCH
+
+    def test_disabled_router_never_takes_fast_path(self):
+        """The fast path can be switched off from settings"""
+        router = IntentRouter(enabled=False, min_confidence=0.8, cache_size=32)
+
+        assert not router.route("ویلا استخردار در رامسر").fast_path
+
+    def test_decisions_are_cached(self, router):
+        """Repeated prompts are served from the decision cache"""
+        router.route("کلبه جنگلی در ماسوله")
+        router.route("کلبه جنگلی در ماسوله")
+
+        assert router.cache_info().hits == 1
+
+    def test_stats_report_saved_latency(self, router):
+        """Stats estimate the LLM time saved by fast-path answers"""
+        router.stats.record_llm(2.0)
+        router.stats.record_fast_path(0.5)
+        snapshot = router.stats.snapshot()
+
+        assert snapshot["fast_path"] == 1
+        assert snapshot["llm_fallback"] == 1
+        assert snapshot["estimated_saved_seconds"] == pytest.approx(1.5)
+
+    def test_destination_key_ignores_wording(self):
+        """Different wordings of one destination and intent share a cache key"""
+        assert destination_key("ویلا استخردار در رامسر") == destination_key(
+            "دنبال يه ويلا با استخر تو رامسر هستم"
+        )
+        assert destination_key("ویلا در رامسر") != destination_key("کلبه در رامسر")
+
+    def test_follow_ups_have_no_destination_key(self):
+        """Follow-ups and prompts without a destination are never cached"""
+        assert destination_key("اولی رو بیشتر توضیح بده") is None
+        assert destination_key("برای تعطیلات چه پیشنهادی داری؟") is None
+
+    def test_words_match_whole_words_only(self):
+        """A word inside a longer one is not matched, a plural or ezafe is"""
+        assert province_of("اتاق نورگیر در تهران") is None
+        assert province_of("ویلا در نور") == "mazandaran"
+        assert destination_key("بهترین ویلا در رامسر") is not None
+        assert destination_key("یه گزینه بهتر") is None
+        assert extract_slots(normalize_prompt("ویلاهای رامسر")).accommodation_type == "ویلا"
+
+    def test_region_covers_its_provinces(self):
+        """"شمال" names all three northern provinces and counts as a location"""
+        assert provinces_of("ویلا در شمال") == ("mazandaran", "gilan", "golestan")
+        assert provinces_of("ویلا در رشت") == ("gilan",)
+        assert province_of("ویلا در شمال") is None
+        assert destination_key("ویلا استخردار در شمال") == destination_key(
+            "ویلا با استخر شمال"
+        )
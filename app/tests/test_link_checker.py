@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.helper.link_checker import LinkChecker
+from app.helper.redis_helper import redis_manager
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Listing site stub: live and dead pages, images and a HEAD-less server"""
+
+    routes = {
+        "/rooms/1": (200, "text/html"),
+        "/rooms/gone": (404, "text/html"),
+        "/photos/1.jpg": (200, "image/jpeg"),
+        "/photos/placeholder": (200, "text/html"),
+        "/no-head": (200, "text/html"),
+    }
+
+    def _respond(self, head: bool):
+        self.server.requests.append((self.command, self.path))
+        if head and self.path == "/no-head":
+            self.send_response(405)
+            self.end_headers()
+            return
+        status, content_type = self.routes.get(self.path, (404, "text/html"))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MemoryRedis:
+    """The few Redis commands the link checker uses, kept in a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def setex(self, key, seconds, value):
+        self.data[key] = value
+
+    async def execute(self):
+        return []
+
+    async def zadd(self, key, mapping):
+        return len(mapping)
+
+
+@pytest.fixture
+def site():
+    """Base URL of a stub HTTP server running in a thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = MemoryRedis()
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(redis_manager, "get_client", get_client)
+    return client
+
+
+class TestLinkChecker:
+    """Test the link checker against a local HTTP stub"""
+
+    @pytest.mark.asyncio
+    async def test_pages_and_images(self, site, redis_client):
+        """Dead pages and non-image image URLs are reported dead"""
+        _, base = site
+        checker = LinkChecker(per_host=2, timeout=2)
+
+        pages = await checker.check_many([f"{base}/rooms/1", f"{base}/rooms/gone"])
+        images = await checker.check_many(
+            [f"{base}/photos/1.jpg", f"{base}/photos/placeholder"], image=True
+        )
+
+        assert pages == {f"{base}/rooms/1": True, f"{base}/rooms/gone": False}
+        assert images == {f"{base}/photos/1.jpg": True, f"{base}/photos/placeholder": False}
+
+    @pytest.mark.asyncio
+    async def test_head_rejected_falls_back_to_get(self, site, redis_client):
+        """Servers answering HEAD with 405 are checked with GET"""
+        server, base = site
+        checker = LinkChecker(timeout=2)
+
+        assert await checker.check_many([f"{base}/no-head"]) == {f"{base}/no-head": True}
+        assert server.requests == [("HEAD", "/no-head"), ("GET", "/no-head")]
+
+    @pytest.mark.asyncio
+    async def test_malformed_urls_are_dead(self, site, redis_client):
+        """A URL httpx refuses to send is reported dead, not raised"""
+        _, base = site
+        checker = LinkChecker(timeout=2)
+
+        assert await checker.check_many([f"{base}/rooms/1", "http://a\x00b/"]) == {
+            f"{base}/rooms/1": True,
+            "http://a\x00b/": False,
+        }
+
+    @pytest.mark.asyncio
+    async def test_cached_statuses_skip_requests(self, site, redis_client):
+        """A second check of the same URL is answered from the cache"""
+        server, base = site
+        checker = LinkChecker(timeout=2)
+        await checker.check_many([f"{base}/rooms/gone"])
+        requests = len(server.requests)
+
+        assert await checker.check_many([f"{base}/rooms/gone"]) == {
+            f"{base}/rooms/gone": False
+        }
+        assert len(server.requests) == requests
+
+    @pytest.mark.asyncio
+    async def test_serve_time_filter_uses_cache_only(self, site, redis_client):
+        """Known-dead rooms are dropped; unknown ones are kept and checked later"""
+        _, base = site
+        checker = LinkChecker(timeout=2)
+        await checker.check_many([f"{base}/rooms/gone"])
+        rooms = [
+            {"id": "a", "web_url": f"{base}/rooms/gone", "image_url": None},
+            {"id": "b", "web_url": f"{base}/rooms/1", "image_url": None},
+        ]
+
+        assert [room["id"] for room in await checker.filter_rooms(rooms)] == ["b"]
+        await asyncio.gather(*checker._background)
+
+    @pytest.mark.asyncio
+    async def test_background_checks_are_not_repeated(self, site, redis_client):
+        """Concurrent requests for the same unknown rooms probe each URL once"""
+        server, base = site
+        checker = LinkChecker(timeout=2, background_checks=1)
+        checker.start()
+        rooms = [
+            {"id": "a", "web_url": f"{base}/rooms/1", "image_url": f"{base}/photos/1.jpg"},
+            {"id": "b", "web_url": f"{base}/rooms/gone", "image_url": None},
+        ]
+
+        await asyncio.gather(*(checker.filter_rooms(rooms) for _ in range(5)))
+        await asyncio.gather(*checker._background)
+        await checker.close()
+
+        assert sorted(server.requests) == [
+            ("HEAD", "/photos/1.jpg"),
+            ("HEAD", "/rooms/1"),
+            ("HEAD", "/rooms/gone"),
+        ]
+        assert checker.snapshot()["pending_links"] == 0
@@ -0,0 +1,48 @@
+import pytest
+
+from app.helper.listing_store import ListingStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Listing store with two rooms written in unsorted order"""
+    records = [
+        {
+            "id": "shab_2",
+            "title": "کلبه جنگلی",
+            "price": "2500000",
+            "images": ["https://example.com/2a.jpg", "https://example.com/2b.jpg"],
+        },
+        {"id": "jajiga_1", "title": "ویلا ساحلی", "price": "4000000", "images": []},
+    ]
+    ListingStore.write(str(tmp_path), records, ["title", "price", "images"])
+    return ListingStore(str(tmp_path))
+
+
+class TestListingStore:
+    """Test the columnar store that hydrates retrieval results"""
+
+    def test_get_preserves_requested_order(self, store):
+        """Rows come back in the order of the requested IDs"""
+        rows = store.get(["shab_2", "jajiga_1"], ("title",))
+
+        assert rows == [{"title": "کلبه جنگلی"}, {"title": "ویلا ساحلی"}]
+
+    def test_get_projects_fields(self, store):
+        """Only requested columns are read, and list values round-trip"""
+        row = store.get(["shab_2"], ("price", "images"))[0]
+
+        assert row == {
+            "price": "2500000",
+            "images": ["https://example.com/2a.jpg", "https://example.com/2b.jpg"],
+        }
+
+    def test_unknown_ids_are_none(self, store):
+        """IDs missing from the store are reported as None, not skipped"""
+        assert store.get(["missing"]) == [None]
+        assert len(store) == 2
+        assert "jajiga_1" in store
+
+    def test_incomplete_store_is_not_opened(self, tmp_path):
+        """A directory without a manifest is treated as no store at all"""
+        assert ListingStore.open_if_exists(str(tmp_path)) is None
@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app import settings
+from app.helper.openai_helper import CircuitOpenError, OpenAIError, OpenAIService
+from app.helper.resilience_helper import BreakerState, CircuitBreaker
+
+
+def timeout_error() -> openai.APITimeoutError:
+    return openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com"))
+
+
+class FlakyRequest:
+    """Request factory that fails or stalls according to a script"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.calls = 0
+
+    async def __call__(self):
+        behaviour = self.behaviours[min(self.calls, len(self.behaviours) - 1)]
+        self.calls += 1
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        await asyncio.sleep(behaviour)
+        return f"response {self.calls}"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """OpenAIService with instant backoff and a small breaker"""
+    monkeypatch.setattr(settings, "OPENAI_RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(settings, "OPENAI_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "OPENAI_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(settings, "OPENAI_HEDGE_MIN_DELAY", 0)
+    return OpenAIService(api_key="sk-test")
+
+
+class TestOpenAIResilience:
+    """Test retries, hedging and the circuit breaker around OpenAI calls"""
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self, service):
+        """Timeouts are retried with backoff until a call succeeds"""
+        request = FlakyRequest(timeout_error(), timeout_error(), 0)
+
+        assert await service._call("gpt", request) == "response 3"
+        assert service.health["gpt"].retries == 2
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self, service):
+        """A bad request fails at once and doesn't count against the model"""
+        request = FlakyRequest(ValueError("bad input"))
+
+        with pytest.raises(OpenAIError):
+            await service._call("gpt", request)
+        assert request.calls == 1
+        assert service.health["gpt"].breaker.state == BreakerState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_slow_request_is_hedged(self, service):
+        """A request outliving the p95 latency is raced against a second copy"""
+        health = service._health("gpt")
+        for _ in range(settings.OPENAI_HEDGE_MIN_SAMPLES):
+            health.latency.record(0.01)
+        request = FlakyRequest(5, 0)
+
+        result = await asyncio.wait_for(service._call("gpt", request), timeout=1)
+
+        assert result == "response 2"
+        assert health.hedges == 1
+        assert health.snapshot()["hedge_win_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_rejects_without_calling(self, service):
+        """After repeated failures calls fail fast with CircuitOpenError"""
+        request = FlakyRequest(timeout_error())
+        with pytest.raises(OpenAIError):
+            await service._call("gpt", request)
+        calls = request.calls
+
+        with pytest.raises(CircuitOpenError) as error:
+            await service._call("gpt", request)
+        assert request.calls == calls
+        assert int(error.value.retry_after_header) >= 1
+        assert service.snapshot()["gpt"]["breaker"]["state"] == "open"
+
+    def test_breaker_lets_one_probe_through_after_reset(self):
+        """A half-open breaker allows a single probe and closes on success"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == BreakerState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_frees_the_half_open_breaker(self, service):
+        """A probe cancelled mid-call lets the next call probe instead"""
+        breaker = service._health("gpt").breaker
+        breaker.record_failure()
+        breaker.state, breaker.reset_timeout = BreakerState.OPEN, 0
+
+        probe = asyncio.create_task(service._call("gpt", FlakyRequest(5)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert await service._call("gpt", FlakyRequest(0)) == "response 1"
+        assert breaker.state == BreakerState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_client_error_does_not_close_a_half_open_breaker(self, service):
+        """A bad request is no evidence the model recovered"""
+        breaker = service._health("gpt").breaker
+        breaker.record_failure()
+        breaker.state, breaker.reset_timeout = BreakerState.OPEN, 0
+
+        with pytest.raises(OpenAIError):
+            await service._call("gpt", FlakyRequest(ValueError("bad input")))
+
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow()
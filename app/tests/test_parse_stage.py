@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from crawlers.parsers import stage
+from crawlers.parsers.parse_shab_room import parse_shab_room
+from crawlers.parsers.stage import iter_records, run_parse_stage
+
+
+def shab_room(room_id: int, **overrides) -> dict:
+    """Raw shab.ir room with the fields the parser reads"""
+    room = {
+        "id": room_id,
+        "title": "ویلا ساحلی",
+        "about": "ویلا دو خوابه نزدیک دریا",
+        "type": "villa",
+        "rates": {"value": 4.6},
+        "reviews_count": 2,
+        "reviews": [{"comment": "عالی بود"}, {"comment": None}],
+        "building_area": 120,
+        "location": {"city": "رامسر", "province": "مازندران", "latitude": 36.9, "longitude": 50.6},
+        "pricing": {
+            "records": [
+                {
+                    "workweek_days": {"amount": 2500000},
+                    "weekend_days": {"amount": 3000000},
+                    "extra_person": {"amount": 200000},
+                }
+            ]
+        },
+        "pictures": {"records": [{"thumbnail_path": "https://example.com/1.jpg"}]},
+    }
+    room.update(overrides)
+    return room
+
+
+class TestParseStage:
+    """Test the multiprocess parse stage and its quarantine"""
+
+    def test_shab_room_is_parsed(self):
+        """A valid raw room becomes a site-independent listing"""
+        listing = parse_shab_room(shab_room(7))
+
+        assert listing["id"] == "shab_7"
+        assert listing["province"] == "mazandaran"
+        assert listing["price"] == 2500000
+        assert listing["comments"] == ["عالی بود"]
+        assert listing["images"] == ["https://example.com/1.jpg"]
+
+    def test_bad_records_are_quarantined_with_reason(self, tmp_path):
+        """Malformed rooms are set aside and the rest of the run completes"""
+        records = [
+            shab_room(1),
+            shab_room(2, pricing={"records": []}),
+            shab_room(3),
+            "not a room",
+        ]
+        input_path = tmp_path / "rooms.json"
+        input_path.write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+        output_path = tmp_path / "parsed.jsonl"
+        quarantine_path = tmp_path / "quarantine.jsonl"
+
+        stats = run_parse_stage(
+            parse_shab_room,
+            str(input_path),
+            str(output_path),
+            str(quarantine_path),
+            chunk_size=2,
+            workers=2,
+        )
+
+        parsed = [json.loads(line) for line in output_path.read_text().splitlines()]
+        quarantined = [json.loads(line) for line in quarantine_path.read_text().splitlines()]
+        assert [listing["id"] for listing in parsed] == ["shab_1", "shab_3"]
+        assert [entry["index"] for entry in quarantined] == [1, 3]
+        assert "pricing.records" in quarantined[0]["reason"]
+        assert stats.snapshot()["error_rate"] == 0.5
+
+    def test_json_array_is_streamed_across_reads(self, tmp_path, monkeypatch):
+        """Records split over read boundaries are decoded intact"""
+        monkeypatch.setattr(stage, "READ_SIZE", 16)
+        records = [{"id": i, "title": "کلبه " * i} for i in range(20)]
+        path = tmp_path / "rooms.json"
+        path.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        assert list(iter_records(str(path))) == records
+
+    def test_truncated_array_fails(self, tmp_path):
+        """A cut-off file is reported instead of silently dropping records"""
+        path = tmp_path / "rooms.json"
+        path.write_text('[{"id": 1}, {"id": ', encoding="utf-8")
+
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_records(str(path)))
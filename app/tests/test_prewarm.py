@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from app.helper.chromadb_helper import EmbeddingCache
+from app.helper.popular_queries import PopularQueries
+from app.helper.redis_helper import redis_manager
+from app.services import prewarm_service
+from app.services.prewarm_service import CachePrewarmer
+
+
+class MemoryRedis:
+    """The few sorted set commands popular queries use, kept in dicts"""
+
+    def __init__(self):
+        self.zsets = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def zincrby(self, key, amount, member):
+        zset = self.zsets.setdefault(key, {})
+        zset[member] = zset.get(member, 0) + amount
+
+    def _ranked(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def zremrangebyrank(self, key, start, end):
+        ranked = self._ranked(key)
+        for member, _ in ranked[start:len(ranked) + end + 1]:
+            del self.zsets[key][member]
+
+    async def execute(self):
+        return []
+
+    async def zrevrange(self, key, start, end):
+        return [member for member, _ in reversed(self._ranked(key))][start:end + 1]
+
+
+class StubIndex:
+    """Vector index stub recording the batches it was queried with"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def query_many(self, queries, n_results=5):
+        time.sleep(self.delay)
+        self.batches.append(list(queries))
+        return [[] for _ in queries]
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = MemoryRedis()
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(redis_manager, "get_client", get_client)
+    return client
+
+
+async def record(queries: PopularQueries, *searches: str) -> None:
+    for query in searches:
+        queries.record(query)
+    await asyncio.gather(*queries._background)
+
+
+class TestPrewarm:
+    """Test popular query tracking and cache prewarming"""
+
+    @pytest.mark.asyncio
+    async def test_popular_queries_are_normalized_and_bounded(self, redis_client):
+        """Variants of a query share a count; only the most searched are kept"""
+        queries = PopularQueries(limit=2)
+        await record(queries, "ویلا رامسر", "ویلا  رامسر!", "کلبه", "كلبه", "کلبه", "سوئیت")
+
+        assert await queries.top(5) == ["کلبه", "ویلا رامسر"]
+        assert queries.snapshot()["recorded"] == 6
+
+    @pytest.mark.asyncio
+    async def test_prewarm_replays_top_queries_in_batches(self, redis_client, monkeypatch):
+        """The most searched queries are searched, most searched first"""
+        index = StubIndex()
+        queries = PopularQueries()
+        monkeypatch.setattr(prewarm_service, "chroma_db_service", index)
+        monkeypatch.setattr(prewarm_service, "popular_queries", queries)
+        await record(queries, "a", "a", "a", "a", "b", "b", "b", "c", "c", "d")
+
+        prewarmer = CachePrewarmer(top_n=3, budget_seconds=5, batch_size=2)
+        assert await prewarmer.run() == 3
+
+        assert index.batches == [["a", "b"], ["c"]]
+        snapshot = prewarmer.snapshot()
+        assert (snapshot["state"], snapshot["progress"]) == ("done", 1.0)
+
+    @pytest.mark.asyncio
+    async def test_prewarm_stops_at_its_budget(self, redis_client, monkeypatch):
+        """A slow index is left cold once the budget is spent"""
+        index = StubIndex(delay=0.1)
+        queries = PopularQueries()
+        monkeypatch.setattr(prewarm_service, "chroma_db_service", index)
+        monkeypatch.setattr(prewarm_service, "popular_queries", queries)
+        await record(queries, *(f"query {i}" for i in range(20)))
+
+        prewarmer = CachePrewarmer(top_n=20, budget_seconds=0.25, batch_size=1)
+        started = time.perf_counter()
+        warmed = await prewarmer.run()
+
+        assert time.perf_counter() - started < 0.5
+        assert 0 < warmed < 20
+        assert prewarmer.snapshot()["state"] == "timed_out"
+
+    def test_embedding_cache_embeds_only_misses(self):
+        """Cached queries skip the embedding call; the oldest are evicted"""
+        embedded = []
+
+        def embed(queries):
+            embedded.append(list(queries))
+            return [[float(len(query))] for query in queries]
+
+        cache = EmbeddingCache(max_entries=2)
+        cache.embed(["a", "bb"], embed)
+        assert cache.embed(["bb", "ccc", "a"], embed) == [[2.0], [3.0], [1.0]]
+        cache.embed(["bb"], embed)
+
+        assert embedded == [["a", "bb"], ["ccc"], ["bb"]]
+        assert cache.snapshot() == {"cached": 2, "hits": 2, "misses": 4}
+
+    def test_embedding_cache_shares_entries_with_popular_queries(self):
+        """Variants of a query, and its counted form, use one cached embedding"""
+        embedded = []
+
+        def embed(queries):
+            embedded.append(list(queries))
+            return [[float(len(query))] for query in queries]
+
+        cache = EmbeddingCache(max_entries=10)
+        cache.embed(["ویلا  رامسر!"], embed)
+        cache.embed(["ویلا رامسر", "ويلا رامسر"], embed)
+
+        assert embedded == [["ویلا رامسر"]]
+        assert cache.snapshot() == {"cached": 1, "hits": 2, "misses": 1}
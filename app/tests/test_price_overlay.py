@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import warmup_db
+from app.helper.chromadb_helper import ChromaDBService
+from app.helper.index_registry import IndexRegistry
+from app.helper.listing_store import LISTINGS_DIRECTORY, ListingStore
+from app.helper.price_overlay import PriceOverlay
+from app.helper.redis_helper import redis_manager
+from crawlers.prices import PriceRefresher
+from crawlers.sites import JajigaAdapter
+
+
+def jajiga_room(room_id: int, min_price: int) -> dict:
+    return {"id": room_id, "title": f"room {room_id}", "min_price": min_price, "extra_price": 0}
+
+
+class RoomHandler(BaseHTTPRequestHandler):
+    """jajiga.com API stub: one room with a new price, one taken down"""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        room = self.server.rooms.get(self.path)
+        body = json.dumps(room).encode() if room else b""
+        self.send_response(200 if room else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RecordingAdapter(JajigaAdapter):
+    """JajigaAdapter remembering the detail items it built"""
+
+    def __init__(self, base_url: str):
+        super().__init__(base_url=base_url)
+        self.details = []
+
+    def detail_item(self, room_id, location_id, page):
+        self.details.append((room_id, location_id))
+        return super().detail_item(room_id, location_id, page)
+
+
+class MemoryRedis:
+    """The few Redis commands the price overlay uses, kept in dicts"""
+
+    def __init__(self):
+        self.data = {}
+        self.zsets = {}
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def setex(self, key, seconds, value):
+        self.data[key] = value
+
+    async def execute(self):
+        return []
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    async def zrevrange(self, key, start, end):
+        zset = self.zsets.get(key, {})
+        return sorted(zset, key=zset.get, reverse=True)[start : end + 1]
+
+
+@pytest.fixture
+def site():
+    """Base URL of a stub jajiga.com API running in a thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RoomHandler)
+    server.rooms = {"/api/room/1": jajiga_room(1, 2_500_000)}
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_port}/api"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = MemoryRedis()
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(redis_manager, "get_client", get_client)
+    return client
+
+
+def parsed_listing(room_id: int, location_id: str) -> dict:
+    """A parse stage record, as warmup_db reads it"""
+    return {
+        "id": f"jajiga_{room_id}",
+        "site": "jajiga",
+        "title": f"room {room_id}",
+        "type": "villa",
+        "description": "",
+        "price": 1_800_000,
+        "extra_price": 0,
+        "city": "رامسر",
+        "province": "mazandaran",
+        "rating": None,
+        "reviews_count": None,
+        "images": [],
+        "web_url": f"https://jajiga.com/room/{room_id}",
+        "location_id": location_id,
+    }
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Index version built the way warmup_db builds its listing store"""
+    registry = IndexRegistry(str(tmp_path / "index"))
+    version, path = registry.new_version()
+    ListingStore.write(
+        os.path.join(path, LISTINGS_DIRECTORY),
+        [warmup_db.to_listing(parsed_listing(1, "p26"), "summary")],
+        warmup_db.LISTING_COLUMNS,
+    )
+    registry.activate(version)
+    return ChromaDBService(registry)
+
+
+def rooms() -> list[dict]:
+    return [
+        {"id": "jajiga_1", "price": "1800000", "extra_price": "0", "web_url": "a"},
+        {"id": "jajiga_2", "price": "900000", "extra_price": "0", "web_url": "b"},
+        {"id": "jajiga_3", "price": "700000", "web_url": "c"},
+    ]
+
+
+class TestPriceOverlay:
+    """Test serve-time price merging and the hot-listing refresher"""
+
+    @pytest.mark.asyncio
+    async def test_refresh_updates_prices_without_the_index(self, site, redis_client):
+        """Refetched prices replace indexed ones; taken-down listings are dropped"""
+        _, base = site
+        overlay = PriceOverlay()
+        refresher = PriceRefresher(overlay, {"jajiga": JajigaAdapter(base_url=base)}, timeout=2)
+
+        entries = await refresher.refresh(["jajiga_1", "jajiga_2"])
+        served = await overlay.apply(rooms())
+
+        assert entries["jajiga_1"]["price"] == 2_500_000
+        assert entries["jajiga_2"]["available"] is False
+        assert [room["id"] for room in served] == ["jajiga_1", "jajiga_3"]
+        assert served[0]["price"] == "2500000"
+        assert "price_updated_at" in served[0]
+        assert served[1] == rooms()[2]
+
+    @pytest.mark.asyncio
+    async def test_only_stale_hot_listings_are_refreshed(self, site, redis_client):
+        """Served listings are refreshed once, not again while still fresh"""
+        server, base = site
+        overlay = PriceOverlay()
+        refresher = PriceRefresher(overlay, {"jajiga": JajigaAdapter(base_url=base)}, timeout=2)
+        await overlay._mark_hot(["jajiga_1", "jajiga_2"])
+        redis_client.zsets[overlay.hot_key]["jajiga_old"] = time.time() - 10**7
+
+        assert await refresher.refresh_hot() == 2
+        assert sorted(server.requests) == ["/api/room/1", "/api/room/2"]
+
+        del redis_client.data[overlay.refresh_lock_key]
+        assert await refresher.refresh_hot() == 0
+        assert len(server.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_unknown_sites_and_broken_pages_are_skipped(self, site, redis_client):
+        """Listings of unknown sites or with unparsable pages keep their index price"""
+        server, base = site
+        server.rooms["/api/room/4"] = {"unexpected": True}
+        refresher = PriceRefresher(
+            PriceOverlay(), {"jajiga": JajigaAdapter(base_url=base)}, timeout=2
+        )
+
+        assert await refresher.refresh(["jajiga_4", "other_1"]) == {}
+        assert refresher.failed == 2
+
+    @pytest.mark.asyncio
+    async def test_refresh_uses_the_stored_crawl_location(self, site, redis_client, index):
+        """Detail pages are requested as the crawler did, with the listing's location"""
+        _, base = site
+        adapter = RecordingAdapter(base)
+        refresher = PriceRefresher(PriceOverlay(), {"jajiga": adapter}, timeout=2, index=index)
+
+        await refresher.refresh(["jajiga_1", "jajiga_2"])
+
+        assert sorted(adapter.details) == [("1", "p26"), ("2", "")]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.helper import profiler_helper
+from app.helper.profiler_helper import AWAITING, ProfilerMiddleware, ProfileStore
+
+
+def busy_work(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """App with a CPU-bound and an I/O-bound phase behind the profiler"""
+    monkeypatch.setattr(profiler_helper, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiler_helper, "profile_store", ProfileStore(str(tmp_path)))
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware)
+
+    @app.get("/slow")
+    async def slow():
+        busy_work(0.1)
+        await asyncio.sleep(0.1)
+        return {"ok": True}
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestProfiler:
+    """Test the opt-in request profiler middleware"""
+
+    @pytest.mark.asyncio
+    async def test_unprofiled_request_has_no_profile(self, client):
+        """Without the token the request passes straight through"""
+        response = await client.get("/slow", headers={"X-Profile": "wrong"})
+
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_profile_splits_cpu_and_await_time(self, client):
+        """Python work and awaited time both show up as collapsed stacks"""
+        response = await client.get("/slow", headers={"X-Profile": "secret"})
+        profile = profiler_helper.profile_store.load(response.headers["x-profile-id"])
+
+        stacks = dict(line.rsplit(" ", 1) for line in profile.splitlines())
+        cpu = sum(int(n) for stack, n in stacks.items() if "busy_work" in stack)
+        waiting = sum(int(n) for stack, n in stacks.items() if stack.endswith(AWAITING))
+        assert cpu >= 2
+        assert waiting >= 2
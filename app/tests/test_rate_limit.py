@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.helper.rate_limit_helper import ConcurrencyLimiter, OverloadedError
+
+
+class TestConcurrencyLimiter:
+    """Test the global concurrency limiter used to shed load on /user-prompt"""
+
+    @pytest.mark.asyncio
+    async def test_queue_full_sheds_immediately(self):
+        """Requests beyond the concurrency cap plus queue size are rejected"""
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=0, queue_timeout=1)
+
+        async with limiter.slot():
+            with pytest.raises(OverloadedError) as error:
+                async with limiter.slot():
+                    pass
+
+        assert error.value.retry_after_header == "1"
+        assert limiter.snapshot()["shed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queued_request_times_out(self):
+        """A queued request gives up after the queue timeout"""
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1, queue_timeout=0.01)
+
+        async with limiter.slot():
+            with pytest.raises(OverloadedError):
+                async with limiter.slot():
+                    pass
+
+        assert limiter.snapshot()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_queued_request_runs_when_slot_frees(self):
+        """A queued request proceeds once the in-flight request finishes"""
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1, queue_timeout=1)
+        order = []
+
+        async def work(name: str, delay: float):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(delay)
+
+        await asyncio.gather(work("first", 0.02), work("second", 0))
+
+        assert order == ["first", "second"]
+        assert limiter.snapshot()["in_flight"] == 0
+
+
+class TestDegradedPath:
+    """Test that shedding to retrieval-only answers is itself bounded"""
+
+    @pytest.mark.asyncio
+    async def test_degraded_path_returns_503_when_full(self, monkeypatch):
+        """Once the LLM and retrieval-only paths are both full, 503 is returned"""
+        from app import main
+
+        release = asyncio.Event()
+
+        async def answer(prompt, session_id="", retrieval_only=False):
+            await release.wait()
+            return [], "session", "retrieval only" if retrieval_only else "llm"
+
+        monkeypatch.setattr(main, "RATE_LIMIT_ENABLED", False)
+        monkeypatch.setattr(main, "DEGRADE_ON_OVERLOAD", True)
+        monkeypatch.setattr(main, "get_suggestion_places_from_db", answer)
+        monkeypatch.setattr(
+            main, "prompt_concurrency_limiter", ConcurrencyLimiter(1, 0, 1)
+        )
+        monkeypatch.setattr(
+            main, "degraded_concurrency_limiter", ConcurrencyLimiter(1, 0, 1)
+        )
+        transport = httpx.ASGITransport(app=main.app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+            async def prompt():
+                return await client.get("/user-prompt", params={"prompt": "ویلا"})
+
+            llm = asyncio.create_task(prompt())
+            await asyncio.sleep(0.05)
+            degraded = asyncio.create_task(prompt())
+            await asyncio.sleep(0.05)
+            rejected = await prompt()
+            release.set()
+            responses = await asyncio.gather(llm, degraded)
+
+        assert rejected.status_code == 503
+        assert "Retry-After" in rejected.headers
+        assert [r.json()["assistant_response"] for r in responses] == [
+            "llm",
+            "retrieval only",
+        ]
@@ -0,0 +1,128 @@
+import uuid
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.helper.trace_helper import (
+    RequestTracer,
+    annotate,
+    record_tool_call,
+    scrub,
+    trace_stage,
+)
+from benchmarks.replay import ReplayResult, compare, load_traces, replay, summarize
+
+
+def stub_api(requests: list):
+    """/user-prompt stub that starts a session when none is given"""
+
+    async def user_prompt(request):
+        session_id = request.query_params["session_id"] or uuid.uuid4().hex
+        requests.append((request.query_params["prompt"], session_id))
+        return JSONResponse({"tool_response": [], "session_id": session_id})
+
+    return Starlette(routes=[Route("/user-prompt", user_prompt)])
+
+
+def traces(sessions: int, turns: int) -> list[dict]:
+    return [
+        {
+            "ts": 1000 + turn * 10 + session,
+            "session": f"s{session}",
+            "turn": turn,
+            "prompt": f"prompt {session}.{turn}",
+            "path": "fast_path" if turn else "llm",
+        }
+        for session in range(sessions)
+        for turn in range(turns)
+    ]
+
+
+class TestRequestTrace:
+    """Test trace capture and replay of /user-prompt traffic"""
+
+    def test_prompts_are_scrubbed(self):
+        """Phone numbers, emails and links are masked; the rest is kept"""
+        prompt = "ویلا در رامسر، شماره من ۰۹۱۲۳۴۵۶۷۸۹ و a@b.com https://x.ir/r/1"
+
+        assert scrub(prompt) == "ویلا در رامسر، شماره من <number> و <email> <link>"
+        assert scrub("ویلا برای ۴ نفر زیر 2 میلیون") == "ویلا برای ۴ نفر زیر 2 میلیون"
+
+    def test_sampled_trace_is_written_anonymized(self, tmp_path):
+        """A traced request logs its stages and tool calls, not its session ID"""
+        tracer = RequestTracer(str(tmp_path / "traces.jsonl"), sample_rate=1.0, salt="s")
+
+        with tracer.trace("ویلا با استخر 09123456789") as trace:
+            with trace_stage("llm"):
+                record_tool_call("query_similar_rooms", "ویلا با استخر")
+            annotate(path="llm", turn=2, results=5)
+            trace.session_id = "session-1"
+
+        [record] = load_traces(str(tmp_path / "traces.jsonl"))
+        assert record["prompt"] == "ویلا با استخر <number>"
+        assert record["session"] != "session-1" and len(record["session"]) == 16
+        assert (record["path"], record["turn"], record["results"]) == ("llm", 2, 5)
+        assert set(record["stages"]) == {"llm"}
+        assert record["tool_calls"] == [{"name": "query_similar_rooms", "query": "ویلا با استخر"}]
+
+    def test_whole_sessions_are_sampled(self, tmp_path):
+        """Every request of a session is traced or none is"""
+        tracer = RequestTracer(str(tmp_path / "traces.jsonl"), sample_rate=0.5)
+        sessions = [f"session-{i}" for i in range(200)]
+
+        sampled = {session for session in sessions if tracer.sampled(session)}
+
+        assert 50 < len(sampled) < 150
+        assert all(tracer.sampled(session) for session in sampled)
+        assert not tracer.sampled("")
+
+    @pytest.mark.asyncio
+    async def test_replay_keeps_session_order(self):
+        """Follow-ups are sent after their first turn, on the session it created"""
+        requests = []
+        transport = httpx.ASGITransport(app=stub_api(requests))
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            results = await replay(traces(3, 3), client, speed=0)
+
+        assert len(results) == 9
+        for session in range(3):
+            sent = [(p, s) for p, s in requests if p.startswith(f"prompt {session}.")]
+            assert [p for p, _ in sent] == [f"prompt {session}.{t}" for t in range(3)]
+            assert len({s for _, s in sent}) == 1
+
+    @pytest.mark.asyncio
+    async def test_replay_follows_recorded_pace(self):
+        """At 100x the 20s recording spans about 0.2s"""
+        transport = httpx.ASGITransport(app=stub_api([]))
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            results = await replay(traces(1, 3), client, speed=100)
+
+        assert [r.scheduled_s for r in results] == [0.0, 0.1, 0.2]
+        assert max(r.lag_ms for r in results) < 100
+
+    def test_reports_compare_by_turn_and_path(self):
+        """Distributions are split by turn kind and path and compared"""
+        def result(turn: int, latency: float) -> ReplayResult:
+            path = "llm" if turn == 0 else "fast_path"
+            return ReplayResult("a", turn, path, 0.0, 0.0, latency, 200)
+
+        latencies = [900.0, 100.0, 120.0]
+        baseline = {
+            "label": "a",
+            "summary": summarize([result(t, ms) for t, ms in enumerate(latencies)]),
+        }
+        candidate = {
+            "label": "b",
+            "summary": summarize([result(t, ms / 2) for t, ms in enumerate(latencies)]),
+        }
+
+        assert baseline["summary"]["first_turn"]["requests"] == 1
+        assert baseline["summary"]["paths"]["fast_path"]["p50_ms"] == 110.0
+        rows = {(group, metric): change for group, metric, _, _, change in compare(baseline, candidate)}
+        assert rows[("all", "mean_ms")] == -50.0
+        assert rows[("paths.llm", "p99_ms")] == -50.0
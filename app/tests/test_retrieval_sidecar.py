@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+from app.helper.redis_helper import redis_manager
+from app.helper.retrieval_sidecar import RetrievalSidecarClient, RetrievalSidecarServer
+from app.services import chat_service
+
+
+class FakeIndexService:
+    """Stands in for ChromaDBService and records every index call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def query_many(self, queries: list[str], n_results: int = 5) -> list[list[dict]]:
+        self.calls.append(list(queries))
+        return [
+            [{"title": f"{query}-{i}"} for i in range(n_results)] for query in queries
+        ]
+
+
+class TestRetrievalSidecar:
+    """Test the shared retrieval process used in multi-worker deployments"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_are_batched(self, tmp_path):
+        """Concurrent client requests share one index call and get their own rows"""
+        service = FakeIndexService()
+        socket_path = str(tmp_path / "retrieval.sock")
+        server = RetrievalSidecarServer(service, socket_path, batch_window_ms=50)
+        serving = asyncio.create_task(server.serve_forever())
+        await asyncio.sleep(0.05)
+
+        client = RetrievalSidecarClient(socket_path, timeout=5)
+        results = await asyncio.gather(
+            asyncio.to_thread(client.query_similar_rooms, "ویلا", 2),
+            asyncio.to_thread(client.query_similar_rooms, "کلبه", 1),
+        )
+        serving.cancel()
+
+        assert results[0] == [{"title": "ویلا-0"}, {"title": "ویلا-1"}]
+        assert results[1] == [{"title": "کلبه-0"}]
+        assert len(service.calls) == 1
+        assert sorted(service.calls[0]) == sorted(["ویلا", "کلبه"])
+
+    def test_client_degrades_to_empty_results(self, tmp_path):
+        """An unreachable sidecar behaves like a failed local query"""
+        client = RetrievalSidecarClient(str(tmp_path / "missing.sock"), timeout=1)
+
+        assert client.query_many(["ویلا", "کلبه"]) == [[], []]
+
+    @pytest.mark.asyncio
+    async def test_slow_sidecar_does_not_block_the_event_loop(self, monkeypatch):
+        """Searches wait on the sidecar in a thread, so they overlap"""
+
+        class SlowSidecar:
+            def query_similar_rooms(self, query, n_results=5):
+                time.sleep(0.2)
+                return []
+
+        async def unreachable():
+            raise ConnectionError("no redis in this test")
+
+        monkeypatch.setattr(chat_service, "chroma_db_service", SlowSidecar())
+        monkeypatch.setattr(redis_manager, "get_client", unreachable)
+        started = time.perf_counter()
+
+        await asyncio.gather(
+            chat_service.search_rooms("s1", "ویلا"),
+            chat_service.search_rooms("s2", "کلبه"),
+        )
+
+        assert time.perf_counter() - started < 0.35
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+import warmup_db
+from app.helper import chromadb_helper
+from app.helper.chromadb_helper import EmbeddingCache, ShardedChromaDBService
+from app.helper.index_registry import IndexRegistry, shard_root
+
+
+class FakeShard:
+    """Stands in for one shard's ChromaDBService and records its queries"""
+
+    def __init__(self, searched: list, rooms: dict, registry: IndexRegistry):
+        self.name = os.path.basename(registry.root)
+        self.searched = searched
+        self.rooms = rooms
+        self.listings = None
+
+    def query_many(self, queries, n_results, fields, embeddings):
+        self.searched.append(self.name)
+        return [self.rooms.get(self.name, []) for _ in queries]
+
+
+def build(root: str, *names: str) -> None:
+    for name in names:
+        registry = IndexRegistry(shard_root(name, root))
+        version, _ = registry.new_version()
+        registry.activate(version)
+
+
+def room(room_id: str, score: float) -> dict:
+    return {"id": room_id, "similarity_score": score}
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """Sharded index over tmp_path; shards are fakes sharing one log"""
+    searched, rooms = [], {}
+    monkeypatch.setattr(
+        chromadb_helper,
+        "ChromaDBService",
+        lambda registry, embedding_function: FakeShard(searched, rooms, registry),
+    )
+
+    def open_index() -> ShardedChromaDBService:
+        return ShardedChromaDBService(
+            embedding_function=lambda queries: [[0.0] for _ in queries],
+            embeddings=EmbeddingCache(max_entries=0),
+            root=str(tmp_path),
+        )
+
+    return open_index, str(tmp_path), searched, rooms
+
+
+class TestShardedIndex:
+    """Test routing of queries to province shards"""
+
+    def test_region_searches_all_its_provinces(self, index):
+        """"شمال" is three provinces, not Mazandaran alone"""
+        open_index, root, searched, _ = index
+        build(root, "mazandaran", "gilan", "golestan", "other")
+
+        open_index().query_similar_rooms("ویلا در شمال")
+
+        assert sorted(searched) == ["gilan", "golestan", "mazandaran"]
+
+    def test_province_searches_its_shard_only(self, index):
+        open_index, root, searched, _ = index
+        build(root, "mazandaran", "gilan", "golestan")
+
+        open_index().query_similar_rooms("ویلا در رامسر")
+
+        assert searched == ["mazandaran"]
+
+    def test_partial_build_keeps_the_unsharded_index(self, index):
+        """Provinces without a shard are still found through "all\""""
+        open_index, root, searched, rooms = index
+        build(root, "mazandaran")
+        rooms["mazandaran"] = [room("jajiga_1", 0.9)]
+        rooms[os.path.basename(root)] = [room("jajiga_1", 0.9), room("jajiga_2", 0.8)]
+        sharded = open_index()
+
+        assert sorted(sharded.shards) == ["all", "mazandaran"]
+        assert sharded.route("ویلا در رامسر") == ["mazandaran"]
+        assert sorted(sharded.route("ویلا در رشت")) == ["all", "mazandaran"]
+        results = sharded.query_similar_rooms("ویلا در شمال")
+        assert [r["id"] for r in results] == ["jajiga_1", "jajiga_2"]
+
+    def test_unsharded_index_is_dropped_once_every_province_is_built(self, index):
+        open_index, root, _, _ = index
+        build(root, "mazandaran", "gilan", "golestan")
+
+        assert sorted(open_index().shards) == ["gilan", "golestan", "mazandaran"]
+
+    def test_shard_build_caps_after_filtering(self):
+        """A province listed late in the input still gets its listings built"""
+        records = [
+            {"id": f"shab_{i}", "site": "shab", "location_id": "گیلان", "province": "gilan"}
+            for i in range(250)
+        ] + [
+            {"id": f"jajiga_{i}", "site": "jajiga", "location_id": None, "province": "golestan"}
+            for i in range(5)
+        ]
+
+        selected = warmup_db.select_records(records, "golestan", limit=200)
+        every_shard = warmup_db.select_records(records, limit=200)
+
+        assert [r["id"] for r in selected] == [f"jajiga_{i}" for i in range(5)]
+        assert sum(r["province"] == "gilan" for r in every_shard) == 200
+        assert sum(r["province"] == "golestan" for r in every_shard) == 5
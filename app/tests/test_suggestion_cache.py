@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from app.helper.openai_helper import OpenAIMessage, OpendAIRole
+from app.helper.redis_helper import redis_manager
+from app.services import chat_service
+from app.services.suggestion_cache import SuggestionCache
+
+
+class MemoryRedis:
+    """The few Redis commands the suggestion cache uses, kept in a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, seconds, value):
+        self.data[key] = value
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Suggestion cache over an in-memory Redis"""
+    client = MemoryRedis()
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(redis_manager, "get_client", get_client)
+    return SuggestionCache(fresh_seconds=60, stale_seconds=600)
+
+
+class SlowSearch:
+    """Counts web searches and returns a numbered result"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return [{"title": f"result {self.calls}"}]
+
+
+class TestSuggestionCache:
+    """Test the stale-while-revalidate cache of web-search suggestions"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_search(self, cache):
+        """Requests for the same destination during a miss wait on one search"""
+        search = SlowSearch()
+
+        results = await asyncio.gather(
+            *(cache.get_or_fetch("dest:ramsar", search) for _ in range(5))
+        )
+
+        assert search.calls == 1
+        assert all(places == [{"title": "result 1"}] for places in results)
+
+    @pytest.mark.asyncio
+    async def test_fresh_entries_skip_the_search(self, cache):
+        """A fresh entry is served without searching again"""
+        search = SlowSearch()
+        await cache.get_or_fetch("dest:ramsar", search)
+
+        assert await cache.get_or_fetch("dest:ramsar", search) == [{"title": "result 1"}]
+        assert search.calls == 1
+        assert cache.snapshot()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_and_refreshed(self, cache):
+        """A stale entry is returned at once and replaced in the background"""
+        search = SlowSearch()
+        await cache.get_or_fetch("dest:ramsar", search)
+        cache.fresh_seconds = 0
+
+        assert await cache.get_or_fetch("dest:ramsar", search) == [{"title": "result 1"}]
+        await asyncio.gather(*cache._refreshing.values())
+
+        assert search.calls == 2
+        assert (await cache.get("dest:ramsar"))[0] == [{"title": "result 2"}]
+
+    @pytest.mark.asyncio
+    async def test_only_destination_prompts_drop_the_conversation(self, cache, monkeypatch):
+        """A prompt naming no destination is answered uncached, with its history"""
+        history = [OpenAIMessage(role=OpendAIRole.USER, content="سفر خانوادگی داریم")]
+        sent = []
+
+        async def get_session_messages(session_id):
+            return history
+
+        async def save_session_messages(session_id, messages):
+            pass
+
+        async def send_chat_completion(messages, response_format, tools=None):
+            sent.append(messages)
+            return chat_service.SuggestionPlaces(places=[])
+
+        async def filter_places(places):
+            return places
+
+        monkeypatch.setattr(chat_service, "suggestion_cache", cache)
+        monkeypatch.setattr(chat_service, "SUGGESTION_CACHE_ENABLED", True)
+        monkeypatch.setattr(
+            chat_service.chat_manager, "get_session_messages", get_session_messages
+        )
+        monkeypatch.setattr(
+            chat_service.chat_manager, "save_session_messages", save_session_messages
+        )
+        monkeypatch.setattr(
+            chat_service.openapi_service, "send_chat_completion", send_chat_completion
+        )
+        monkeypatch.setattr(chat_service.link_checker, "filter_places", filter_places)
+
+        await chat_service.get_suggestion_places("برای تعطیلات چه پیشنهادی داری؟", "s1")
+        await chat_service.get_suggestion_places("ویلا در رامسر", "s1")
+
+        assert history[0] in sent[0]
+        assert history[0] not in sent[1]
+        assert cache.snapshot()["misses"] == 1
@@ -0,0 +1,327 @@
+"""
+Grid benchmark of HNSW parameters for the room index.
+
+Builds the collection from a fixed corpus for every grid point (Chroma
+fixes search_ef at creation too), then measures recall@k against exact
+brute-force neighbours and per-query latency on a stored query set.
+
+    # Freeze a corpus and query set from a built index version
+    python -m benchmarks.hnsw_benchmark export \\
+        --index chroma_db/shards/gilan/versions/<version> --query-texts queries.txt
+
+    # Run the grid and write hnsw_report.md / hnsw_report.json
+    python -m benchmarks.hnsw_benchmark run --m 16,32 --search-ef 20,50,100
+
+The chosen values are pinned with the HNSW_* settings (app/helper/hnsw_config.py).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from app.helper.hnsw_config import hnsw_configuration
+
+BUILD_BATCH_SIZE = 1000
+WARMUP_QUERIES = 20
+
+
+@dataclass(slots=True, frozen=True)
+class GridResult:
+    space: str
+    m: int
+    construction_ef: int
+    search_ef: int
+    recall: float
+    p50_ms: float
+    p99_ms: float
+    build_seconds: float
+    index_mb: float
+
+
+def load_vectors(path: str) -> tuple[list[str], np.ndarray]:
+    data = np.load(path, allow_pickle=False)
+    return [str(i) for i in data["ids"]], data["embeddings"].astype(np.float32)
+
+
+def save_vectors(path: str, ids: list[str], embeddings) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(
+        path, ids=np.asarray(ids), embeddings=np.asarray(embeddings, dtype=np.float32)
+    )
+
+
+def exact_neighbours(
+    corpus: np.ndarray, queries: np.ndarray, k: int, space: str
+) -> np.ndarray:
+    """Indices of the k exact nearest corpus vectors of each query"""
+    if space == "cosine":
+        corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        distances = -queries @ corpus.T
+    elif space == "ip":
+        distances = -queries @ corpus.T
+    else:
+        distances = (
+            (queries**2).sum(axis=1)[:, None]
+            - 2 * queries @ corpus.T
+            + (corpus**2).sum(axis=1)[None, :]
+        )
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(found: list[list[str]], expected: list[list[str]]) -> float:
+    """Mean fraction of the exact top-k found by the index"""
+    hits = [
+        len(set(f) & set(e)) / len(e) for f, e in zip(found, expected, strict=True) if e
+    ]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def build_collection(
+    path: str, ids: list[str], corpus: np.ndarray, configuration: dict
+):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection(
+        name="room_embeddings", configuration=configuration, embedding_function=None
+    )
+    for start in range(0, len(ids), BUILD_BATCH_SIZE):
+        collection.add(
+            ids=ids[start : start + BUILD_BATCH_SIZE],
+            embeddings=corpus[start : start + BUILD_BATCH_SIZE],
+        )
+    return collection
+
+
+def time_queries(
+    collection, queries: np.ndarray, k: int
+) -> tuple[list[list[str]], np.ndarray]:
+    """Run queries one at a time, as the API does; return hits and latencies in ms"""
+    for query in queries[:WARMUP_QUERIES]:
+        collection.query(query_embeddings=[query], n_results=k, include=[])
+    found, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=k, include=[])
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append(result["ids"][0])
+    return found, np.asarray(latencies)
+
+
+def run_grid(
+    ids: list[str],
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    spaces: list[str],
+    ms: list[int],
+    construction_efs: list[int],
+    search_efs: list[int],
+    k: int,
+) -> list[GridResult]:
+    results = []
+    for space in spaces:
+        truth = exact_neighbours(corpus, queries, k, space)
+        expected = [[ids[i] for i in row] for row in truth]
+        grid = itertools.product(ms, construction_efs, search_efs)
+        for m, construction_ef, search_ef in grid:
+            path = tempfile.mkdtemp(prefix="hnsw-bench-")
+            try:
+                started = time.perf_counter()
+                collection = build_collection(
+                    path,
+                    ids,
+                    corpus,
+                    hnsw_configuration(space, m, construction_ef, search_ef),
+                )
+                build_seconds = time.perf_counter() - started
+                found, latencies = time_queries(collection, queries, k)
+                result = GridResult(
+                    space=space,
+                    m=m,
+                    construction_ef=construction_ef,
+                    search_ef=search_ef,
+                    recall=recall_at_k(found, expected),
+                    p50_ms=float(np.percentile(latencies, 50)),
+                    p99_ms=float(np.percentile(latencies, 99)),
+                    build_seconds=build_seconds,
+                    index_mb=directory_size(path) / 1e6,
+                )
+                print(
+                    f"{space:6} M={m:<3} ef_c={construction_ef:<4} ef_s={search_ef:<4} "
+                    f"recall@{k}={result.recall:.3f} p50={result.p50_ms:.2f}ms "
+                    f"p99={result.p99_ms:.2f}ms"
+                )
+                results.append(result)
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+    return results
+
+
+def recommend(results: list[GridResult], min_recall: float) -> GridResult | None:
+    """Lowest p99 configuration that reaches min_recall"""
+    eligible = [r for r in results if r.recall >= min_recall]
+    return min(eligible, key=lambda r: (r.p99_ms, r.p50_ms), default=None)
+
+
+def render_report(
+    results: list[GridResult],
+    k: int,
+    min_recall: float,
+    corpus_size: int,
+    query_count: int,
+) -> str:
+    lines = [
+        "# HNSW benchmark",
+        "",
+        f"Corpus: {corpus_size} vectors, {query_count} queries, k={k}",
+        "",
+        f"| space | M | construction_ef | search_ef | recall@{k} | p50 ms | p99 ms | build s | index MB |",
+        "|---|---|---|---|---|---|---|---|---|",
+    ]
+    for r in sorted(
+        results, key=lambda r: (r.space, r.m, r.construction_ef, r.search_ef)
+    ):
+        lines.append(
+            f"| {r.space} | {r.m} | {r.construction_ef} | {r.search_ef} | {r.recall:.3f} "
+            f"| {r.p50_ms:.2f} | {r.p99_ms:.2f} | {r.build_seconds:.1f} | {r.index_mb:.1f} |"
+        )
+    best = recommend(results, min_recall)
+    lines.append("")
+    if best is None:
+        lines.append(f"No configuration reached recall@{k} >= {min_recall}.")
+    else:
+        lines += [
+            f"Fastest configuration with recall@{k} >= {min_recall}:",
+            "",
+            "```",
+            f"HNSW_SPACE={best.space}",
+            f"HNSW_M={best.m}",
+            f"HNSW_CONSTRUCTION_EF={best.construction_ef}",
+            f"HNSW_SEARCH_EF={best.search_ef}",
+            "```",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def export(
+    index_path: str,
+    corpus_path: str,
+    queries_path: str,
+    query_texts: str | None,
+    holdout: int,
+):
+    """Freeze the corpus of an index and a query set for repeatable runs"""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=index_path).get_collection(
+        "room_embeddings"
+    )
+    stored = collection.get(include=["embeddings"])
+    ids, embeddings = stored["ids"], np.asarray(stored["embeddings"], dtype=np.float32)
+
+    if query_texts:
+        from app.helper.chromadb_helper import get_embedding_function
+
+        with open(query_texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        query_ids, queries = texts, get_embedding_function()(texts)
+    else:
+        # Stored vectors held out of the corpus stand in for real queries
+        rng = np.random.default_rng(0)
+        held = set(
+            rng.choice(
+                len(ids), size=min(holdout, len(ids) // 2), replace=False
+            ).tolist()
+        )
+        query_ids = [ids[i] for i in sorted(held)]
+        queries = embeddings[sorted(held)]
+        keep = [i for i in range(len(ids)) if i not in held]
+        ids, embeddings = [ids[i] for i in keep], embeddings[keep]
+
+    save_vectors(corpus_path, ids, embeddings)
+    save_vectors(queries_path, query_ids, queries)
+    print(
+        f"Saved {len(ids)} corpus vectors to {corpus_path} and {len(query_ids)} queries to {queries_path}"
+    )
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark HNSW parameters of the room index"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Freeze a corpus and query set")
+    export_parser.add_argument(
+        "--index", required=True, help="Chroma directory to read vectors from"
+    )
+    export_parser.add_argument("--corpus", default="benchmarks/corpus.npz")
+    export_parser.add_argument("--queries", default="benchmarks/queries.npz")
+    export_parser.add_argument(
+        "--query-texts", help="File of real queries, one per line, to embed"
+    )
+    export_parser.add_argument(
+        "--holdout",
+        type=int,
+        default=200,
+        help="Held-out queries without --query-texts",
+    )
+
+    run_parser = commands.add_parser("run", help="Run the parameter grid")
+    run_parser.add_argument("--corpus", default="benchmarks/corpus.npz")
+    run_parser.add_argument("--queries", default="benchmarks/queries.npz")
+    run_parser.add_argument("--space", default="l2,cosine")
+    run_parser.add_argument("--m", default="16,32,48")
+    run_parser.add_argument("--construction-ef", default="100,200")
+    run_parser.add_argument("--search-ef", default="10,25,50,100,200")
+    run_parser.add_argument("--k", type=int, default=10)
+    run_parser.add_argument("--min-recall", type=float, default=0.95)
+    run_parser.add_argument("--report", default="hnsw_report.md")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.index, args.corpus, args.queries, args.query_texts, args.holdout)
+    else:
+        ids, corpus = load_vectors(args.corpus)
+        _, queries = load_vectors(args.queries)
+        results = run_grid(
+            ids,
+            corpus,
+            queries,
+            args.space.split(","),
+            _ints(args.m),
+            _ints(args.construction_ef),
+            _ints(args.search_ef),
+            args.k,
+        )
+        report = render_report(results, args.k, args.min_recall, len(ids), len(queries))
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(report)
+        with open(
+            os.path.splitext(args.report)[0] + ".json", "w", encoding="utf-8"
+        ) as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+        print(report)
@@ -0,0 +1,335 @@
+"""
+Replay of captured /user-prompt traffic (app/helper/trace_helper.py).
+
+Requests are re-sent at the pace they were recorded, sped up by --speed
+(0 sends each as soon as the previous turn of its session has answered).
+Turns of a session go out in order, one at a time, on the live session the
+server created for the first turn, so follow-ups see real history. The
+report gives latency percentiles overall, for first turns versus follow-ups
+and per recorded path.
+
+Against a running build:
+
+    python -m benchmarks.replay run --log traces/requests.jsonl \\
+        --base-url http://localhost:8000 --speed 2 --label main --output main.json
+
+In-process with stubbed backends: OpenAI and the vector index answer after
+the latencies recorded in the log, so only this build's own overhead is
+measured. Redis is still used, from REDIS_URL:
+
+    python -m benchmarks.replay run --log traces/requests.jsonl --stub \\
+        --speed 0 --label branch --output branch.json
+
+Compare two runs:
+
+    python -m benchmarks.replay compare main.json branch.json
+
+The server's rate limits apply to a replay against a running build; raise
+them there or replay with --stub, which turns them off.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+REQUEST_TIMEOUT = 120.0
+
+
+@dataclass(slots=True, frozen=True)
+class ReplayResult:
+    session: str
+    turn: int
+    path: str
+    scheduled_s: float
+    # How late the request went out, waiting on its session's previous turn
+    lag_ms: float
+    latency_ms: float
+    status: int
+
+
+def load_traces(path: str, limit: int | None = None) -> list[dict]:
+    """Traces of the log in recorded order, skipping unreadable lines"""
+    traces = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                traces.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    traces.sort(key=lambda trace: trace["ts"])
+    return traces[:limit] if limit else traces
+
+
+async def _replay_session(
+    client: httpx.AsyncClient,
+    turns: list[dict],
+    first_ts: float,
+    started: float,
+    speed: float,
+    results: list[ReplayResult],
+) -> None:
+    session_id = ""
+    for trace in turns:
+        offset = trace["ts"] - first_ts
+        due = started + offset / speed if speed else time.perf_counter()
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        sent = time.perf_counter()
+        try:
+            response = await client.get(
+                "/user-prompt", params={"prompt": trace["prompt"], "session_id": session_id}
+            )
+            status = response.status_code
+            if response.is_success:
+                session_id = response.json().get("session_id", session_id)
+        except httpx.HTTPError:
+            status = 0
+        results.append(
+            ReplayResult(
+                session=trace["session"],
+                turn=trace.get("turn", 0),
+                path=trace.get("path", ""),
+                scheduled_s=round(offset / speed if speed else 0.0, 3),
+                lag_ms=round(max(sent - due, 0) * 1000, 2),
+                latency_ms=round((time.perf_counter() - sent) * 1000, 2),
+                status=status,
+            )
+        )
+
+
+async def replay(
+    traces: list[dict], client: httpx.AsyncClient, speed: float = 1.0
+) -> list[ReplayResult]:
+    """Re-send traces through client, keeping each session's turns in order"""
+    if not traces:
+        return []
+    sessions: dict[str, list[dict]] = defaultdict(list)
+    for trace in traces:
+        sessions[trace["session"]].append(trace)
+    results: list[ReplayResult] = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _replay_session(client, turns, traces[0]["ts"], started, speed, results)
+            for turns in sessions.values()
+        )
+    )
+    return results
+
+
+def _distribution(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"requests": 0}
+    values = np.asarray(latencies)
+    return {
+        "requests": len(latencies),
+        "mean_ms": round(float(values.mean()), 2),
+        **{
+            f"p{p}_ms": round(float(np.percentile(values, p)), 2)
+            for p in PERCENTILES
+        },
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def summarize(results: list[ReplayResult]) -> dict:
+    """Latency distributions overall, by turn kind and by recorded path"""
+    ok = [r for r in results if 200 <= r.status < 300]
+    by_path = defaultdict(list)
+    for r in ok:
+        by_path[r.path or "unknown"].append(r.latency_ms)
+    return {
+        "errors": len(results) - len(ok),
+        "all": _distribution([r.latency_ms for r in ok]),
+        "first_turn": _distribution([r.latency_ms for r in ok if r.turn == 0]),
+        "follow_up": _distribution([r.latency_ms for r in ok if r.turn > 0]),
+        "paths": {path: _distribution(values) for path, values in sorted(by_path.items())},
+        "max_lag_ms": max((r.lag_ms for r in results), default=0.0),
+    }
+
+
+def compare(baseline: dict, candidate: dict) -> list[tuple[str, str, float, float, float]]:
+    """(group, metric, baseline, candidate, change %) for every shared metric"""
+    rows = []
+    groups = ["all", "first_turn", "follow_up"] + [
+        f"paths.{path}" for path in baseline["summary"]["paths"]
+    ]
+    for group in groups:
+        a, b = baseline["summary"], candidate["summary"]
+        for part in group.split("."):
+            a, b = a.get(part, {}), b.get(part, {})
+        for metric in ["mean_ms"] + [f"p{p}_ms" for p in PERCENTILES]:
+            if metric in a and metric in b:
+                change = (b[metric] - a[metric]) / a[metric] * 100 if a[metric] else 0.0
+                rows.append((group, metric, a[metric], b[metric], round(change, 1)))
+    return rows
+
+
+@contextmanager
+def stub_backends(traces: list[dict]):
+    """
+    Patch OpenAI and the vector index to answer like the recorded requests
+    did: the same tool calls and token counts after the same latencies
+    """
+    from app import main
+    from app.helper.chromadb_helper import chroma_db_service
+    from app.helper.openai_helper import openapi_service
+
+    by_prompt = {trace["prompt"]: trace for trace in traces}
+    retrieval = [t["stages"]["retrieval"] for t in traces if "retrieval" in t.get("stages", {})]
+    retrieval_s = float(np.median(retrieval)) / 1000 if retrieval else 0.0
+
+    async def chat_completions_create(messages, tools=None):
+        trace = by_prompt.get(messages[-1].content, {})
+        await asyncio.sleep(trace.get("stages", {}).get("llm", 0.0) / 1000)
+        tool_calls = [
+            SimpleNamespace(
+                function=SimpleNamespace(
+                    name=call["name"], arguments=json.dumps({"query": call["query"]})
+                )
+            )
+            for call in trace.get("tool_calls", [])
+        ]
+        tokens = trace.get("tokens", {})
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(
+                        tool_calls=tool_calls or None,
+                        content=None if tool_calls else "پاسخ آزمایشی",
+                    )
+                )
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=tokens.get("prompt", 0),
+                completion_tokens=tokens.get("completion", 0),
+            ),
+        )
+
+    def rooms(n: int) -> list[dict]:
+        # Blocks its thread like the real index call
+        time.sleep(retrieval_s)
+        return [
+            {
+                "id": f"stub_{i}",
+                "title": f"اقامتگاه {i}",
+                "price": "1000000",
+                "web_url": "",
+                "image_url": None,
+                "similarity_score": 1 - i / 100,
+            }
+            for i in range(n)
+        ]
+
+    with ExitStack() as stack:
+        stack.enter_context(
+            mock.patch.object(openapi_service, "chat_completions_create", chat_completions_create)
+        )
+        stack.enter_context(
+            mock.patch.object(
+                chroma_db_service,
+                "query_similar_rooms",
+                lambda query, n_results=5, **kwargs: rooms(n_results),
+            )
+        )
+        stack.enter_context(
+            mock.patch.object(
+                chroma_db_service,
+                "get_rooms",
+                lambda ids, scores=None, **kwargs: rooms(len(ids)),
+            )
+        )
+        stack.enter_context(mock.patch.object(main, "RATE_LIMIT_ENABLED", False))
+        yield main.app
+
+
+async def run(args) -> dict:
+    traces = load_traces(args.log, args.limit)
+    print(f"Replaying {len(traces)} requests at {args.speed or 'max'}x speed")
+    if args.stub:
+        with stub_backends(traces) as app:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://replay",
+                timeout=REQUEST_TIMEOUT,
+            ) as client:
+                results = await replay(traces, client, args.speed)
+    else:
+        async with httpx.AsyncClient(
+            base_url=args.base_url,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=None),
+        ) as client:
+            results = await replay(traces, client, args.speed)
+    return {
+        "label": args.label,
+        "log": args.log,
+        "speed": args.speed,
+        "stub": args.stub,
+        "summary": summarize(results),
+        "results": [asdict(result) for result in results],
+    }
+
+
+def print_summary(report: dict) -> None:
+    summary = report["summary"]
+    print(f"{report['label']}: {summary['errors']} errors, max lag {summary['max_lag_ms']} ms")
+    groups = {
+        "all": summary["all"],
+        "first_turn": summary["first_turn"],
+        "follow_up": summary["follow_up"],
+        **summary["paths"],
+    }
+    for name, stats in groups.items():
+        if stats["requests"]:
+            print(
+                f"  {name:<16} n={stats['requests']:<6} mean={stats['mean_ms']:>9} "
+                + " ".join(f"p{p}={stats[f'p{p}_ms']:>9}" for p in PERCENTILES)
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured /user-prompt traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Replay a trace log and report latencies")
+    run_parser.add_argument("--log", default="traces/requests.jsonl")
+    run_parser.add_argument("--base-url", default="http://localhost:8000")
+    run_parser.add_argument(
+        "--speed", type=float, default=1.0, help="Pace multiplier, 0 for no pacing"
+    )
+    run_parser.add_argument("--stub", action="store_true", help="In-process app, stub backends")
+    run_parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    run_parser.add_argument("--label", default="replay")
+    run_parser.add_argument("--output", default="replay_report.json")
+
+    compare_parser = commands.add_parser("compare", help="Compare two replay reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = asyncio.run(run(args))
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print_summary(report)
+        print(f"✅ Report written to {args.output}")
+    else:
+        reports = []
+        for path in (args.baseline, args.candidate):
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        baseline, candidate = reports
+        labels = f"{baseline['label']:>12} {candidate['label']:>12}"
+        print(f"{'group':<24} {'metric':<8} {labels}  change")
+        for group, metric, a, b, change in compare(baseline, candidate):
+            print(f"{group:<24} {metric:<8} {a:>12} {b:>12}  {change:+.1f}%")
@@ -0,0 +1 @@
+# Crawlers and parse stages for listing sites
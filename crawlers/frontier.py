@@ -0,0 +1,497 @@
+"""
+Redis-backed crawl frontier shared by any number of crawler workers.
+
+Work items (search pages and detail pages) wait in a ZSET scored by the
+time they become due. A worker claims one with a lease: the item moves to
+a leases ZSET scored by its expiry and is requeued by the next claim once
+that passes, so a crashed worker never loses work. An expired lease counts
+as a failed attempt, so an item that keeps crashing its worker still ends
+up with the dead items after max_attempts. Acknowledging or
+failing an item needs the lease token, so a worker whose lease expired
+can't complete an item someone else has since claimed.
+
+Items are deduplicated per site (room IDs for detail pages) when pushed,
+and politeness is global: a claim only hands out an item whose host has
+not been hit within its delay by any worker. Claiming, acking and failing
+are Lua scripts, so the checks and moves are atomic across nodes and use
+the Redis clock rather than each node's own. Every key a script touches is
+passed in KEYS, so they also run on Redis Cluster once the frontier name
+is a hash tag (e.g. "{crawl}").
+
+LocalFrontier keeps the same queue in process memory, for single-node
+crawls that shouldn't need a Redis server.
+"""
+
+import heapq
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import redis
+
+from app.settings import CRAWL_HOST_DELAY, CRAWL_LEASE_SECONDS, CRAWL_MAX_ATTEMPTS
+
+# Due items looked at per claim while searching for a host that may be hit
+CLAIM_SCAN = 100
+
+_NOW = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+"""
+
+# KEYS: ready, leases, owners, items, attempts, host delays, host next allowed, dead
+# ARGV: token, lease ms, default host delay ms, scan size, max attempts
+CLAIM_SCRIPT = (
+    _NOW
+    + """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('HDEL', KEYS[3], id)
+    local attempts = redis.call('HINCRBY', KEYS[5], id, 1)
+    if attempts >= tonumber(ARGV[5]) then
+        local raw = redis.call('HGET', KEYS[4], id)
+        redis.call('HSET', KEYS[8], id, cjson.encode({item = raw, reason = 'lease expired'}))
+        redis.call('HDEL', KEYS[4], id)
+        redis.call('HDEL', KEYS[5], id)
+    else
+        redis.call('ZADD', KEYS[1], now, id)
+    end
+end
+
+local wait = -1
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[4]))
+for _, id in ipairs(due) do
+    local raw = redis.call('HGET', KEYS[4], id)
+    if not raw then
+        redis.call('ZREM', KEYS[1], id)
+    else
+        local host = cjson.decode(raw)['host']
+        local allowed = tonumber(redis.call('HGET', KEYS[7], host) or '0')
+        if allowed <= now then
+            local delay = tonumber(redis.call('HGET', KEYS[6], host) or ARGV[3])
+            redis.call('HSET', KEYS[7], host, now + delay)
+            redis.call('ZREM', KEYS[1], id)
+            redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), id)
+            redis.call('HSET', KEYS[3], id, ARGV[1])
+            return {raw, tonumber(redis.call('HGET', KEYS[5], id) or '0'), 0}
+        end
+        if wait < 0 or allowed - now < wait then
+            wait = allowed - now
+        end
+    end
+end
+
+if wait < 0 then
+    local next_due = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if next_due[2] then
+        wait = math.max(tonumber(next_due[2]) - now, 0)
+    end
+end
+return {'', 0, wait}
+"""
+)
+
+# KEYS: leases, owners, items, attempts
+# ARGV: item id, token
+ACK_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+return 1
+"""
+
+# KEYS: ready, leases, owners, items, attempts, dead
+# ARGV: item id, token, retry delay ms, max attempts, reason
+FAIL_SCRIPT = (
+    _NOW
+    + """
+if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[2] then
+    return -1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+local attempts = redis.call('HINCRBY', KEYS[5], ARGV[1], 1)
+if attempts >= tonumber(ARGV[4]) then
+    local raw = redis.call('HGET', KEYS[4], ARGV[1])
+    redis.call('HSET', KEYS[6], ARGV[1], cjson.encode({item = raw, reason = ARGV[5]}))
+    redis.call('HDEL', KEYS[4], ARGV[1])
+    redis.call('HDEL', KEYS[5], ARGV[1])
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return attempts
+"""
+)
+
+# KEYS: ready, items, seen
+# ARGV: (id, item json) pairs
+PUSH_SCRIPT = (
+    _NOW
+    + """
+local added = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('SADD', KEYS[3], ARGV[i]) == 1 then
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+        redis.call('ZADD', KEYS[1], now, ARGV[i])
+        added = added + 1
+    end
+end
+return added
+"""
+)
+
+# KEYS: host next allowed
+# ARGV: host, seconds to keep it untouched
+BACK_OFF_SCRIPT = (
+    _NOW
+    + """
+local until_ms = now + tonumber(ARGV[2]) * 1000
+local allowed = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if until_ms > allowed then
+    redis.call('HSET', KEYS[1], ARGV[1], until_ms)
+end
+return 1
+"""
+)
+
+
+@dataclass(slots=True, frozen=True)
+class WorkItem:
+    """A page to fetch: a search results page or a room detail page"""
+
+    site: str
+    kind: str
+    key: str
+    url: str
+    meta: dict = field(default_factory=dict)
+
+    @property
+    def id(self) -> str:
+        """Frontier-wide ID; detail items are keyed by room ID"""
+        return f"{self.site}:{self.kind}:{self.key}"
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "site": self.site,
+                "kind": self.kind,
+                "key": self.key,
+                "url": self.url,
+                "host": self.host,
+                "meta": self.meta,
+            },
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, raw: str) -> "WorkItem":
+        data = json.loads(raw)
+        return cls(data["site"], data["kind"], data["key"], data["url"], data["meta"])
+
+
+@dataclass(slots=True, frozen=True)
+class Lease:
+    """A claimed work item; ack or fail it with this token before it expires"""
+
+    item: WorkItem
+    token: str
+    attempts: int
+
+
+class CrawlFrontier:
+    """Shared queue of crawl work items with leases, dedup and politeness"""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        name: str = "crawl",
+        lease_seconds: float = CRAWL_LEASE_SECONDS,
+        host_delay: float = CRAWL_HOST_DELAY,
+        max_attempts: int = CRAWL_MAX_ATTEMPTS,
+    ):
+        self.client = client
+        self.prefix = f"{name}:"
+        self.ready_key = f"{self.prefix}ready"
+        self.leases_key = f"{self.prefix}leases"
+        self.owners_key = f"{self.prefix}owners"
+        self.items_key = f"{self.prefix}items"
+        self.attempts_key = f"{self.prefix}attempts"
+        self.dead_key = f"{self.prefix}dead"
+        self.host_delays_key = f"{self.prefix}host_delays"
+        # Host -> epoch ms before which no worker may request it
+        self.hosts_key = f"{self.prefix}hosts"
+        # Item IDs ever pushed; IDs start with the site, so dedup is per site
+        self.seen_key = f"{self.prefix}seen"
+        self.lease_seconds = lease_seconds
+        self.host_delay = host_delay
+        self.max_attempts = max_attempts
+        self._claim = client.register_script(CLAIM_SCRIPT)
+        self._ack = client.register_script(ACK_SCRIPT)
+        self._fail = client.register_script(FAIL_SCRIPT)
+        self._push = client.register_script(PUSH_SCRIPT)
+        self._back_off = client.register_script(BACK_OFF_SCRIPT)
+
+    def push(self, items: list[WorkItem]) -> int:
+        """Queue items not seen before (per-site sets); returns how many were new"""
+        if not items:
+            return 0
+        args = []
+        for item in items:
+            args += [item.id, item.to_json()]
+        return self._push(keys=[self.ready_key, self.items_key, self.seen_key], args=args)
+
+    def set_host_delay(self, host: str, seconds: float) -> None:
+        """Override the politeness delay of one host"""
+        self.client.hset(self.host_delays_key, host, int(seconds * 1000))
+
+    def back_off_host(self, host: str, seconds: float) -> None:
+        """Keep every worker off a host for a while, e.g. after a 429"""
+        self._back_off(keys=[self.hosts_key], args=[host, seconds])
+
+    def claim(self, token: str) -> tuple[Lease | None, float]:
+        """
+        Lease the next due item whose host may be hit now. Without one,
+        returns how long to wait before trying again (None if nothing is queued).
+        """
+        raw, attempts, wait_ms = self._claim(
+            keys=[
+                self.ready_key,
+                self.leases_key,
+                self.owners_key,
+                self.items_key,
+                self.attempts_key,
+                self.host_delays_key,
+                self.hosts_key,
+                self.dead_key,
+            ],
+            args=[
+                token,
+                int(self.lease_seconds * 1000),
+                int(self.host_delay * 1000),
+                CLAIM_SCAN,
+                self.max_attempts,
+            ],
+        )
+        if raw:
+            return Lease(WorkItem.from_json(raw), token, attempts), 0.0
+        return None, (wait_ms / 1000 if wait_ms >= 0 else None)
+
+    def ack(self, lease: Lease) -> bool:
+        """Mark a leased item done; False if the lease had already expired"""
+        return bool(
+            self._ack(
+                keys=[
+                    self.leases_key,
+                    self.owners_key,
+                    self.items_key,
+                    self.attempts_key,
+                ],
+                args=[lease.item.id, lease.token],
+            )
+        )
+
+    def fail(self, lease: Lease, retry_after: float, reason: str) -> int:
+        """
+        Requeue a leased item after retry_after seconds, or move it to the
+        dead items once it has failed max_attempts times. Returns the attempt
+        count, 0 if the item is dead and -1 if the lease had already expired.
+        """
+        return self._fail(
+            keys=[
+                self.ready_key,
+                self.leases_key,
+                self.owners_key,
+                self.items_key,
+                self.attempts_key,
+                self.dead_key,
+            ],
+            args=[
+                lease.item.id,
+                lease.token,
+                int(retry_after * 1000),
+                self.max_attempts,
+                reason,
+            ],
+        )
+
+    def pending(self) -> int:
+        """Items queued or leased; zero once the crawl is finished"""
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zcard(self.ready_key)
+        pipeline.zcard(self.leases_key)
+        return sum(pipeline.execute())
+
+    def snapshot(self) -> dict:
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zcard(self.ready_key)
+        pipeline.zcard(self.leases_key)
+        pipeline.hlen(self.dead_key)
+        queued, leased, dead = pipeline.execute()
+        return {"queued": queued, "leased": leased, "dead": dead}
+
+    def dead_items(self) -> dict[str, dict]:
+        return {
+            item_id: json.loads(value)
+            for item_id, value in self.client.hgetall(self.dead_key).items()
+        }
+
+    def clear(self) -> int:
+        """Delete every key of this frontier, including the dedup sets"""
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*", count=1000))
+        return self.client.delete(*keys) if keys else 0
+
+
+class LocalFrontier:
+    """
+    CrawlFrontier kept in process memory, for a crawl run by a single
+    process. Same leases, dedup, politeness and retries; nothing is shared.
+    """
+
+    def __init__(
+        self,
+        lease_seconds: float = CRAWL_LEASE_SECONDS,
+        host_delay: float = CRAWL_HOST_DELAY,
+        max_attempts: int = CRAWL_MAX_ATTEMPTS,
+    ):
+        self.lease_seconds = lease_seconds
+        self.host_delay = host_delay
+        self.max_attempts = max_attempts
+        # Item ID -> monotonic time it is due
+        self.ready: dict[str, float] = {}
+        # Item ID -> (lease expiry, token)
+        self.leases: dict[str, tuple[float, str]] = {}
+        self.items: dict[str, WorkItem] = {}
+        self.attempts: dict[str, int] = {}
+        self.dead: dict[str, dict] = {}
+        self.seen: set[str] = set()
+        self.host_delays: dict[str, float] = {}
+        # Host -> monotonic time before which it may not be requested
+        self.hosts: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def push(self, items: list[WorkItem]) -> int:
+        """Queue items not seen before; returns how many were new"""
+        now = time.monotonic()
+        added = 0
+        with self._lock:
+            for item in items:
+                if item.id in self.seen:
+                    continue
+                self.seen.add(item.id)
+                self.items[item.id] = item
+                self.ready[item.id] = now
+                added += 1
+        return added
+
+    def set_host_delay(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self.host_delays[host] = seconds
+
+    def back_off_host(self, host: str, seconds: float) -> None:
+        with self._lock:
+            until = time.monotonic() + seconds
+            self.hosts[host] = max(self.hosts.get(host, 0.0), until)
+
+    def claim(self, token: str) -> tuple[Lease | None, float]:
+        now = time.monotonic()
+        with self._lock:
+            for item_id, (expiry, _) in list(self.leases.items()):
+                if expiry <= now:
+                    del self.leases[item_id]
+                    self._count_attempt(item_id, now, "lease expired")
+
+            wait = None
+            due = heapq.nsmallest(
+                CLAIM_SCAN,
+                ((at, item_id) for item_id, at in self.ready.items() if at <= now),
+            )
+            for _, item_id in due:
+                item = self.items[item_id]
+                allowed = self.hosts.get(item.host, 0.0)
+                if allowed <= now:
+                    self.hosts[item.host] = now + self.host_delays.get(
+                        item.host, self.host_delay
+                    )
+                    del self.ready[item_id]
+                    self.leases[item_id] = (now + self.lease_seconds, token)
+                    return Lease(item, token, self.attempts.get(item_id, 0)), 0.0
+                wait = allowed - now if wait is None else min(wait, allowed - now)
+
+            if wait is None and self.ready:
+                wait = max(min(self.ready.values()) - now, 0.0)
+            return None, wait
+
+    def _release(self, lease: Lease) -> bool:
+        """Drop a lease if it is still the caller's"""
+        held = self.leases.get(lease.item.id)
+        if held is None or held[1] != lease.token:
+            return False
+        del self.leases[lease.item.id]
+        return True
+
+    def ack(self, lease: Lease) -> bool:
+        with self._lock:
+            if not self._release(lease):
+                return False
+            self.items.pop(lease.item.id, None)
+            self.attempts.pop(lease.item.id, None)
+            return True
+
+    def fail(self, lease: Lease, retry_after: float, reason: str) -> int:
+        item_id = lease.item.id
+        with self._lock:
+            if not self._release(lease):
+                return -1
+            return self._count_attempt(item_id, time.monotonic() + retry_after, reason)
+
+    def _count_attempt(self, item_id: str, retry_at: float, reason: str) -> int:
+        """Requeue a failed item for retry_at, or move it to the dead items"""
+        attempts = self.attempts.get(item_id, 0) + 1
+        if attempts >= self.max_attempts:
+            self.dead[item_id] = {
+                "item": self.items.pop(item_id).to_json(),
+                "reason": reason,
+            }
+            self.attempts.pop(item_id, None)
+            return 0
+        self.attempts[item_id] = attempts
+        self.ready[item_id] = retry_at
+        return attempts
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self.ready) + len(self.leases)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "queued": len(self.ready),
+                "leased": len(self.leases),
+                "dead": len(self.dead),
+            }
+
+    def dead_items(self) -> dict[str, dict]:
+        with self._lock:
+            return dict(self.dead)
+
+    def clear(self) -> int:
+        """Forget every item, including the dedup set; returns how many were held"""
+        with self._lock:
+            held = len(self.items) + len(self.dead)
+            for store in (
+                self.ready, self.leases, self.items, self.attempts,
+                self.dead, self.seen, self.host_delays, self.hosts,
+            ):
+                store.clear()
+            return held
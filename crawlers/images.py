@@ -0,0 +1,229 @@
+"""
+Image stage: fetch listing images, dedupe them by content and store WebP
+thumbnails in the content-addressed image store (app/helper/image_store.py).
+
+Images are downloaded concurrently with a cap per host, hashed, and only
+content not stored yet is resized, in a process pool since Pillow work is
+CPU-bound. The index build (warmup_db.py) runs this stage after the link
+check and indexes the thumbnail URLs instead of the origin URLs; it can also
+be run on its own to fill the store ahead of a build:
+
+    python -m crawlers.images --input jajiga_room_details_parsed.jsonl
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.helper.image_store import ImageStore, image_store
+from app.settings import (
+    IMAGE_FETCH_CONCURRENCY,
+    IMAGE_FETCH_PER_HOST,
+    IMAGE_FETCH_TIMEOUT,
+    IMAGE_MAX_BYTES,
+    IMAGE_THUMBNAIL_QUALITY,
+    IMAGE_THUMBNAIL_SIZE,
+)
+from crawlers.parsers.stage import iter_records
+
+USER_AGENT = "Mozilla/5.0 (compatible; KheshtImageFetcher/1.0)"
+
+
+@dataclass(slots=True)
+class ImageStats:
+    """Counters reported at the end of an image stage"""
+
+    urls: int = 0
+    known: int = 0
+    fetched: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    created: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    seconds: float = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "urls": self.urls,
+            "known": self.known,
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "created": self.created,
+            "avg_original_kb": round(self.bytes_in / max(self.created, 1) / 1000, 1),
+            "avg_thumbnail_kb": round(self.bytes_out / max(self.created, 1) / 1000, 1),
+            "seconds": round(self.seconds, 2),
+        }
+
+
+def make_thumbnail(data: bytes, max_size: int, quality: int) -> bytes:
+    """WebP no larger than max_size on either side; runs in a worker process"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+class ImagePipeline:
+    """Turns image URLs into thumbnail URLs, fetching and resizing only what is new"""
+
+    def __init__(
+        self,
+        store: ImageStore = image_store,
+        concurrency: int = IMAGE_FETCH_CONCURRENCY,
+        per_host: int = IMAGE_FETCH_PER_HOST,
+        timeout: float = IMAGE_FETCH_TIMEOUT,
+        max_bytes: int = IMAGE_MAX_BYTES,
+        max_size: int = IMAGE_THUMBNAIL_SIZE,
+        quality: int = IMAGE_THUMBNAIL_QUALITY,
+        workers: int | None = None,
+    ):
+        self.store = store
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.quality = quality
+        self.workers = workers
+        self.stats = ImageStats()
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._building: dict[str, asyncio.Future] = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str) -> bytes | None:
+        """Image bytes, or None for errors, non-images and oversized files"""
+        async with self._host_limit(url):
+            try:
+                async with client.stream("GET", url) as response:
+                    content_type = response.headers.get("content-type", "")
+                    if not response.is_success or not content_type.startswith("image/"):
+                        return None
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            return None
+                        chunks.append(chunk)
+            except (httpx.HTTPError, ValueError):
+                return None
+        return b"".join(chunks)
+
+    async def _build(self, pool: ProcessPoolExecutor, digest: str, data: bytes) -> None:
+        loop = asyncio.get_running_loop()
+        thumbnail = await loop.run_in_executor(
+            pool, make_thumbnail, data, self.max_size, self.quality
+        )
+        self.store.put(digest, thumbnail)
+        self.stats.created += 1
+        self.stats.bytes_in += len(data)
+        self.stats.bytes_out += len(thumbnail)
+
+    async def _process(
+        self,
+        client: httpx.AsyncClient,
+        pool: ProcessPoolExecutor,
+        url: str,
+        manifest: dict[str, str],
+    ) -> None:
+        data = await self._fetch(client, url)
+        if data is None:
+            self.stats.failed += 1
+            return
+        self.stats.fetched += 1
+        digest = hashlib.sha256(data).hexdigest()
+
+        # The same photo under another URL is resized once, even concurrently
+        building = self._building.get(digest)
+        if building is None and not self.store.has(digest):
+            building = asyncio.ensure_future(self._build(pool, digest, data))
+            self._building[digest] = building
+            building.add_done_callback(lambda _: self._building.pop(digest, None))
+        else:
+            self.stats.duplicates += 1
+        if building is not None:
+            try:
+                await asyncio.shield(building)
+            except Exception as e:
+                print(f"Error creating thumbnail of {url}: {e}")
+                self.stats.failed += 1
+                return
+        manifest[url] = digest
+
+    async def run(self, urls: list[str]) -> dict[str, str]:
+        """Thumbnail URL of every source URL that could be stored"""
+        started = time.perf_counter()
+        urls = list(dict.fromkeys(url for url in urls if url))
+        manifest = self.store.load_manifest()
+        pending = [
+            url for url in urls if url not in manifest or not self.store.has(manifest[url])
+        ]
+        self.stats.urls += len(urls)
+        self.stats.known += len(urls) - len(pending)
+
+        if pending:
+            async with httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=self.concurrency),
+            ) as client:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    await asyncio.gather(
+                        *(self._process(client, pool, url, manifest) for url in pending),
+                        return_exceptions=True,
+                    )
+            self.store.save_manifest(manifest)
+
+        self.stats.seconds += time.perf_counter() - started
+        return {url: self.store.url(manifest[url]) for url in urls if url in manifest}
+
+
+def attach_thumbnails(records: list[dict], pipeline: ImagePipeline | None = None) -> list[dict]:
+    """Replace each listing's images with thumbnails, dropping ones that failed"""
+    pipeline = pipeline or ImagePipeline()
+    thumbnails = asyncio.run(
+        pipeline.run([url for record in records for url in record["images"]])
+    )
+    print(f"Image stage: {pipeline.stats.snapshot()}")
+    return [
+        {**record, "images": [thumbnails[url] for url in record["images"] if url in thumbnails]}
+        for record in records
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch listing images into the thumbnail store"
+    )
+    parser.add_argument(
+        "--input", action="append", required=True, help="Parsed listings (JSON or JSONL)"
+    )
+    parser.add_argument("--workers", type=int, help="Thumbnail processes")
+    args = parser.parse_args()
+
+    pipeline = ImagePipeline(workers=args.workers)
+    urls = [
+        url for path in args.input for record in iter_records(path) for url in record["images"]
+    ]
+    asyncio.run(pipeline.run(urls))
+    print(f"✅ Image stage: {pipeline.stats.snapshot()}")
@@ -0,0 +1 @@
+# Parse stages turning raw crawler output into listings
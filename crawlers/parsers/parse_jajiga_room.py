@@ -0,0 +1,55 @@
+import argparse
+
+from app.services.intent_router import province_of
+from crawlers.parsers.schema import JajigaPlace, JajigaRoom, ParsedListing
+from crawlers.parsers.stage import DEFAULT_CHUNK_SIZE, run_parse_stage
+
+
+def parse_jajiga_room(item: dict) -> dict:
+    """Validate one raw jajiga.com room and turn it into a parsed listing"""
+    room = JajigaRoom.model_validate(item)
+    city = room.city.name if room.city else ""
+    province = room.province.name if isinstance(room.province, JajigaPlace) else room.province
+    ratings = room.ratings
+    return ParsedListing(
+        id=f"jajiga_{room.id}",
+        site="jajiga.com",
+        site_id=str(room.id),
+        title=room.title,
+        description=room.description or "",
+        city=city or None,
+        province=province_of(f"{province or ''} {city}") or "other",
+        location_id=room.location_id,
+        price=room.min_price,
+        extra_price=room.extra_price,
+        rating=ratings.total if ratings else None,
+        reviews_count=ratings.count if ratings else None,
+        images=[picture.url for picture in room.pictures if picture.url],
+        web_url="https://jajiga.com" + room.url,
+    ).model_dump()
+
+
+def parse_jajiga_detail_rooms(
+    input_path: str = "room_details.json",
+    output_path: str = "jajiga_room_details_parsed.jsonl",
+    quarantine_path: str = "jajiga_room_details_quarantine.jsonl",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int | None = None,
+):
+    """Parse crawled jajiga.com room details into listings, quarantining bad ones"""
+    return run_parse_stage(
+        parse_jajiga_room, input_path, output_path, quarantine_path, chunk_size, workers
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse crawled jajiga.com room details")
+    parser.add_argument("--input", default="room_details.json")
+    parser.add_argument("--output", default="jajiga_room_details_parsed.jsonl")
+    parser.add_argument("--quarantine", default="jajiga_room_details_quarantine.jsonl")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    parse_jajiga_detail_rooms(
+        args.input, args.output, args.quarantine, args.chunk_size, args.workers
+    )
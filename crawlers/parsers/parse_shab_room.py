@@ -1,45 +1,59 @@
-import json
-from tqdm import tqdm
+import argparse
 
-def parse_shab_detail_rooms():
-    """Process room details, generate summaries, and create embeddings."""
-    # Load the room details
-    try:
-        with open('shab_room_details.json', 'r', encoding='utf-8') as f:
-            room_details = json.load(f)
-    except Exception as e:
-        print(f"Error loading room_details.json: {e}")
-        return
+from app.services.intent_router import province_of
+from crawlers.parsers.schema import ParsedListing, ShabRoom
+from crawlers.parsers.stage import DEFAULT_CHUNK_SIZE, run_parse_stage
 
-    # Initialize the output structure
-    processed_data = []
 
-    # Process each item
-    for idx, item in enumerate(tqdm(room_details, desc="Processing items")):
-        item_parsed = {}
-        item_parsed["site"] = "shab.ir"
-        item_parsed["lodge_id"] = item["id"]
-        item_parsed["description"] = item["about"]
-        item_parsed["title"] = item["title"]
-        item_parsed["type"] = item["type"]
-        item_parsed["rating"] = item["rates"]["value"]
-        item_parsed["rating_count"] = item["reviews_count"]
-        item_parsed["comments"] = [review["comment"] for review in item["reviews"]]
-        item_parsed["area"] = item["building_area"]
-        item_parsed["city"] = item["location"]["city"]
-        item_parsed["province"] = item["location"]["province"]
-        item_parsed["lat"] = item["location"]["latitude"]
-        item_parsed["lng"] = item["location"]["longitude"]
-        item_parsed["min_price"] = item["pricing"]["records"][0]["workweek_days"]["amount"]
-        item_parsed["max_price"] = item["pricing"]["records"][0]["weekend_days"]["amount"]
-        item_parsed["extra_person_price"] = item["pricing"]["records"][0]["extra_person"]["amount"]
-        item_parsed["images"] = [i["thumbnail_path"] for i in item["pictures"]["records"]]
+def parse_shab_room(item: dict) -> dict:
+    """Validate one raw shab.ir room and turn it into a parsed listing"""
+    room = ShabRoom.model_validate(item)
+    pricing = room.pricing.records[0]
+    return ParsedListing(
+        id=f"shab_{room.id}",
+        site="shab.ir",
+        site_id=str(room.id),
+        title=room.title,
+        type=room.type,
+        description=room.about or "",
+        city=room.location.city,
+        province=province_of(f"{room.location.province} {room.location.city}") or "other",
+        location_id=room.location_id,
+        lat=room.location.latitude,
+        lng=room.location.longitude,
+        price=pricing.workweek_days.amount,
+        max_price=pricing.weekend_days.amount,
+        extra_price=pricing.extra_person.amount,
+        rating=room.rates.value,
+        reviews_count=room.reviews_count,
+        comments=[review.comment for review in room.reviews if review.comment],
+        area=room.building_area,
+        images=[picture.thumbnail_path for picture in room.pictures.records],
+        web_url=f"https://www.shab.ir/houses/show/{room.id}",
+    ).model_dump()
 
-        processed_data.append(item_parsed)
-    
-    # Save parsed_data
-    with open("shab_room_details_parsed.json", "w", encoding='utf-8') as f:
-        json.dump(processed_data, f, ensure_ascii=False, indent=2)
 
+def parse_shab_detail_rooms(
+    input_path: str = "shab_room_details.json",
+    output_path: str = "shab_room_details_parsed.jsonl",
+    quarantine_path: str = "shab_room_details_quarantine.jsonl",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int | None = None,
+):
+    """Parse crawled shab.ir room details into listings, quarantining bad ones"""
+    return run_parse_stage(
+        parse_shab_room, input_path, output_path, quarantine_path, chunk_size, workers
+    )
 
-parse_shab_detail_rooms()
\ No newline at end of file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse crawled shab.ir room details")
+    parser.add_argument("--input", default="shab_room_details.json")
+    parser.add_argument("--output", default="shab_room_details_parsed.jsonl")
+    parser.add_argument("--quarantine", default="shab_room_details_quarantine.jsonl")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    parse_shab_detail_rooms(
+        args.input, args.output, args.quarantine, args.chunk_size, args.workers
+    )
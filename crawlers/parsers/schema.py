@@ -0,0 +1,121 @@
+"""
+Typed schemas for raw crawler output and the parsed listing record.
+
+Raw models describe only the fields a parser reads; anything else the sites
+send is ignored. A record that doesn't match is quarantined with the
+validation error instead of aborting the run.
+"""
+
+from pydantic import BaseModel, Field
+
+
+class ParsedListing(BaseModel):
+    """Site-independent listing produced by every parse stage"""
+
+    id: str
+    site: str
+    site_id: str
+    title: str
+    type: str | None = None
+    description: str = ""
+    city: str | None = None
+    # Province named by the listing, "other" when it can't be told
+    province: str = "other"
+    # Crawl partition the listing was found under (site location ID)
+    location_id: str | None = None
+    lat: float | None = None
+    lng: float | None = None
+    price: int | None = None
+    max_price: int | None = None
+    extra_price: int | None = None
+    rating: float | None = None
+    reviews_count: int | None = None
+    comments: list[str] = []
+    area: float | None = None
+    images: list[str] = []
+    web_url: str = ""
+
+
+# shab.ir
+
+
+class ShabRates(BaseModel):
+    value: float | None = None
+
+
+class ShabReview(BaseModel):
+    comment: str | None = None
+
+
+class ShabLocation(BaseModel):
+    city: str
+    province: str
+    latitude: float | None = None
+    longitude: float | None = None
+
+
+class ShabAmount(BaseModel):
+    amount: int | None = None
+
+
+class ShabPricingRecord(BaseModel):
+    workweek_days: ShabAmount
+    weekend_days: ShabAmount
+    extra_person: ShabAmount = ShabAmount()
+
+
+class ShabPricing(BaseModel):
+    records: list[ShabPricingRecord] = Field(min_length=1)
+
+
+class ShabPicture(BaseModel):
+    thumbnail_path: str
+
+
+class ShabPictures(BaseModel):
+    records: list[ShabPicture] = []
+
+
+class ShabRoom(BaseModel):
+    id: int
+    title: str
+    about: str | None = None
+    type: str | None = None
+    rates: ShabRates = ShabRates()
+    reviews_count: int | None = None
+    reviews: list[ShabReview] = []
+    building_area: float | None = None
+    location: ShabLocation
+    pricing: ShabPricing
+    pictures: ShabPictures = ShabPictures()
+    location_id: str | None = None
+
+
+# jajiga.com
+
+
+class JajigaPlace(BaseModel):
+    name: str = ""
+
+
+class JajigaRatings(BaseModel):
+    total: float | None = None
+    count: int | None = None
+
+
+class JajigaPicture(BaseModel):
+    url: str | None = None
+
+
+class JajigaRoom(BaseModel):
+    id: int
+    title: str
+    description: str | None = None
+    min_price: int | None = None
+    extra_price: int | None = None
+    city: JajigaPlace | None = None
+    province: JajigaPlace | str | None = None
+    ratings: JajigaRatings | None = None
+    pictures: list[JajigaPicture] = []
+    url: str = ""
+    location_id: str | None = None
@@ -0,0 +1,164 @@
+"""
+Multiprocess parse stage shared by the site parsers.
+
+Raw records are streamed from a JSON array or a JSONL file, parsed in chunks
+by a process pool and written as JSONL. A record that fails its schema or
+its parser goes to a quarantine JSONL together with the reason, so one bad
+listing never aborts the run.
+"""
+
+import json
+import os
+import re
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+
+from pydantic import ValidationError
+
+READ_SIZE = 1 << 20
+DEFAULT_CHUNK_SIZE = 200
+
+# Whitespace and at most one comma between array elements
+_SEPARATOR = re.compile(r"\s*,?\s*")
+
+
+@dataclass(slots=True)
+class ParseStats:
+    """Counters reported at the end of a parse stage"""
+
+    total: int = 0
+    parsed: int = 0
+    quarantined: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.seconds if self.seconds else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.quarantined / self.total if self.total else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "total": self.total,
+            "parsed": self.parsed,
+            "quarantined": self.quarantined,
+            "seconds": round(self.seconds, 3),
+            "records_per_second": round(self.throughput, 1),
+            "error_rate": round(self.error_rate, 4),
+        }
+
+
+def iter_records(path: str) -> Iterator:
+    """Yield raw records from a JSONL file or a JSON array without loading it whole"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = f.read(READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        position = 1
+        eof = False
+        while True:
+            position = _SEPARATOR.match(buffer, position).end()
+            if buffer.startswith("]", position):
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # A record cut off at the read boundary; read more and retry
+                if eof:
+                    raise
+                more = f.read(READ_SIZE)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield record
+
+
+def describe_error(error: Exception) -> str:
+    """Short, single-line reason for the quarantine file"""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc']) or '<record>'}: {e['msg']}"
+            for e in error.errors()
+        )
+    return f"{type(error).__name__}: {error}"
+
+
+def parse_chunk(
+    parse_record: Callable[[dict], dict], chunk: list[tuple[int, object]]
+) -> tuple[list[dict], list[dict]]:
+    """Parse (index, record) pairs into parsed records and quarantine entries"""
+    parsed, rejected = [], []
+    for index, record in chunk:
+        try:
+            parsed.append(parse_record(record))
+        except Exception as e:
+            rejected.append({"index": index, "reason": describe_error(e), "record": record})
+    return parsed, rejected
+
+
+def run_parse_stage(
+    parse_record: Callable[[dict], dict],
+    input_path: str,
+    output_path: str,
+    quarantine_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int | None = None,
+) -> ParseStats:
+    """
+    Stream input_path through parse_record in a process pool. parse_record
+    must be a module-level function so it can be sent to the workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = ParseStats()
+    started = time.perf_counter()
+    records = enumerate(iter_records(input_path))
+    chunks = iter(lambda: list(islice(records, chunk_size)), [])
+    work = partial(parse_chunk, parse_record)
+
+    with (
+        ProcessPoolExecutor(max_workers=workers) as executor,
+        open(output_path, "w", encoding="utf-8") as output,
+        open(quarantine_path, "w", encoding="utf-8") as quarantine,
+    ):
+        # A couple of chunks per worker in flight keeps memory bounded
+        pending = deque()
+
+        def drain_one():
+            parsed, rejected = pending.popleft().result()
+            for record in parsed:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            for entry in rejected:
+                quarantine.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            stats.parsed += len(parsed)
+            stats.quarantined += len(rejected)
+            stats.total += len(parsed) + len(rejected)
+
+        for chunk in chunks:
+            pending.append(executor.submit(work, chunk))
+            if len(pending) >= workers * 2:
+                drain_one()
+        while pending:
+            drain_one()
+
+    stats.seconds = time.perf_counter() - started
+    print(
+        f"Parsed {stats.parsed}/{stats.total} records in {stats.seconds:.2f}s "
+        f"({stats.throughput:.0f} records/s), quarantined {stats.quarantined} "
+        f"({stats.error_rate:.1%}) to {quarantine_path}"
+    )
+    return stats
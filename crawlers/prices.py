@@ -0,0 +1,202 @@
+"""
+Price refresher: refetch the detail pages of hot listings through the site
+adapters and store their current price and availability in the price
+overlay (app/helper/price_overlay.py).
+
+Only listings served recently and not refreshed for a while are fetched,
+so the crawl cost follows traffic instead of the size of the index. The API
+runs a refresher in the background; it can also be run on its own, for all
+hot listings or for given listing IDs:
+
+    python -m crawlers.prices
+    python -m crawlers.prices --id jajiga_12345 --id shab_678
+"""
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.helper.chromadb_helper import chroma_db_service
+from app.helper.price_overlay import PRICE_FIELDS, PriceOverlay, price_overlay
+from app.helper.redis_helper import redis_manager
+from app.settings import (
+    CRAWL_REQUEST_TIMEOUT,
+    PRICE_REFRESH_CONCURRENCY,
+    PRICE_REFRESH_INTERVAL,
+    PRICE_REFRESH_PER_HOST,
+)
+from crawlers.parsers.parse_jajiga_room import parse_jajiga_room
+from crawlers.parsers.parse_shab_room import parse_shab_room
+from crawlers.sites import SITES, SiteAdapter
+from crawlers.worker import USER_AGENT
+
+# Parser of each site's room records; listing IDs are "<site>_<site id>"
+PARSERS = {
+    "jajiga": parse_jajiga_room,
+    "shab": parse_shab_room,
+}
+# Statuses meaning the listing was taken down
+GONE = {404, 410}
+
+
+class PriceRefresher:
+    """Fetches current prices of listings and writes them to the overlay"""
+
+    def __init__(
+        self,
+        overlay: PriceOverlay = price_overlay,
+        adapters: dict[str, SiteAdapter] | None = None,
+        concurrency: int = PRICE_REFRESH_CONCURRENCY,
+        per_host: int = PRICE_REFRESH_PER_HOST,
+        timeout: float = CRAWL_REQUEST_TIMEOUT,
+        index=None,
+    ):
+        self.overlay = overlay
+        # Where the crawl context of indexed listings is read from
+        self.index = index or chroma_db_service
+        self.adapters = adapters or {name: site() for name, site in SITES.items()}
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.refreshed = 0
+        self.gone = 0
+        self.failed = 0
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _locations(self, listing_ids: list[str]) -> dict[str, str]:
+        """Crawl location each listing was found under, from the listing store"""
+        try:
+            rooms = await asyncio.to_thread(
+                self.index.get_rooms,
+                listing_ids,
+                [0.0] * len(listing_ids),
+                ("location_id",),
+            )
+        except Exception as e:
+            print(f"Error reading listing locations: {e}")
+            return {}
+        return {room["id"]: room.get("location_id") or "" for room in rooms}
+
+    async def _fetch(
+        self, client: httpx.AsyncClient, listing_id: str, location_id: str
+    ) -> dict | None:
+        """Overlay entry of a listing, or None if it couldn't be fetched"""
+        site, _, site_id = listing_id.partition("_")
+        adapter = self.adapters.get(site)
+        if adapter is None or site not in PARSERS or not site_id:
+            return None
+        # The detail page is addressed by ID; the search page it was found
+        # on isn't stored and doesn't change the record
+        item = adapter.detail_item(site_id, location_id, 0)
+        async with self._host_limit(item.url):
+            try:
+                response = await client.get(item.url)
+            except httpx.HTTPError as e:
+                print(f"Error fetching price of {listing_id}: {e}")
+                return None
+
+        if response.status_code in GONE:
+            return {"available": False, "updated_at": time.time()}
+        if not response.is_success:
+            return None
+        try:
+            _, record = adapter.handle(item, response.json())
+            listing = PARSERS[site](record)
+        except (ValueError, KeyError, IndexError, AttributeError, TypeError) as e:
+            print(f"Error parsing price of {listing_id}: {e}")
+            return None
+        return {
+            **{field: listing[field] for field in PRICE_FIELDS},
+            "available": True,
+            "updated_at": time.time(),
+        }
+
+    async def refresh(self, listing_ids: list[str]) -> dict[str, dict]:
+        """Fetch and store the overlay entries of listing_ids"""
+        listing_ids = list(dict.fromkeys(listing_ids))
+        if not listing_ids:
+            return {}
+        locations = await self._locations(listing_ids)
+        async with httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency),
+        ) as client:
+            fetched = await asyncio.gather(
+                *(
+                    self._fetch(client, listing_id, locations.get(listing_id, ""))
+                    for listing_id in listing_ids
+                )
+            )
+        entries = {
+            listing_id: entry
+            for listing_id, entry in zip(listing_ids, fetched, strict=True)
+            if entry is not None
+        }
+        self.refreshed += len(entries)
+        self.gone += sum(not entry["available"] for entry in entries.values())
+        self.failed += len(listing_ids) - len(entries)
+        await self.overlay.put_many(entries)
+        return entries
+
+    async def refresh_hot(self) -> int:
+        """Refresh the recently served listings whose prices are stale"""
+        listing_ids = await self.overlay.due_for_refresh()
+        return len(await self.refresh(listing_ids))
+
+    async def run(self) -> None:
+        """Refresh hot listings every PRICE_REFRESH_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(PRICE_REFRESH_INTERVAL)
+            try:
+                count = await self.refresh_hot()
+                if count:
+                    print(f"💰 Refreshed prices of {count} hot listings")
+            except Exception as e:
+                print(f"Error refreshing hot listing prices: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "refreshed": self.refreshed,
+            "gone": self.gone,
+            "failed": self.failed,
+        }
+
+
+price_refresher = PriceRefresher()
+
+
+async def main(listing_ids: list[str] | None) -> None:
+    await redis_manager.connect()
+    try:
+        if listing_ids:
+            await price_refresher.refresh(listing_ids)
+        else:
+            await price_refresher.refresh_hot()
+    finally:
+        await redis_manager.disconnect()
+    print(f"✅ Price refresh: {price_refresher.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Refresh listing prices in the price overlay"
+    )
+    parser.add_argument(
+        "--id",
+        action="append",
+        dest="listing_ids",
+        help="Listing ID to refresh (default: every stale hot listing)",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.listing_ids))
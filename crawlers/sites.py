@@ -0,0 +1,166 @@
+"""
+Site adapters for the crawl frontier.
+
+An adapter builds the URLs of a site's search and detail pages and turns a
+fetched page into follow-up work items and, for detail pages, the raw room
+record the parse stage consumes. Base URLs are arguments so the same
+adapters can crawl a local fake site in tests.
+"""
+
+from abc import ABC, abstractmethod
+from urllib.parse import urlencode
+
+from crawlers.frontier import WorkItem
+
+SEARCH = "search"
+DETAIL = "detail"
+
+
+class SiteAdapter(ABC):
+    """URL building and page handling for one listing site"""
+
+    name = ""
+    # Raw records are merged into this file for the site's parser
+    output_path = ""
+    default_locations: list[str] = []
+
+    @abstractmethod
+    def search_item(self, location_id: str, page: int) -> WorkItem:
+        ...
+
+    @abstractmethod
+    def detail_item(self, room_id, location_id: str, page: int) -> WorkItem:
+        ...
+
+    @abstractmethod
+    def seeds(self, location_ids: list[str] | None = None) -> list[WorkItem]:
+        """First search page of every location"""
+
+    @abstractmethod
+    def handle(self, item: WorkItem, payload: dict) -> tuple[list[WorkItem], dict | None]:
+        """Follow-up items of a fetched page and the room record of a detail page"""
+
+    def _details(self, rooms: list[dict], item: WorkItem) -> list[WorkItem]:
+        location_id, page = item.meta["location_id"], item.meta["page"]
+        return [
+            self.detail_item(room["id"], location_id, page)
+            for room in rooms
+            if room.get("id")
+        ]
+
+
+class JajigaAdapter(SiteAdapter):
+    """jajiga.com JSON API: numbered search pages until one comes back empty"""
+
+    name = "jajiga"
+    output_path = "room_details.json"
+    default_locations = ["p26", "p23", "p24"]
+
+    def __init__(
+        self,
+        base_url: str = "https://api.jajiga.com/api",
+        pages_to_fetch: int = 5,
+        per_page: int = 18,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pages_to_fetch = pages_to_fetch
+        self.per_page = per_page
+
+    def search_item(self, location_id: str, page: int) -> WorkItem:
+        params = {
+            "per_page": self.per_page,
+            "page": page,
+            "locations[]": location_id,
+            "without[]": "map",
+        }
+        return WorkItem(
+            self.name,
+            SEARCH,
+            f"{location_id}:{page}",
+            f"{self.base_url}/search?{urlencode(params)}",
+            {"location_id": location_id, "page": page},
+        )
+
+    def detail_item(self, room_id, location_id: str, page: int) -> WorkItem:
+        return WorkItem(
+            self.name,
+            DETAIL,
+            str(room_id),
+            f"{self.base_url}/room/{room_id}",
+            {"location_id": location_id, "page": page},
+        )
+
+    def seeds(self, location_ids: list[str] | None = None) -> list[WorkItem]:
+        return [
+            self.search_item(location_id, 1)
+            for location_id in location_ids or self.default_locations
+        ]
+
+    def handle(self, item: WorkItem, payload: dict) -> tuple[list[WorkItem], dict | None]:
+        if item.kind == DETAIL:
+            return [], {**payload, **item.meta}
+
+        rooms = payload.get("rooms", {}).get("items", [])
+        follow_ups = self._details(rooms, item)
+        page = item.meta["page"]
+        if rooms and page < self.pages_to_fetch:
+            follow_ups.append(self.search_item(item.meta["location_id"], page + 1))
+        return follow_ups, None
+
+
+class ShabAdapter(SiteAdapter):
+    """shab.ir Next.js data routes: page 0 gives the result count, pages 1..N the rooms"""
+
+    name = "shab"
+    output_path = "shab_room_details.json"
+    default_locations = ["مازندران", "گیلان", "گلستان"]
+    page_size = 24
+
+    def __init__(
+        self,
+        base_url: str = "https://www.shab.ir/_next/data/vLSqXvG6ygrRzxhiGqwXK",
+    ):
+        self.base_url = base_url.rstrip("/")
+
+    def search_item(self, location_id: str, page: int) -> WorkItem:
+        params = urlencode([("routes", "province"), ("routes", location_id), ("page", page)])
+        return WorkItem(
+            self.name,
+            SEARCH,
+            f"{location_id}:{page}",
+            f"{self.base_url}/search/province/{location_id}.json?{params}",
+            {"location_id": location_id, "page": page},
+        )
+
+    def detail_item(self, room_id, location_id: str, page: int) -> WorkItem:
+        return WorkItem(
+            self.name,
+            DETAIL,
+            str(room_id),
+            f"{self.base_url}/houses/show/{room_id}.json?id={room_id}",
+            {"location_id": location_id, "page": page},
+        )
+
+    def seeds(self, location_ids: list[str] | None = None) -> list[WorkItem]:
+        return [
+            self.search_item(location_id, 0)
+            for location_id in location_ids or self.default_locations
+        ]
+
+    def handle(self, item: WorkItem, payload: dict) -> tuple[list[WorkItem], dict | None]:
+        data = payload.get("pageProps", {}).get("data", {})
+        if item.kind == DETAIL:
+            return [], {**data, **item.meta}
+
+        page = item.meta["page"]
+        if page == 0:
+            pages = int(data.get("pagination", {}).get("total", 0) / self.page_size)
+            location_id = item.meta["location_id"]
+            return [self.search_item(location_id, p) for p in range(1, pages + 1)], None
+        return self._details(data.get("list", []), item), None
+
+
+SITES: dict[str, type[SiteAdapter]] = {
+    JajigaAdapter.name: JajigaAdapter,
+    ShabAdapter.name: ShabAdapter,
+}
@@ -0,0 +1,308 @@
+"""
+Crawler workers over the shared Redis frontier (crawlers/frontier.py).
+
+Seed the frontier once, then start workers on as many nodes as needed; they
+split the work through leases, skip rooms already queued and keep each
+site's request rate global. Every worker appends raw room records to its
+own JSONL file, and merge combines them, without duplicates, into the file
+the site's parser reads. A single-node crawl (crawl_locally, used by
+crawlers/*_crawler.py) keeps its frontier in memory and needs no Redis.
+
+    python -m crawlers.worker seed --site shab --location گیلان --fresh
+    python -m crawlers.worker run --processes 4
+    python -m crawlers.worker merge --site shab
+    python -m crawlers.parsers.parse_shab_room
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import time
+
+import redis
+import requests
+
+from app.helper.resilience_helper import backoff_delay
+from app.settings import (
+    CRAWL_HOST_DELAY,
+    CRAWL_OUTPUT_DIR,
+    CRAWL_REQUEST_TIMEOUT,
+    REDIS_URL,
+)
+from crawlers.frontier import CrawlFrontier, Lease, LocalFrontier
+from crawlers.sites import SITES, SiteAdapter
+
+USER_AGENT = "Mozilla/5.0 (compatible; KheshtCrawler/1.0)"
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 120.0
+# Hosts answering 429 without Retry-After are left alone this long
+RATE_LIMIT_BACKOFF = 30.0
+POLL_INTERVAL = 0.2
+
+
+class CrawlWorker:
+    """Claims work items from the frontier, fetches them and records rooms"""
+
+    def __init__(
+        self,
+        frontier: CrawlFrontier | LocalFrontier,
+        adapters: dict[str, SiteAdapter],
+        output_dir: str = CRAWL_OUTPUT_DIR,
+        worker_id: str | None = None,
+        timeout: float = CRAWL_REQUEST_TIMEOUT,
+    ):
+        self.frontier = frontier
+        self.adapters = adapters
+        self.output_dir = output_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.fetched = 0
+        self.rooms = 0
+        self.retried = 0
+        self._claims = itertools.count()
+        self._outputs = {}
+
+    def _output(self, site: str):
+        if site not in self._outputs:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{site}.{self.worker_id}.jsonl")
+            self._outputs[site] = open(path, "a", encoding="utf-8")
+        return self._outputs[site]
+
+    def _retry(self, lease: Lease, reason: str) -> None:
+        self.retried += 1
+        delay = backoff_delay(lease.attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+        if self.frontier.fail(lease, delay, reason) == 0:
+            print(f"    ✗ Giving up on {lease.item.id}: {reason}")
+
+    def process(self, lease: Lease) -> None:
+        """Fetch one leased item, record its room and queue its follow-ups"""
+        item = lease.item
+        try:
+            response = self.session.get(item.url, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._retry(lease, f"request failed: {e}")
+            return
+        self.fetched += 1
+
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After", "")
+            self.frontier.back_off_host(
+                item.host, float(retry_after) if retry_after.isdigit() else RATE_LIMIT_BACKOFF
+            )
+            self._retry(lease, "rate limited")
+            return
+        if response.status_code >= 500:
+            self._retry(lease, f"status {response.status_code}")
+            return
+        if response.status_code != 200:
+            print(f"    ✗ Failed to fetch {item.id}: {response.status_code}")
+            self.frontier.ack(lease)
+            return
+
+        try:
+            follow_ups, record = self.adapters[item.site].handle(item, response.json())
+        except (ValueError, KeyError, AttributeError) as e:
+            self._retry(lease, f"unexpected page: {e}")
+            return
+
+        if record is not None:
+            output = self._output(item.site)
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            self.rooms += 1
+            print(f"    ✓ Fetched room ID {item.key}")
+        # Follow-ups are queued before the ack, so a crash in between only
+        # repeats this page; the dedup sets drop the repeated follow-ups
+        self.frontier.push(follow_ups)
+        if not self.frontier.ack(lease):
+            print(f"    Lease on {item.id} expired before it was done")
+
+    def run(self, idle_exit: float | None = 5.0) -> None:
+        """
+        Work until the frontier has been empty for idle_exit seconds, or
+        forever if idle_exit is None
+        """
+        idle_since = None
+        try:
+            while True:
+                lease, wait = self.frontier.claim(f"{self.worker_id}:{next(self._claims)}")
+                if lease:
+                    idle_since = None
+                    self.process(lease)
+                    continue
+                if wait is not None:
+                    time.sleep(min(max(wait, 0.01), POLL_INTERVAL * 5))
+                    continue
+                # Nothing queued, but leased items may still add follow-ups
+                if self.frontier.pending() == 0 and idle_exit is not None:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since >= idle_exit:
+                        break
+                time.sleep(POLL_INTERVAL)
+        finally:
+            for output in self._outputs.values():
+                output.close()
+            self._outputs.clear()
+        print(
+            f"✅ Worker {self.worker_id} done: {self.fetched} pages, "
+            f"{self.rooms} rooms, {self.retried} retries"
+        )
+
+
+def run_worker(
+    redis_url: str,
+    name: str,
+    adapters: dict[str, SiteAdapter],
+    output_dir: str,
+    idle_exit: float | None = 5.0,
+) -> None:
+    """Entry point of one worker process"""
+    client = redis.Redis.from_url(redis_url, decode_responses=True)
+    CrawlWorker(CrawlFrontier(client, name), adapters, output_dir).run(idle_exit)
+
+
+def run_workers(
+    redis_url: str,
+    name: str,
+    adapters: dict[str, SiteAdapter],
+    output_dir: str,
+    processes: int,
+    idle_exit: float | None = 5.0,
+) -> None:
+    """Run several worker processes on this node and wait for them"""
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=run_worker, args=(redis_url, name, adapters, output_dir, idle_exit)
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def seed(
+    frontier: CrawlFrontier | LocalFrontier,
+    adapter: SiteAdapter,
+    location_ids: list[str] | None = None,
+    host_delay: float | None = None,
+) -> int:
+    """Queue the first search pages of a site"""
+    items = adapter.seeds(location_ids)
+    if host_delay is not None:
+        for host in {item.host for item in items}:
+            frontier.set_host_delay(host, host_delay)
+    return frontier.push(items)
+
+
+def merge(site: str, output_dir: str, output_path: str) -> int:
+    """
+    Combine the workers' files of a site, keeping the first record of each
+    room; a .json output is written as an array, anything else as JSONL
+    """
+    as_array = output_path.endswith(".json")
+    seen = set()
+    with open(output_path, "w", encoding="utf-8") as out:
+        if as_array:
+            out.write("[")
+        for path in sorted(glob.glob(os.path.join(output_dir, f"{site}.*.jsonl"))):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record.get("id") in seen:
+                        continue
+                    seen.add(record.get("id"))
+                    if as_array:
+                        out.write(",\n" if len(seen) > 1 else "\n")
+                        out.write(json.dumps(record, ensure_ascii=False))
+                    else:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if as_array:
+            out.write("\n]\n")
+    return len(seen)
+
+
+def crawl_locally(site: str, location_ids: list[str] | None = None) -> None:
+    """Single-process crawl of one site into the file its parser reads"""
+    frontier = LocalFrontier()
+    adapter = SITES[site]()
+    output_dir = os.path.join(CRAWL_OUTPUT_DIR, f"{site}-{os.getpid()}")
+    seed(frontier, adapter, location_ids)
+    CrawlWorker(frontier, {site: adapter}, output_dir).run(idle_exit=0)
+    count = merge(site, output_dir, adapter.output_path)
+    print(f"✅ {count} room details saved to {adapter.output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed listing crawler")
+    parser.add_argument("--redis-url", default=REDIS_URL)
+    parser.add_argument("--name", default="crawl", help="Frontier key prefix")
+    parser.add_argument("--output-dir", default=CRAWL_OUTPUT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="Queue the first search pages")
+    seed_parser.add_argument("--site", action="append", choices=sorted(SITES))
+    seed_parser.add_argument(
+        "--location",
+        action="append",
+        help="Location ID to crawl (with a single --site); defaults to the site's list",
+    )
+    seed_parser.add_argument("--host-delay", type=float, default=CRAWL_HOST_DELAY)
+    seed_parser.add_argument(
+        "--fresh", action="store_true", help="Drop the frontier and its dedup sets first"
+    )
+
+    run_parser = commands.add_parser("run", help="Work through the frontier")
+    run_parser.add_argument("--processes", type=int, default=1)
+    run_parser.add_argument(
+        "--forever", action="store_true", help="Keep polling once the frontier is empty"
+    )
+
+    merge_parser = commands.add_parser("merge", help="Combine worker output files")
+    merge_parser.add_argument("--site", required=True, choices=sorted(SITES))
+    merge_parser.add_argument("--output", help="Defaults to the file the parser reads")
+
+    commands.add_parser("status", help="Show queued, leased and dead items")
+    args = parser.parse_args()
+
+    frontier = CrawlFrontier(
+        redis.Redis.from_url(args.redis_url, decode_responses=True), args.name
+    )
+    if args.command == "seed":
+        sites = args.site or sorted(SITES)
+        if args.location and len(sites) != 1:
+            parser.error("--location needs exactly one --site")
+        if args.fresh:
+            frontier.clear()
+        for site in sites:
+            added = seed(frontier, SITES[site](), args.location, args.host_delay)
+            print(f"🌱 Queued {added} search pages for {site}")
+    elif args.command == "run":
+        adapters = {site: adapter() for site, adapter in SITES.items()}
+        run_workers(
+            args.redis_url,
+            args.name,
+            adapters,
+            args.output_dir,
+            args.processes,
+            None if args.forever else 5.0,
+        )
+    elif args.command == "merge":
+        output = args.output or SITES[args.site].output_path
+        count = merge(args.site, args.output_dir, output)
+        print(f"✅ {count} room details saved to {output}")
+    else:
+        print(json.dumps(frontier.snapshot()))
+        for item_id, dead in frontier.dead_items().items():
+            print(f"  ✗ {item_id}: {dead['reason']}")
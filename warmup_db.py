@@ -1,29 +1,75 @@
+import argparse
+import asyncio
 import json
-from openai import OpenAI
 import os
-from dotenv import load_dotenv
-from tqdm import tqdm
 import time
+from collections import Counter
+
 import chromadb
 from chromadb.utils import embedding_functions
-from chromadb.config import Settings
+from dotenv import load_dotenv
+from openai import OpenAI
+from tqdm import tqdm
+
+from app.helper.chunk_index import CHUNK_COLLECTION_NAME, listing_chunks
+from app.helper.hnsw_config import hnsw_configuration
+from app.helper.index_registry import IndexRegistry, shard_root
+from app.helper.link_checker import link_checker
+from app.helper.listing_store import LISTINGS_DIRECTORY, ROOM_FIELDS, ListingStore
+from app.services.intent_router import PROVINCES, province_of
+from app.settings import CHUNK_INDEX_ENABLED, INDEX_MIN_RECALL, INDEX_RETENTION
+from crawlers.images import attach_thumbnails
+from crawlers.parsers.stage import iter_records
 
 # Load environment variables from .env file
 load_dotenv()
 
-PERSIST_DIRECTORY = "chroma_db"
-
-chroma_client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY', ''))
+embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+    api_key=os.getenv('OPENAI_API_KEY', ''),
+    model_name="text-embedding-3-small"
+)
+
+# Columns of the listing store; Chroma only keeps IDs, vectors and filters
+LISTING_COLUMNS = [
+    "site", "title", "type", "description", "summary", "full_text", "price",
+    "extra_price", "city", "province", "rating", "reviews_count", "image_url",
+    "images", "web_url", "location_id",
+]
+SNIPPET_LENGTH = 200
+DEFAULT_INPUTS = ["jajiga_room_details_parsed.jsonl"]
+EMBEDDING_BATCH_SIZE = 100
+# Listings summarized per shard and build
+MAX_LISTINGS = 200
+
+# Province shards; rooms whose province can't be told go to "other"
+SHARDS = list(PROVINCES) + ["other"]
 
-# Create or get the collection
-collection = chroma_client.get_or_create_collection(
-    name="room_embeddings",
-    embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-        api_key=os.getenv('OPENAI_API_KEY', ''),
-        model_name="text-embedding-3-small"
+SMOKE_QUERIES = [
+    "کلبه کاهگلی میوه منظره جنگلی",
+    "ویلا استخردار در شمال",
+    "سوئیت نزدیک دریا",
+]
+
+
+def create_collection(path):
+    """Create the room collection inside a fresh index version directory."""
+    chroma_client = chromadb.PersistentClient(path=path)
+    return chroma_client.get_or_create_collection(
+        name="room_embeddings",
+        embedding_function=embedding_function,
+        configuration=hnsw_configuration(),
+    )
+
+
+def create_chunk_collection(path):
+    """Create the review/description chunk collection next to the room collection."""
+    chroma_client = chromadb.PersistentClient(path=path)
+    return chroma_client.get_or_create_collection(
+        name=CHUNK_COLLECTION_NAME,
+        embedding_function=embedding_function,
+        configuration=hnsw_configuration(),
     )
-)
 
 def generate_summary(text):
     """Generate a summary using OpenAI's API."""
@@ -66,7 +112,7 @@ def create_embedding(text):
         print(f"Error creating embedding: {e}")
         return None
 
-def query_similar_rooms(query_text, n_results=5):
+def query_similar_rooms(collection, query_text, n_results=5):
     """Query ChromaDB for similar rooms based on the query text."""
     try:
         results = collection.query(
@@ -78,80 +124,338 @@ def query_similar_rooms(query_text, n_results=5):
         print(f"Error querying ChromaDB: {e}")
         return None
 
-def process_room_details():
-    """Process room details, generate summaries, and create embeddings."""
-    # Load the room details
+def assign_shards(records):
+    """
+    Shard listings by the crawl location they were found under. shab.ir
+    locations are province names; a jajiga.com location ID goes to the
+    province most of its listings name, so listings in towns the router
+    doesn't know stay with their province instead of landing in "other".
+    """
+    def location(record):
+        return record["site"], record.get("location_id")
+
+    votes = {}
+    for record in records:
+        if location(record)[1] and record["province"] != "other":
+            votes.setdefault(location(record), Counter())[record["province"]] += 1
+
+    shards = {}
+    for site, location_id in {location(record) for record in records}:
+        if location_id is None:
+            continue
+        province = province_of(location_id)
+        if province is None and (site, location_id) in votes:
+            province = votes[site, location_id].most_common(1)[0][0]
+        shards[site, location_id] = province or "other"
+
+    return [
+        {**record, "province": shards.get(location(record), record["province"])}
+        for record in records
+    ]
+
+
+def select_records(records, shard=None, limit=MAX_LISTINGS):
+    """
+    Listings of one build: the first `limit` of each shard, or of the given
+    shard only. Shards are assigned before the cap, so a province whose
+    listings come late in the input still gets its own.
+    """
+    selected = []
+    counts = Counter()
+    for record in assign_shards(records):
+        province = record["province"]
+        if (shard and province != shard) or counts[province] >= limit:
+            continue
+        counts[province] += 1
+        selected.append(record)
+    return selected
+
+
+def summary_text(record):
+    """Fields of a parsed listing worth sending to the summarizer."""
+    return json.dumps(
+        {k: v for k, v in record.items() if k not in ("id", "site_id", "images", "web_url")},
+        ensure_ascii=False,
+    )
+
+
+def to_listing(record, summary):
+    """Full listing record of a parsed room for the listing store."""
+    def text(value):
+        return 'N/A' if value is None else str(value)
+
+    return {
+        "id": record["id"],
+        "site": record["site"],
+        "title": record["title"],
+        "type": record["type"] or ("lodge" if "lodge" in summary.lower() else "villa"),
+        "description": summary[:SNIPPET_LENGTH],
+        "summary": summary,
+        "full_text": record["description"],
+        "price": text(record["price"]),
+        "extra_price": text(record["extra_price"]),
+        "city": text(record["city"]),
+        "province": record["province"],
+        "rating": text(record["rating"]),
+        "reviews_count": text(record["reviews_count"]),
+        "image_url": record["images"][0] if record["images"] else 'N/A',
+        "images": record["images"],
+        "web_url": record["web_url"],
+        "location_id": record.get("location_id"),
+    }
+
+
+def drop_dead_links(records):
+    """Drop listings whose page is dead and prune their dead images."""
+    async def check():
+        return await asyncio.gather(
+            link_checker.check_many([record["web_url"] for record in records]),
+            link_checker.check_many(
+                [url for record in records for url in record["images"]], image=True
+            ),
+        )
+
+    pages, images = asyncio.run(check())
+    alive = []
+    for record in records:
+        if not pages.get(record["web_url"]):
+            continue
+        alive.append({**record, "images": [url for url in record["images"] if images.get(url)]})
+    print(f"Link check: {len(records) - len(alive)} of {len(records)} listings are dead")
+    return alive
+
+
+def index_metadata(listing):
+    """The few filterable fields kept in Chroma metadata."""
+    metadata = {
+        "site": listing["site"],
+        "city": listing["city"],
+        "province": listing["province"],
+    }
+    for key, field, cast in (("min_price", "price", int), ("rating", "rating", float)):
+        try:
+            metadata[key] = cast(listing[field])
+        except ValueError:
+            pass
+    return metadata
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def report_sizes(path, listings):
+    """Print index and payload sizes so the effect of the listing store is visible."""
+    listings_size = directory_size(os.path.join(path, LISTINGS_DIRECTORY))
+    vectors_size = directory_size(path) - listings_size
+    print(f"Vector index: {vectors_size / 1e6:.2f} MB, listing store: {listings_size / 1e6:.2f} MB")
+    if listings:
+        full = sum(len(json.dumps(listing, ensure_ascii=False)) for listing in listings)
+        projected = sum(
+            len(json.dumps({k: listing[k] for k in ROOM_FIELDS}, ensure_ascii=False))
+            for listing in listings
+        )
+        print(f"Avg room payload: {projected / len(listings):.0f} bytes projected "
+              f"vs {full / len(listings):.0f} bytes full")
+
+
+def validate_index(collection, sample_size=20, k=5):
+    """Run smoke queries and a self-retrieval recall check on a new build."""
+    if collection.count() == 0:
+        print("Validation failed: the collection is empty")
+        return False
+
+    for query_text in SMOKE_QUERIES:
+        results = query_similar_rooms(collection, query_text)
+        if not results or not results['ids'][0]:
+            print(f"Validation failed: no results for smoke query {query_text}")
+            return False
+
+    # Every stored vector should find itself among its own nearest neighbours
+    sample = collection.get(limit=sample_size, include=["embeddings"])
+    results = collection.query(query_embeddings=sample['embeddings'], n_results=k)
+    hits = sum(
+        room_id in neighbours
+        for room_id, neighbours in zip(sample['ids'], results['ids'], strict=True)
+    )
+    recall = hits / len(sample['ids'])
+    print(f"Recall@{k} on {len(sample['ids'])} stored rooms: {recall:.3f}")
+    return recall >= INDEX_MIN_RECALL
+
+
+def process_room_details(
+    shard=None, input_paths=DEFAULT_INPUTS, check_links=True, thumbnails=True
+):
+    """Summarize parsed listings and build the province shards."""
+    # Load the listings written by the parse stage (crawlers/parsers)
     try:
-        with open('room_details.json', 'r', encoding='utf-8') as f:
-            room_details = json.load(f)
+        records = [record for path in input_paths for record in iter_records(path)]
     except Exception as e:
-        print(f"Error loading room_details.json: {e}")
+        print(f"Error loading parsed listings: {e}")
+        return
+    records = select_records(records, shard)
+    if not records:
+        # Never replace a serving shard with an empty one
+        print(f"No listings to build{f' for shard {shard}' if shard else ''}")
         return
+    if check_links:
+        records = drop_dead_links(records)
+    # Index thumbnails from the image store rather than full-size origin URLs
+    if thumbnails:
+        records = attach_thumbnails(records)
 
     # Initialize the output structure
     processed_data = {
         "items": []
     }
+    listings_by_shard = {}
+    chunks_by_shard = {}
 
     # Process each item
-    for idx, item in enumerate(tqdm(room_details[:200], desc="Processing items")):
-        summary = generate_summary(str(item))
+    for record in tqdm(records, desc="Processing items"):
+        shard_name = record["province"]
+        summary = generate_summary(summary_text(record))
 
         print(summary)
-        
+
         if summary:
-            # Extract metadata
-            metadata = {
-                "min_price": str(item.get('min_price', 'N/A')),
-                "extra_price": str(item.get('extra_price', 'N/A')),
-                "city": str(item.get('city', {}).get('name', 'N/A')),
-                "title": str(item.get('title', 'N/A')),
-                "description": str(item.get('description', 'N/A')),
-                "reviews_count": str(item.get('ratings', 'N/A').get('count', 'N/A')),
-                "rating": str(item.get('ratings', 'N/A').get('total', 'N/A')),
-                "image_url": str(item.get('pictures', 'N/A')[0].get('url', 'N/A')),
-                "id": str(item.get('id', str(idx))),
-                "url": str(item.get('url', 'N/A')),
-            }
-            
-            # Add to ChromaDB
-            collection.add(
-                documents=[summary],
-                metadatas=[metadata],
-                ids=[f"room_{idx}"]
+            listing = to_listing(record, summary)
+            # A room crawled under two locations is stored once
+            listings_by_shard.setdefault(shard_name, {})[listing["id"]] = listing
+            chunks_by_shard.setdefault(shard_name, {})[listing["id"]] = listing_chunks(
+                record["description"], record["comments"]
             )
-            
+
             # Store in processed data
             processed_item = {
-                "original_item": item,
+                "original_item": record,
                 "summary": summary,
-                "metadata": metadata
+                "metadata": index_metadata(listing)
             }
             processed_data["items"].append(processed_item)
-        
+
         time.sleep(0.1)
 
+    for shard_name, listings in listings_by_shard.items():
+        build_shard(shard_name, list(listings.values()), chunks_by_shard[shard_name])
+
+    # Save the processed data
+    try:
+        with open('processed_room_details.json', 'w', encoding='utf-8') as f:
+            json.dump(processed_data, f, ensure_ascii=False, indent=2)
+        print("Successfully saved processed data to processed_room_details.json")
+    except Exception as e:
+        print(f"Error saving processed data: {e}")
+
+
+def build_shard(shard_name, listings, chunks=None):
+    """Build, validate and activate a new index version of one province shard."""
+    # Build a new index version next to the one being served
+    registry = IndexRegistry(shard_root(shard_name))
+    version, path = registry.new_version()
+    print(f"Building {shard_name} index version {version} in {path}")
+    collection = create_collection(path)
+
+    try:
+        build_index(collection, path, listings)
+        if CHUNK_INDEX_ENABLED and chunks:
+            build_chunk_index(create_chunk_collection(path), chunks)
+        if not validate_index(collection):
+            raise RuntimeError("index validation failed")
+    except BaseException as e:
+        print(f"❌ Index build {shard_name}/{version} failed, discarding it: {e}")
+        registry.discard(version)
+        raise
+
+    registry.activate(version)
+    print(f"✅ Activated {shard_name} index version {version}")
+    removed = registry.garbage_collect(INDEX_RETENTION)
+    if removed:
+        print(f"Removed old {shard_name} index versions: {', '.join(removed)}")
+
+
+def build_index(collection, path, listings):
+    """Embed listing summaries in batches and write the vectors and listing store."""
+    for start in range(0, len(listings), EMBEDDING_BATCH_SIZE):
+        batch = listings[start:start + EMBEDDING_BATCH_SIZE]
+        # The summary itself lives in the listing store, not in Chroma
+        collection.upsert(
+            embeddings=embedding_function([listing["summary"] for listing in batch]),
+            metadatas=[index_metadata(listing) for listing in batch],
+            ids=[listing["id"] for listing in batch]
+        )
+
+    ListingStore.write(os.path.join(path, LISTINGS_DIRECTORY), listings, LISTING_COLUMNS)
+    report_sizes(path, listings)
+
     # Query for similar rooms
-    query_text = "کلبه کاهگلی میوه منظره جنگلی"
-    results = query_similar_rooms(query_text)
-    
+    query_text = SMOKE_QUERIES[0]
+    results = query_similar_rooms(collection, query_text)
+
     print('------------------------------------------')
     print("Query Results:")
     if results:
-        for i, (doc, metadata, distance) in enumerate(zip(results['documents'][0], results['metadatas'][0], results['distances'][0])):
+        store = ListingStore(os.path.join(path, LISTINGS_DIRECTORY))
+        hits = store.get(results['ids'][0], ("title", "summary"))
+        for i, (hit, metadata, distance) in enumerate(zip(hits, results['metadatas'][0], results['distances'][0], strict=True)):
             print(f"\nResult {i+1}:")
-            print(f"Summary: {doc}")
+            print(f"Title: {hit['title']}")
+            print(f"Summary: {hit['summary']}")
             print(f"Metadata: {metadata}")
             print(f"Similarity Score: {1 - distance}")  # Convert distance to similarity score
     print('------------------------------------------')
 
-    # Save the processed data
-    try:
-        with open('processed_room_details.json', 'w', encoding='utf-8') as f:
-            json.dump(processed_data, f, ensure_ascii=False, indent=2)
-        print("Successfully saved processed data to processed_room_details.json")
-    except Exception as e:
-        print(f"Error saving processed data: {e}")
+
+def build_chunk_index(collection, chunks_by_listing):
+    """Embed review and description chunks in batches, keyed back to their listing."""
+    chunks = [
+        (f"{listing_id}#{i}", listing_id, kind, text)
+        for listing_id, chunks in chunks_by_listing.items()
+        for i, (kind, text) in enumerate(chunks)
+    ]
+    for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+        batch = chunks[start:start + EMBEDDING_BATCH_SIZE]
+        collection.upsert(
+            embeddings=embedding_function([text for _, _, _, text in batch]),
+            metadatas=[
+                {"listing_id": listing_id, "kind": kind}
+                for _, listing_id, kind, _ in batch
+            ],
+            ids=[chunk_id for chunk_id, _, _, _ in batch],
+        )
+    print(f"Chunk index: {len(chunks)} chunks for {len(chunks_by_listing)} listings")
+
 
 if __name__ == "__main__":
-    process_room_details()
+    parser = argparse.ArgumentParser(description="Build the room vector index")
+    parser.add_argument(
+        "--shard",
+        choices=SHARDS,
+        help="Rebuild only this province shard and leave the others untouched",
+    )
+    parser.add_argument(
+        "--input",
+        action="append",
+        help="Parsed listings to index (default: jajiga_room_details_parsed.jsonl)",
+    )
+    parser.add_argument(
+        "--skip-link-check",
+        action="store_true",
+        help="Index listings without checking that their pages and images are alive",
+    )
+    parser.add_argument(
+        "--skip-thumbnails",
+        action="store_true",
+        help="Index the original image URLs instead of stored thumbnails",
+    )
+    args = parser.parse_args()
+    process_room_details(
+        shard=args.shard,
+        input_paths=args.input or DEFAULT_INPUTS,
+        check_links=not args.skip_link_check,
+        thumbnails=not args.skip_thumbnails,
+    )